@@ -0,0 +1,280 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+class BlockIndex:
+    def __init__(self, rpc_client, index_path, enable_logging=True, batch_size=100, max_workers=4, file_lock=None,
+                 cache_size=200000, head_ttl=12):
+        """
+        持久化的 区块号 <-> 时间戳 索引
+        时间查找（datetime_to_block）探测过的区块与链头作为稀疏锚点保存在磁盘上，后续查找在锚点之间做插值搜索；
+        swap 所在区块的时间戳（get_timestamps / add）只进入内存中有上限的 LRU 缓存，不写入索引文件，
+        否则索引会随同步的区块数线性增长，每次加载、保存与锚点插入都越来越慢
+        :param rpc_client: 共享的 RPCClient 实例
+        :param index_path: 索引文件路径 (JSON)，为 None 时只在内存中保存锚点
+        :param enable_logging: 是否启用日志输出
+        :param batch_size: 批量获取区块头时每个 JSON-RPC batch 的请求数
+        :param max_workers: 批量获取区块头时同时在途的 batch 数上限
+        :param file_lock: 可选的跨进程锁；多个进程共用同一索引文件时，写入前先合并磁盘上的锚点
+        :param cache_size: 内存中区块时间戳缓存的条目数上限
+        :param head_ttl: 链头锚点的有效期（秒）；目标时间晚于已知链头时，过期才重新获取链头
+        """
+        self.rpc = rpc_client
+        self.web3 = rpc_client.web3
+        self.index_path = index_path
+        self.enable_logging = enable_logging
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
+        self.file_lock = file_lock
+        self.cache_size = max(1, int(cache_size))
+        self.head_ttl = head_ttl
+        self.blocks = []  # 锚点区块号，升序
+        self.timestamps = {}  # 锚点区块号 -> 时间戳
+        self.cache = OrderedDict()  # 区块号 -> 时间戳，最久未使用的在前
+        self.resolved = {}  # 目标时间戳 -> 区块号，同一次运行中所有池共享（只记录链头之前的目标）
+        self.head_time = None  # 上次获取链头的时间
+        self.dirty = False
+        self._lock = threading.RLock()
+        self.load()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def read(self):
+        """读取磁盘上的索引，文件不存在或损坏时为 None."""
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, "r") as f:
+                pairs = json.load(f)
+        except (OSError, ValueError) as e:
+            print_error(f"[BLOCK INDEX] Failed to load {self.index_path}: {e}")
+            return None
+        return {int(block): int(timestamp) for block, timestamp in pairs}
+
+    def load(self):
+        """从磁盘加载索引."""
+        timestamps = self.read()
+        if timestamps is None:
+            return
+        self.timestamps = timestamps
+        self.blocks = sorted(self.timestamps)
+        self.log(f"[BLOCK INDEX] Loaded {len(self.blocks)} anchors from {self.index_path}")
+
+    def save(self):
+        """将锚点写回磁盘（仅在有新锚点时）."""
+        if not self.dirty or self.index_path is None:
+            return
+        if self.file_lock is None:
+            self._write()
+            return
+        with self.file_lock:
+            # 其他进程可能已写入新的锚点，合并后再写
+            on_disk = self.read() or {}
+            with self._lock:
+                if on_disk.keys() - self.timestamps.keys():
+                    on_disk.update(self.timestamps)
+                    self.timestamps = on_disk
+                    self.blocks = sorted(on_disk)
+            self._write()
+
+    def _write(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            pairs = [[block, self.timestamps[block]] for block in self.blocks]
+            self.dirty = False
+        directory = os.path.dirname(self.index_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(pairs, f)
+        os.replace(tmp_path, self.index_path)
+        self.log(f"[BLOCK INDEX] Saved {len(pairs)} anchors to {self.index_path}")
+
+    def add_anchor(self, block_number, timestamp):
+        """记录一个时间查找用的锚点（持久化）."""
+        block_number = int(block_number)
+        with self._lock:
+            if block_number in self.timestamps:
+                return
+            self.timestamps[block_number] = int(timestamp)
+            bisect.insort(self.blocks, block_number)
+            self.dirty = True
+
+    def add(self, block_number, timestamp):
+        """记录一个区块的时间戳（只进入内存缓存）."""
+        self.add_many({int(block_number): int(timestamp)})
+
+    def add_many(self, block_timestamps):
+        """批量记录区块时间戳（只进入内存缓存），超出上限时淘汰最久未使用的条目."""
+        with self._lock:
+            self.cache.update(block_timestamps)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def lookup(self, block_number):
+        """在锚点与内存缓存中查找区块时间戳，未命中时为 None."""
+        with self._lock:
+            timestamp = self.timestamps.get(block_number)
+            if timestamp is None:
+                timestamp = self.cache.get(block_number)
+                if timestamp is not None:
+                    self.cache.move_to_end(block_number)
+            return timestamp
+
+    def get_timestamp(self, block_number):
+        """
+        获取区块时间戳（时间查找的探测点），优先使用索引与内存缓存；结果作为锚点保存
+        :param block_number: 区块号
+        :return: Unix 时间戳
+        """
+        timestamp = self.timestamps.get(block_number)
+        if timestamp is None:
+            timestamp = self.lookup(block_number)
+            if timestamp is None:
+                timestamp = self.web3.eth.get_block(block_number)["timestamp"]
+            self.add_anchor(block_number, timestamp)
+        return timestamp
+
+    def _fetch_batch(self, block_numbers):
+        """
+        以一个 JSON-RPC batch 获取多个区块头
+        :return: {区块号: 时间戳}，获取失败的区块不包含在内
+        """
+        calls = [("eth_getBlockByNumber", [hex(block_number), False]) for block_number in block_numbers]
+        try:
+            headers = self.rpc.batch_request(calls)
+        except Exception as e:
+            print_error(f"[BLOCK INDEX] Batch header request failed: {e}")
+            return {}
+        return {
+            block_number: int(header["timestamp"], 16)
+            for block_number, header in zip(block_numbers, headers)
+            if header
+        }
+
+    def get_timestamps(self, block_numbers):
+        """
+        批量获取一组区块的时间戳，未命中的区块以并发的 batch 请求获取，结果进入内存缓存
+        :param block_numbers: 区块号集合
+        :return: {区块号: Unix 时间戳}，获取失败的区块不包含在内
+        """
+        result = {}
+        missing = []
+        for block_number in sorted({int(block_number) for block_number in block_numbers}):
+            timestamp = self.lookup(block_number)
+            if timestamp is None:
+                missing.append(block_number)
+            else:
+                result[block_number] = timestamp
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for fetched in executor.map(self._fetch_batch, batches):
+                    result.update(fetched)
+                    self.add_many(fetched)
+            self.log(f"[BLOCK INDEX] Fetched {len(missing)} block headers in {len(batches)} batches")
+        return result
+
+    def _refresh_head(self):
+        """获取链头作为上界锚点；距上次获取不足 head_ttl 秒时跳过（返回 False）."""
+        now = time.time()
+        if self.head_time is not None and now - self.head_time < self.head_ttl:
+            return False
+        head = self.web3.eth.get_block("latest")
+        self.add_anchor(head["number"], head["timestamp"])
+        self.head_time = now
+        return True
+
+    def _bracket(self, target_timestamp):
+        """
+        在已知锚点中找到包围目标时间的区间
+        :return: (lo, hi)，lo 为时间戳 < 目标的最大区块，hi 为时间戳 >= 目标的最小区块，不存在时为 None
+        """
+        with self._lock:
+            # 时间戳随区块号单调不减，可直接对锚点二分
+            lo_index, hi_index = 0, len(self.blocks)
+            while lo_index < hi_index:
+                mid = (lo_index + hi_index) // 2
+                if self.timestamps[self.blocks[mid]] < target_timestamp:
+                    lo_index = mid + 1
+                else:
+                    hi_index = mid
+            lo = self.blocks[lo_index - 1] if lo_index > 0 else None
+            hi = self.blocks[lo_index] if lo_index < len(self.blocks) else None
+        return lo, hi
+
+    def datetime_to_block(self, target_datetime):
+        """
+        查找时间戳 >= 目标时间的第一个区块（与原二分搜索语义一致）
+        :param target_datetime: 目标时间 (datetime 对象)
+        :return: 区块号
+        """
+        target_timestamp = int(target_datetime.timestamp())
+        if target_timestamp in self.resolved:
+            return self.resolved[target_timestamp]
+
+        lo, hi = self._bracket(target_timestamp)
+        if hi is None and self._refresh_head():
+            lo, hi = self._bracket(target_timestamp)
+        if hi is None:
+            # 目标时间晚于链头；链头还会前进，结果不缓存
+            block_number = self.blocks[-1] + 1
+            self.log(f"[BLOCK SEARCH] Target is after chain head, using block: {block_number}")
+            return block_number
+        if lo is None and hi > 0:
+            self.get_timestamp(0)
+            lo, hi = self._bracket(target_timestamp)
+
+        rpc_calls = 0
+        use_interpolation = True
+        while lo is not None and hi - lo > 1:
+            lo_timestamp = self.timestamps[lo]
+            hi_timestamp = self.timestamps[hi]
+            if use_interpolation and hi_timestamp > lo_timestamp:
+                guess = lo + (target_timestamp - lo_timestamp) * (hi - lo) // (hi_timestamp - lo_timestamp)
+            else:
+                guess = (lo + hi) // 2
+            guess = min(max(guess, lo + 1), hi - 1)
+
+            timestamp = self.get_timestamp(guess)
+            rpc_calls += 1
+            previous_width = hi - lo
+            if timestamp < target_timestamp:
+                lo = guess
+            else:
+                hi = guess
+            # 插值收敛过慢时（区块时间不均匀）退化为一次二分
+            use_interpolation = (hi - lo) * 2 <= previous_width
+
+        self.log(f"[BLOCK SEARCH] Closest block found: {hi} ({rpc_calls} lookups)")
+        self.resolved[target_timestamp] = hi
+        return hi
+
+    def block_window(self, start_time, end_time, confirmations):
+        """
+        把时间窗口解析为区块范围
+        距链头 confirmations 个区块以内的数据可能被重组，不写入检查点；
+        end_time 晚于链头时 datetime_to_block 返回尚未出块的区块号，同样截断到已确认的区块
+        :param start_time: 开始时间，为 None 时起点为 None（由检查点决定）
+        :param end_time: 结束时间，为 None 时同步到已确认的链头
+        :return: (start_block, end_block)
+        """
+        start_block = self.datetime_to_block(start_time) if start_time else None
+        end_block = self.web3.eth.block_number - confirmations
+        if end_time:
+            end_block = min(self.datetime_to_block(end_time), end_block)
+        self.save()
+        return start_block, end_block
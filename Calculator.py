@@ -1,7 +1,14 @@
+import numpy as np
 import pandas as pd
 import os
-import hashlib
 from .config import CONFIG
+from .RPCClient import RPCClient
+from .SwapStore import SwapStore
+from .MetadataRegistry import MetadataRegistry
+from .Metrics import METRICS
+from .FixedPoint import to_limbs, abs_limbs, split32, group_sum, scale
+from .DEXAdapters import get_adapter
+from . import Fingerprint
 
 from numpy.core.defchararray import lower
 from web3 import Web3
@@ -11,66 +18,54 @@ def print_error(message):
     # 红色的 ANSI 转义字符代码是 31
     print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
 
+def interval_seconds(interval):
+    """时间间隔字符串（如 '5min'、'1h'、'1D'）转为秒数."""
+    return int(pd.to_timedelta(interval).total_seconds())
+
+def recompute_start(resume_times, since, intervals):
+    """
+    增量计算的起点：各输出中最早的未完成分组；任一输出尚无内容时为 None（从头计算）
+    :param since: 可选的补拉时间，早于该起点时从它所在的最粗粒度分组开始重新计算
+    """
+    start_time = None if any(t is None for t in resume_times) else min(resume_times)
+    if since is None or start_time is None:
+        return start_time
+    step = max(interval_seconds(interval) for interval in intervals)
+    return min(start_time, pd.Timestamp(since).floor(f"{step}s"))
+
 class Calculator:
-    def __init__(self, rpc_url,pooladdress,tokenA,tokenAname,tokenB, tokenBname, dex, interval, enable_logging):
+    def __init__(self, rpc_url,pooladdress,tokenA,tokenAname,tokenB, tokenBname, dex, interval, enable_logging, rpc_client=None, metadata_registry=None):
         """
         初始化 Calculator 类
         :param tokenA: 第一个代币地址
         :param tokenB: 第二个代币地址
         :param dex: DEX 名称
         :param pooladdress: 流动性池地址
-        :param interval: 分组间隔，支持 '1T' (分钟), '1H' (小时), '1D' (天)
+        :param interval: 分组间隔，支持 '1T' (分钟), '1H' (小时), '1D' (天)；也可以是间隔列表，一次加载同时输出多个粒度
         :param enable_logging: 是否启用日志输出
+        :param rpc_client: 共享的 RPCClient，为空时自行创建
+        :param metadata_registry: 共享的 MetadataRegistry，为空时自行加载；已知池的计算不发起 RPC 请求
         """
         self.enable_logging = enable_logging
-        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
-        if self.web3.is_connected():
-            self.log("Connected to Ethereum node")
-        else:
-            print_error("Failed to connect")
+        self.rpc = rpc_client or RPCClient(rpc_url, enable_logging=enable_logging)
+        self.web3 = self.rpc.web3
+        self.metadata = metadata_registry or MetadataRegistry(self.rpc, CONFIG["metadata_path"], enable_logging)
         self.dex = dex
+        self.adapter = get_adapter(dex)
         self.tokenA = self.web3.to_checksum_address(tokenA)
         self.tokenAname = tokenAname
         self.tokenB = self.web3.to_checksum_address(tokenB)
         self.tokenBname = tokenBname
         self.pooladdress = pooladdress
-        self.interval = interval
-        self.token_abi = [
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "decimals",
-                "outputs": [{"name": "", "type": "uint8"}],
-                "stateMutability": "view",
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "symbol",
-                "outputs": [{"name": "", "type": "string"}],
-                "stateMutability": "view",
-                "type": "function"
-            }
-        ]
-
-        self.pool_abi = [
-        {
-            "inputs": [],
-            "name": "token0",
-            "outputs": [{"internalType": "address", "name": "", "type": "address"}],
-            "stateMutability": "view",
-            "type": "function"
-        },
-        {
-            "inputs": [],
-            "name": "token1",
-            "outputs": [{"internalType": "address", "name": "", "type": "address"}],
-            "stateMutability": "view",
-            "type": "function"
-        }
-    ]
-
+        # 多个粒度从最细的分组逐级汇总，每个粒度都必须是最细粒度的整数倍
+        intervals = [interval] if isinstance(interval, str) else list(interval)
+        self.intervals = sorted(dict.fromkeys(intervals), key=interval_seconds)
+        self.interval = self.intervals[0]
+        self.step = interval_seconds(self.interval)
+        for other in self.intervals[1:]:
+            if interval_seconds(other) % self.step:
+                print_error(f"[ERROR] Interval {other} is not a multiple of {self.interval}")
+                raise ValueError(f"Interval {other} is not a multiple of {self.interval}")
 
     def log(self, message):
         """
@@ -80,12 +75,22 @@ class Calculator:
         if self.enable_logging:
             print(message)
 
-    def load_data(self):
+    def load_data(self, start_time=None):
         """
-        加载指定文件夹中的数据文件
+        加载本池存储的 swap（同一交易对在同一 DEX 的其他池不计入）
+        :param start_time: 只加载该时间（含）之后的 swap，None 表示全部
         :return: pandas DataFrame
         """
         result_folder = CONFIG["output_path"]
+        if CONFIG["swap_store"] == "parquet":
+            store = SwapStore(os.path.join(result_folder, "swaps"), self.enable_logging)
+            df = store.read(self.dex, self.tokenAname, self.tokenBname, start_time, pool_address=self.pooladdress)
+            if df is None:
+                pool_dir = store.pool_dir(self.dex, self.tokenAname, self.tokenBname, self.pooladdress)
+                print_error(f"[ERROR] Data not found: {pool_dir}")
+                raise FileNotFoundError(f"Data not found: {pool_dir}")
+            return df
+
         filename = f"{self.dex}-{self.tokenAname}-{self.tokenBname}.csv"
         filepath = os.path.join(result_folder, filename)
 
@@ -94,152 +99,250 @@ class Calculator:
             raise FileNotFoundError(f"Data file not found: {filepath}")
 
         self.log(f"[INFO] Loading data from {filepath}")
-        return pd.read_csv(filepath)
+        METRICS.add("bytes_read", os.path.getsize(filepath))
+        df = pd.read_csv(filepath)
+        # 同一交易对的多个池（如 V3 的各费率档）写入同一 CSV 文件，只保留本池的记录
+        pool_address = (df["pool_address"] if "pool_address" in df.columns else pd.Series(None, index=df.index)).astype(object)
+        legacy = int(pool_address.isna().sum())
+        if legacy:
+            print_error(
+                f"[WARNING] Ignoring {legacy} swaps without pool_address in {filepath}; "
+                f"delete the checkpoints of its pools to re-sync them"
+            )
+        df = df[pool_address.str.lower() == self.pooladdress.lower()]
+        if start_time is not None:
+            df = df[pd.to_datetime(df["timestamp"]) >= start_time]
+        return df.reset_index(drop=True)
+
+    def data_exists(self):
+        """该池是否已有存储的 swap."""
+        result_folder = CONFIG["output_path"]
+        if CONFIG["swap_store"] == "parquet":
+            store = SwapStore(os.path.join(result_folder, "swaps"), self.enable_logging)
+            return os.path.isdir(store.pool_dir(self.dex, self.tokenAname, self.tokenBname, self.pooladdress))
+        return os.path.exists(os.path.join(result_folder, f"{self.dex}-{self.tokenAname}-{self.tokenBname}.csv"))
+
+    def candle_path(self, interval=None):
+        """K 线输出文件路径：{symbol0}-{symbol1}-{interval}.csv."""
+        metadata = self.metadata.pool_metadata(self.pooladdress)
+        output_filename = f"{metadata['symbol0']}-{metadata['symbol1']}-{interval or self.interval}.csv"
+        return os.path.join(CONFIG["output_path"], output_filename)
+
+    def load_candles(self, output_filepath):
+        """
+        读取已有的 K 线文件
+        :return: DataFrame；文件不存在或为旧版格式（没有 pool_address 列，或分组哈希为 SHA256）时为 None
+        """
+        if not os.path.exists(output_filepath):
+            return None
+        METRICS.add("bytes_read", os.path.getsize(output_filepath))
+        # 指纹可能全由数字组成（如空分组），按字符串读取
+        existing_df = pd.read_csv(output_filepath, dtype={"transactionHashHash": str})
+        if "pool_address" not in existing_df.columns:
+            self.log(f"[WARNING] {output_filepath} has no pool_address column, rebuilding it")
+            return None
+        if existing_df["transactionHashHash"].str.len().ne(len(Fingerprint.EMPTY)).any():
+            self.log(f"[WARNING] {output_filepath} has SHA256 bucket hashes, rebuilding it with fingerprints")
+            return None
+        existing_df["starttime"] = pd.to_datetime(existing_df["starttime"])
+        existing_df["endtime"] = pd.to_datetime(existing_df["endtime"])
+        return existing_df
+
+    def resume_time(self, existing_df):
+        """
+        增量聚合的起点：本池已输出的最后一个分组可能不完整，从它的 starttime 开始重新计算
+        :return: pandas Timestamp；本池尚无输出时为 None
+        """
+        if existing_df is None:
+            return None
+        rows = existing_df[existing_df["pool_address"].str.lower() == self.pooladdress.lower()]
+        if rows.empty:
+            return None
+        return rows["starttime"].max()
+
+    @staticmethod
+    def side_magnitude(df, fields):
+        """
+        一侧代币的交易量：有符号的金额（V3 类的 int256）取绝对值，各列的 32 位 limb 直接相加
+        （V2 类的输入与输出，每个 limb 不超过 33 位）
+        :param fields: 适配器的 volume_fields 之一，[(列名, 是否有符号), ...]
+        """
+        total = None
+        for name, signed in fields:
+            limbs = to_limbs(df[name].to_numpy())
+            magnitude = split32(abs_limbs(limbs) if signed else limbs)
+            total = magnitude if total is None else total + magnitude
+        return total
+
+    def swap_amounts(self, df):
+        """
+        根据 DEX 类型计算每笔 swap 两种代币的交易量（原始整数单位，精确）
+        :param df: 原始数据 DataFrame
+        :return: (epoch, transactionHash, magnitude0, magnitude1)
+                 epoch 为 Unix 秒；magnitude 为 (n, 8) 的 32 位 limb，见 FixedPoint.split32
+        """
+        magnitude0, magnitude1 = (self.side_magnitude(df, fields) for fields in self.adapter.volume_fields)
+
+        epoch = pd.to_datetime(df["timestamp"]).to_numpy(dtype="datetime64[s]").astype(np.int64)
+        return epoch, df["transactionHash"].to_numpy(), magnitude0, magnitude1
 
     def process_data(self, df):
         """
-        根据 DEX 类型处理数据，并按时间间隔分组
+        计算最细粒度的部分聚合：按整数 epoch 分组，更粗的粒度由 rollup 从这些部分聚合汇总
+        交易量以原始整数单位精确累加（raw_volume0 / raw_volume1），输出时才按 decimals 缩放
         :param df: 原始数据 DataFrame
-        :return: 处理后的数据 DataFrame
+        :return: 以分组起始 epoch 为索引的 DataFrame(raw_volume0, raw_volume1, fingerprint0, fingerprint1)
         """
         self.log(f"[INFO] Processing data for DEX: {self.dex}")
+        epoch, hashes, magnitude0, magnitude1 = self.swap_amounts(df)
+        buckets = epoch // self.step * self.step
+        order = np.argsort(buckets, kind="stable")
+        buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) if len(buckets) else buckets
+        # 每笔 swap 的摘要按分组相加，得到与行顺序无关的分组指纹
+        fingerprints = Fingerprint.reduce_sorted(Fingerprint.swap_digests(hashes)[order], starts)
+        partials = pd.DataFrame({
+            "raw_volume0": group_sum(magnitude0[order], starts),
+            "raw_volume1": group_sum(magnitude1[order], starts),
+            Fingerprint.COLUMNS[0]: fingerprints[:, 0],
+            Fingerprint.COLUMNS[1]: fingerprints[:, 1],
+        }, index=buckets[starts])
+        self.log(f"[INFO] Data processed successfully for DEX: {self.dex}")
+        return partials
 
-        # 确保 timestamp 列是 datetime 格式，无需判断直接转换
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df.set_index("timestamp", inplace=True)
-
-
-        # 使用 pool_address 获取 token0 和 token1 地址
-        pool_contract = self.web3.eth.contract(address=self.pooladdress, abi=self.pool_abi)
-        token0_address = pool_contract.functions.token0().call()
-        token1_address = pool_contract.functions.token1().call()
-
-        # 获取 tokenA 和 tokenB 的 decimals
-        contract0 = self.web3.eth.contract(address=token0_address, abi=self.token_abi)
-        symbol0= contract0.functions.symbol().call()
-        decimals0 = contract0.functions.decimals().call()
-        contract1 = self.web3.eth.contract(address=token1_address, abi=self.token_abi)
-        decimals1 = contract1.functions.decimals().call()
-        symbol1= contract1.functions.symbol().call()
-
-        if self.dex == "uniswap_v3":
-            # 转换为数值类型
-            df["amount0"] = pd.to_numeric(df["amount0"], errors="coerce")
-            df["amount1"] = pd.to_numeric(df["amount1"], errors="coerce")
-
-            # 检查是否有无法转换为数值的值
-            if df["amount0"].isna().any():
-                print_error("[ERROR] Non-numeric values found in 'amount0'")
-            if df["amount1"].isna().any():
-                print_error("[ERROR] Non-numeric values found in 'amount1'")
-            self.log(f"amount0 dtype: {df['amount0'].dtype}, amount1 dtype: {df['amount1'].dtype}")
-
-            # 交易量计算
-            df["volume0"] = df["amount0"].abs() / (10 ** decimals0)
-            df["volume1"] = df["amount1"].abs() / (10 ** decimals1)
-            df["symbol0"] = symbol0
-            df["symbol1"] = symbol1
-
-            # 按时间间隔分组并计算交易量
-            grouped = df.resample(self.interval).agg({
-                "volume0": "sum",
-                "volume1": "sum",
-                "transactionHash": lambda x: hashlib.sha256(''.join(x).encode()).hexdigest()
-            })
-
-            # 重命名 transactionHash 列
-            grouped.rename(columns={"transactionHash": "transactionHashHash"}, inplace=True)
-
-            # 添加 symbol1 和 symbol2 列
-            grouped["symbol0"] = symbol0
-            grouped["symbol1"] = symbol1
-
-
-
-        elif self.dex in ["uniswap_v2", "PancakeSwap_v2"]:
-
-            df["volume0"] = (abs(df["amount0In"]) + abs(df["amount0Out"])) / 10 ** (decimals0) # 稳定币交易量
-            df["volume1"] = (abs(df["amount1In"]) + abs(df["amount1Out"])) / 10 ** (decimals1)  # 非稳定币交易量
-            df["symbol0"] = symbol0
-            df["symbol1"] = symbol1
-
-            # 按时间间隔分组并计算交易量和平均价格
-            grouped = df.resample(self.interval).agg({
-                "volume0": "sum",  # 稳定币交易量
-                "volume1": "sum",  # 价格的平均值
-                "transactionHash": lambda x: hashlib.sha256(''.join(x).encode()).hexdigest()  # 拼接交易哈希并进行 SHA256 哈希
-            })
-
-            # 重命名 transactionHash 列
-            grouped.rename(columns={"transactionHash": "transactionHashHash"}, inplace=True)
-
-            # 添加 symbol1 和 symbol2 列
-            grouped["symbol0"] = symbol0
-            grouped["symbol1"] = symbol1
-
+    @staticmethod
+    def combine(partials, buckets=None):
+        """
+        合并部分聚合：交易量拆成 32 位 limb 后按分组向量化精确求和（与 process_data 相同的 group_sum），
+        分组指纹逐 lane 相加
+        :param partials: process_data 格式的 DataFrame（索引可重复、无序）
+        :param buckets: 每行所属的目标分组，默认为原索引（合并同一分组的多个部分聚合）
+        :return: 以分组起始 epoch 为索引、按索引排序的 DataFrame
+        """
+        buckets = partials.index.to_numpy() if buckets is None else buckets
+        keys, codes = np.unique(buckets, return_inverse=True)
+        fingerprints = Fingerprint.fold(partials[Fingerprint.COLUMNS].to_numpy(dtype=np.uint64), codes, len(keys))
+        order = np.argsort(codes, kind="stable")
+        starts = np.searchsorted(codes[order], np.arange(len(keys)))
+        volumes = {
+            column: group_sum(split32(to_limbs(partials[column].to_numpy()[order])), starts)
+            for column in ("raw_volume0", "raw_volume1")
+        }
+        return pd.DataFrame({
+            "raw_volume0": volumes["raw_volume0"],
+            "raw_volume1": volumes["raw_volume1"],
+            Fingerprint.COLUMNS[0]: fingerprints[:, 0],
+            Fingerprint.COLUMNS[1]: fingerprints[:, 1],
+        }, index=keys)
+
+    def rollup(self, partials, interval):
+        """
+        由最细粒度的部分聚合汇总出更粗的分组：交易量精确求和，分组指纹为各细分组指纹之和
+        （与直接由这些 swap 计算的指纹相同）
+        :param partials: process_data 的输出
+        :param interval: 目标粒度
+        :return: 以分组起始 epoch 为索引的 DataFrame
+        """
+        step = interval_seconds(interval)
+        if step == self.step:
+            return partials
+        return self.combine(partials, partials.index.to_numpy() // step * step)
 
-        else:
-            print_error(f"[ERROR] Unsupported DEX type: {self.dex}")
-            raise ValueError(f"Unsupported DEX type: {self.dex}")
+    def to_candles(self, buckets, interval, start=None, end=None):
+        """
+        转为输出格式：补齐区间内没有 swap 的空分组，添加起止时间、symbol 与池地址列
+        :param buckets: 以分组起始 epoch 为索引的 DataFrame
+        :param start: 补齐的起始 epoch（含），默认为第一个分组
+        :param end: 补齐的结束 epoch（不含），默认为最后一个分组之后
+        """
+        step = interval_seconds(interval)
+        if start is None:
+            start = int(buckets.index.min())
+        if end is None:
+            end = int(buckets.index.max()) + step
+        # uint64 指纹在 reindex 补齐空分组前转为字符串，避免经过 float
+        buckets = buckets.drop(columns=Fingerprint.COLUMNS).assign(
+            transactionHashHash=Fingerprint.to_hex(buckets[Fingerprint.COLUMNS].to_numpy(dtype=np.uint64))
+        )
+        grouped = buckets.reindex(np.arange(start, end, step, dtype=np.int64))
+        empty = grouped["transactionHashHash"].isna()
+        grouped.loc[empty, ["raw_volume0", "raw_volume1"]] = 0
+        grouped.loc[empty, "transactionHashHash"] = Fingerprint.EMPTY
+
+        # 精确的整数交易量按 decimals 缩放（每个分组只舍入一次）
+        metadata = self.metadata.pool_metadata(self.pooladdress)
+        grouped["volume0"] = scale(grouped.pop("raw_volume0"), metadata["decimals0"])
+        grouped["volume1"] = scale(grouped.pop("raw_volume1"), metadata["decimals1"])
+
+        # 添加 symbol0 和 symbol1 列
+        grouped["symbol0"] = metadata["symbol0"]
+        grouped["symbol1"] = metadata["symbol1"]
 
         # 计算分组的起始时间和结束时间
-        grouped["starttime"] = grouped.index
-        grouped["endtime"] = grouped.index + pd.to_timedelta(self.interval)
-        # 根据token0是否是稳定币动态设置 token0 和 token1
-        self.tokenAname = symbol0
-        self.tokenBname = symbol1
-        self.log(f"[INFO] Data processed successfully for DEX: {self.dex}")
+        grouped["pool_address"] = self.pooladdress
+        grouped["starttime"] = pd.to_datetime(grouped.index, unit="s")
+        grouped["endtime"] = grouped["starttime"] + pd.to_timedelta(step, unit="s")
         return grouped.reset_index(drop=True)
 
-    def save_to_csv(self, df):
+    def save_to_csv(self, df, existing_df=None, interval=None):
         """
-        保存处理后的数据到新的 CSV 文件中，并根据交易哈希去重
-        :param df: 处理后的数据 DataFrame
+        按 (pool_address, starttime) 把重新计算的分组 upsert 到 K 线文件中，其余分组保持不变
+        :param df: 处理后的数据 DataFrame（可以包含写入同一文件的多个池）
+        :param existing_df: 已读取的 K 线文件内容，为空时从磁盘读取
+        :param interval: 目标粒度，默认为最细粒度
         """
         # 检查 df 是否为空
         if df.empty:
             self.log("[WARNING] The DataFrame is empty. No data to save.")
             return  # 如果为空，输出警告并直接返回
-        result_folder = CONFIG["output_path"]
-
-        output_filename = f"{self.tokenAname}-{self.tokenBname}-{self.interval}.csv"
-        output_filepath = os.path.join(result_folder, output_filename)
-
-        # 如果文件已存在，则读取并去重；否则创建新文件
-        if os.path.exists(output_filepath):
-            existing_df = pd.read_csv(output_filepath)
-
-            # 合并现有数据和新数据，按交易哈希去重
-            combined_df = pd.concat([existing_df, df], ignore_index=True)
-
-            # 根据交易哈希去重，保留第一次出现的记录
-            combined_df = combined_df.drop_duplicates(subset=["transactionHashHash"], keep="first")
+        output_filepath = self.candle_path(interval)
+        if existing_df is None:
+            existing_df = self.load_candles(output_filepath)
+
+        if existing_df is not None:
+            # 删除被本次重新计算覆盖的 (池, 分组)，再追加新值；df 可以包含同一文件的多个池
+            keys = pd.MultiIndex.from_arrays([df["pool_address"].str.lower(), df["starttime"]])
+            replaced = pd.MultiIndex.from_arrays(
+                [existing_df["pool_address"].str.lower(), existing_df["starttime"]]
+            ).isin(keys)
+            combined_df = pd.concat([existing_df[~replaced], df], ignore_index=True)
         else:
             combined_df = df
+        combined_df = combined_df.sort_values(["starttime", "pool_address"], kind="stable")
 
         # 将 transactionHashHash 移动到第一列
         columns = ["transactionHashHash"] + [col for col in combined_df.columns if col != "transactionHashHash"]
         combined_df = combined_df[columns]
 
-        # 保存去重后的数据到 CSV
-        combined_df.to_csv(output_filepath, index=False)
-        self.log(f"[SUCCESS] Processed data saved to {output_filepath}")
+        # 原子替换，避免中断时留下半写的文件
+        tmp_filepath = f"{output_filepath}.tmp"
+        combined_df.to_csv(tmp_filepath, index=False)
+        METRICS.add("bytes_written", os.path.getsize(tmp_filepath))
+        os.replace(tmp_filepath, output_filepath)
+        self.log(f"[SUCCESS] Upserted {len(df)} buckets into {output_filepath}")
 
     def merge_data(self, processed_data):
         """
-        处理并合并数据：按 starttime 和 endtime 完全相同的数据合并，并处理交易哈希
+        处理并合并数据：按 starttime 和 endtime 完全相同的数据合并，分组指纹逐 lane 相加
         :param processed_data: 处理后的 DataFrame
         :return: 合并后的 DataFrame
         """
         self.log(f"[INFO] Merging data by starttime and endtime.")
 
 
-        # 按 starttime 和 endtime 分组，交易量求和，价格求平均
-        merged_data = processed_data.groupby(["starttime", "endtime", "symbol0", "symbol1"], as_index=False).agg({
+        # 按 starttime 和 endtime 分组，交易量求和
+        groups = processed_data.groupby(["starttime", "endtime", "symbol0", "symbol1", "pool_address"], as_index=False)
+        merged_data = groups.agg({
             "volume0": "sum",  # 交易量之和
-            "volume1": "sum",  # 价格平均值
-            "transactionHashHash": lambda x: hashlib.sha256(''.join(x).encode()).hexdigest()  # 合并交易哈希并计算 SHA256 哈希
+            "volume1": "sum",
         })
+        # 组号与 agg 输出的行顺序一致；键为空而被丢弃的行组号为 -1
+        codes = groups.ngroup().to_numpy()
+        kept = codes >= 0
+        fingerprints = Fingerprint.from_hex(processed_data["transactionHashHash"][kept].tolist())
+        merged_data["transactionHashHash"] = Fingerprint.to_hex(
+            Fingerprint.fold(fingerprints, codes[kept], len(merged_data))
+        )
 
 
         # 将 transactionHashHash 移动到第一列
@@ -249,20 +352,37 @@ class Calculator:
         self.log(f"[INFO] Data merged successfully.")
         return merged_data
 
-    def calculate(self):
+    def calculate(self, since=None):
         """
-        主计算函数，加载数据 -> 处理数据 -> 合并数据 -> 保存数据
+        主计算函数，一次加载同时输出全部粒度：加载数据 -> 最细粒度部分聚合 -> 逐粒度汇总 -> upsert 保存
+        只重新计算新 swap 涉及的分组
+        :param since: 可选的时间，补拉了该时间之后的历史 swap 时从这里起重新计算
+        :return: 是否成功
         """
         try:
             self.log(f"[INFO] Starting calculation for DEX: {self.dex}, PAIR: {self.tokenAname}-{self.tokenBname}")
-            raw_data = self.load_data()
-            processed_data = self.process_data(raw_data)
-            processed_data.to_csv('test.csv', index=False)
-            merge_data = self.merge_data(processed_data)
-            #merge_data.to_csv('test.csv', index=False)
-            self.save_to_csv(merge_data)
+            with METRICS.stage("load", self.pooladdress):
+                existing = {interval: self.load_candles(self.candle_path(interval)) for interval in self.intervals}
+                resume_times = [self.resume_time(existing_df) for existing_df in existing.values()]
+                # 从各粒度中最早的未完成分组开始重新计算
+                start_time = recompute_start(resume_times, since, self.intervals)
+                raw_data = self.load_data(start_time)
+            if raw_data.empty:
+                self.log(f"[INFO] No new swaps since {start_time}")
+                return True
+            with METRICS.stage("aggregate", self.pooladdress), METRICS.profile("aggregate"):
+                partials = self.process_data(raw_data)
+                merged = {
+                    interval: self.merge_data(self.to_candles(self.rollup(partials, interval), interval))
+                    for interval in self.intervals
+                }
+            with METRICS.stage("candle_store", self.pooladdress):
+                for interval in self.intervals:
+                    self.save_to_csv(merged[interval], existing[interval], interval)
+            return True
         except Exception as e:
             print_error(f"[ERROR] Calculation failed: {e}")
+            return False
 
 
 if __name__ == "__main__":
@@ -274,7 +394,7 @@ if __name__ == "__main__":
     tokenAname = "USDT"
     tokenA = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
     pooladdress = "0x11b815efB8f581194ae79006d24E0d814B7697F6"
-    interval = "5min"  # 时间间隔（10分钟）
+    interval = ["5min", "1h"]  # 时间间隔，可同时输出多个粒度
     enable_logging = True  # 日志开关
 
     # 初始化 Calculator 并调用计算函数
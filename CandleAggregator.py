@@ -0,0 +1,150 @@
+import pandas as pd
+from .Calculator import interval_seconds
+from .Metrics import METRICS
+from .SwapDecoder import swap_key
+
+
+class CandleAggregator:
+    def __init__(self, calculator, flush_buckets=1000):
+        """
+        流式 K 线聚合：解码后的分块直接进入运行中的分组，不再在同步结束后从磁盘重新加载
+        交易量与分组指纹都可相加：新分块只计算自身的部分聚合，再与仍可能增加 swap 的最细分组合并，
+        不重新处理该分组已有的 swap；更粗粒度未结束分组保留最细部分聚合；已结束的分组累积到一定数量后 upsert 写出
+        :param calculator: 该池的 Calculator（提供分组计算、元数据和 K 线文件 upsert）
+        :param flush_buckets: 已结束分组累积到该数量时写出一次
+        """
+        self.calculator = calculator
+        self.flush_buckets = max(1, int(flush_buckets))
+        self.enable_logging = calculator.enable_logging
+        self.partials = None  # 已结束的最细分组，所属的粗分组尚未全部写出
+        self.emitted = {interval: None for interval in calculator.intervals}  # 各粒度下一个待写出分组的起始 epoch
+        self.closed = {interval: [] for interval in calculator.intervals}  # 各粒度已结束、等待写出的分组
+        self.closed_count = 0
+
+        # 上次输出的最后一个分组可能不完整：用已存储的 swap 重新计算它
+        self.open = None  # 最细粒度中尚未结束的分组的部分聚合
+        if calculator.data_exists():
+            resume_times = [
+                calculator.resume_time(calculator.load_candles(calculator.candle_path(interval)))
+                for interval in calculator.intervals
+            ]
+            start_time = None if any(t is None for t in resume_times) else min(resume_times)
+            stored = self.clean(calculator.load_data(start_time))
+            if stored is not None:
+                self.open = calculator.process_data(stored)
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    @staticmethod
+    def clean(decoded_logs):
+        """与 SwapStore 写入时一致：丢弃没有时间戳的记录并按 (transactionHash, logIndex) 去重."""
+        if decoded_logs is None or len(decoded_logs) == 0:
+            return None
+        df = pd.DataFrame(decoded_logs)
+        df = df[df["timestamp"].notna()].drop_duplicates(subset=swap_key(df), keep="first")
+        return df if not df.empty else None
+
+    def update(self, decoded_logs):
+        """
+        合并一个新分块：最细粒度中除最后一个分组外均已结束，汇总出各粒度中已结束的分组
+        分块之间的区块不重叠，新分块的部分聚合直接与尚未结束的分组相加，开销只与新 swap 数成正比
+        :param decoded_logs: 按区块顺序解码的 swap DataFrame
+        """
+        new_data = self.clean(decoded_logs)
+        if new_data is None:
+            return
+        with METRICS.stage("aggregate", self.calculator.pooladdress), METRICS.profile("aggregate"):
+            partials = self.calculator.process_data(new_data)
+            if self.open is not None:
+                partials = self.calculator.combine(pd.concat([self.open, partials]))
+            open_start = int(partials.index.max())
+            self.open = partials[partials.index >= open_start]
+            self.add_partials(partials[partials.index < open_start])
+            self.emit(open_start)
+        if self.closed_count >= self.flush_buckets:
+            self.flush(final=False)
+
+    def snapshot(self, interval, unconfirmed=None):
+        """
+        当前的 K 线：从下一个待写出的分组开始，包括尚未结束的分组，不改变聚合器状态
+        :param interval: 粒度
+        :param unconfirmed: 可选的尚未确认（可能被重组）的 swap DataFrame 列表，只计入本次结果
+        :return: K 线 DataFrame，没有数据时为 None
+        """
+        frames = [df for df in unconfirmed or [] if df is not None and len(df)]
+        parts = [part for part in (self.partials, self.open) if part is not None]
+        swaps = self.clean(pd.concat(frames, ignore_index=True)) if frames else None
+        if swaps is not None:
+            parts.append(self.calculator.process_data(swaps))
+        if not parts:
+            return None
+        partials = self.calculator.combine(pd.concat(parts))
+        start = self.emitted[interval]
+        if start is not None:
+            partials = partials[partials.index >= start]
+        if partials.empty:
+            return None
+        return self.calculator.to_candles(self.calculator.rollup(partials, interval), interval, start)
+
+    def add_partials(self, partials):
+        """追加已结束的最细分组."""
+        if partials.empty:
+            return
+        self.partials = partials if self.partials is None else pd.concat([self.partials, partials])
+
+    def emit(self, boundary=None):
+        """
+        汇总各粒度中已结束的分组
+        :param boundary: 最细粒度中该 epoch 之前的分组均已结束；为 None 时所有分组都视为已结束
+        """
+        if self.partials is None or self.partials.empty:
+            self.partials = None
+            return
+        last = int(self.partials.index.max())
+        limits = []
+        for interval in self.calculator.intervals:
+            step = interval_seconds(interval)
+            # 起始于 limit 之前的分组已结束
+            limit = boundary // step * step if boundary is not None else (last // step + 1) * step
+            limits.append(limit)
+            start = self.emitted[interval]
+            index = self.partials.index
+            rows = self.partials[(index < limit) & (index >= (start if start is not None else index.min()))]
+            if start is None:
+                if rows.empty:
+                    continue
+                start = int(rows.index.min()) // step * step
+            if start >= limit:
+                continue
+            buckets = self.calculator.rollup(rows, interval)
+            candles = self.calculator.to_candles(buckets, interval, start, limit)
+            self.closed[interval].append(candles)
+            self.closed_count += len(candles)
+            self.emitted[interval] = limit
+        # 所有粒度都已汇总的最细分组不再需要；全部汇总后置为 None，而不是留下空的 DataFrame
+        remaining = self.partials[self.partials.index >= min(limits)]
+        self.partials = remaining if not remaining.empty else None
+
+    def flush(self, final=True):
+        """
+        把已结束的分组 upsert 到各粒度的 K 线文件
+        :param final: 为 True 时同时写出所有未结束的分组（下次运行会从它们重新计算）
+        """
+        if final:
+            if self.open is not None:
+                self.add_partials(self.open)
+                self.open = None
+            self.emit()
+        for interval in self.calculator.intervals:
+            if not self.closed[interval]:
+                continue
+            candles = pd.concat(self.closed[interval], ignore_index=True)
+            self.closed[interval] = []
+            # 同一交易对的多个池共用一个 K 线文件，写出时重新读取
+            with METRICS.stage("candle_store", self.calculator.pooladdress):
+                self.calculator.save_to_csv(self.calculator.merge_data(candles), interval=interval)
+            self.log(f"[STREAM] Flushed {len(candles)} {interval} buckets for {self.calculator.pooladdress}")
+        self.closed_count = 0
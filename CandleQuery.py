@@ -0,0 +1,333 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+from .config import CONFIG
+from .Metrics import METRICS
+from .SwapStore import SwapStore, pq
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+def to_epoch_ns(value):
+    """时间参数（datetime / 字符串 / Timestamp）-> UTC epoch 纳秒；不带时区的时间按 UTC 处理，与输出文件一致."""
+    return pd.Timestamp(value).value
+
+
+class TimeIndex:
+    def __init__(self, frame, column):
+        """
+        一个输出文件（或一个 swap 日分区）的排序时间索引：时间列转为 int64 epoch 数组，区间查询用二分查找定位行号
+        :param frame: 文件内容；未按时间排序时按时间稳定排序
+        :param column: 时间列（K 线为 starttime，swap 为 timestamp）
+        """
+        epochs = frame[column].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        if len(epochs) and (np.diff(epochs) < 0).any():
+            order = np.argsort(epochs, kind="stable")
+            frame = frame.iloc[order]
+            epochs = epochs[order]
+        self.frame = frame.reset_index(drop=True)
+        self.epochs = epochs
+        self.pools = {}  # 池地址（小写）-> (行号, 对应的 epoch)，首次按池查询时建立
+        self.nbytes = int(self.frame.memory_usage(deep=True).sum()) + self.epochs.nbytes
+
+    def pool_positions(self, pool_address):
+        """某个池的行号与 epoch（均按时间有序）."""
+        key = pool_address.lower()
+        if key not in self.pools:
+            if "pool_address" not in self.frame.columns:
+                raise ValueError("File has no pool_address column")
+            positions = np.flatnonzero(self.frame["pool_address"].str.lower().to_numpy() == key)
+            self.pools[key] = (positions, self.epochs[positions])
+            self.nbytes += positions.nbytes * 2
+        return self.pools[key]
+
+    def bounds(self, start, end, pool_address=None):
+        """[start, end) 对应的行号区间；pool_address 不为空时为该池行号数组中的区间."""
+        epochs = self.epochs if pool_address is None else self.pool_positions(pool_address)[1]
+        lo = 0 if start is None else int(np.searchsorted(epochs, start, side="left"))
+        hi = len(epochs) if end is None else int(np.searchsorted(epochs, end, side="left"))
+        return lo, max(lo, hi)
+
+    def rows(self, lo, hi, pool_address=None):
+        if pool_address is None:
+            return self.frame.iloc[lo:hi]
+        return self.frame.iloc[self.pool_positions(pool_address)[0][lo:hi]]
+
+    def at(self, moment, pool_address=None):
+        """包含该时刻的分组：starttime <= moment < endtime 的行（每个池一行）."""
+        epochs = self.epochs if pool_address is None else self.pool_positions(pool_address)[1]
+        last = int(np.searchsorted(epochs, moment, side="right"))
+        if last == 0:
+            return self.rows(0, 0, pool_address)
+        first = int(np.searchsorted(epochs, epochs[last - 1], side="left"))
+        rows = self.rows(first, last, pool_address)
+        return rows[rows["endtime"].to_numpy(dtype="datetime64[ns]").view(np.int64) > moment]
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        """按字节数限制的 LRU 缓存，最久未使用的条目先淘汰；至少保留最新的一个条目."""
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()  # 键 -> (值, 字节数)，最久未使用的在前
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.total_bytes -= size
+
+    def discard(self, key):
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+
+
+class CandleQuery:
+    def __init__(self, output_path=None, max_bytes=None, enable_logging=True):
+        """
+        K 线与 swap 输出的只读查询接口：按需加载文件并建立排序时间索引，区间与时点查询为二分查找
+        已加载的文件索引与最近查询的区间结果保存在同一个按字节数限制的 LRU 缓存中；
+        文件被重新写出（修改时间或大小变化）后，下一次查询时重新加载
+        返回的 DataFrame 与缓存共享，调用方需要修改时先 copy()
+        :param output_path: 输出目录，默认为 CONFIG["output_path"]
+        :param max_bytes: 缓存内存上限（字节），默认为 CONFIG["query_cache_bytes"]
+        :param enable_logging: 是否启用日志输出
+        """
+        self.output_path = output_path or CONFIG["output_path"]
+        self.cache = LRUCache(CONFIG["query_cache_bytes"] if max_bytes is None else max_bytes)
+        self.enable_logging = enable_logging
+        self.server = None
+        self.thread = None
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def candle_path(self, symbolA, symbolB, interval, combined=False):
+        """
+        K 线文件路径；文件名中的代币顺序由池的 token0/token1 决定，两种顺序都查找
+        :return: 路径；两种顺序的文件都不存在时为 None
+        """
+        suffix = "-all" if combined else ""
+        for first, second in ((symbolA, symbolB), (symbolB, symbolA)):
+            path = os.path.join(self.output_path, f"{first}-{second}-{interval}{suffix}.csv")
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def read_candles(path):
+        METRICS.add("bytes_read", os.path.getsize(path))
+        df = pd.read_csv(path, dtype={"transactionHashHash": str}, memory_map=True)
+        df["starttime"] = pd.to_datetime(df["starttime"])
+        df["endtime"] = pd.to_datetime(df["endtime"])
+        return df
+
+    def index(self, path, column, loader):
+        """
+        取文件的时间索引：缓存中的索引与文件当前的修改时间、大小一致时直接使用，否则重新加载
+        :return: (TimeIndex, 文件版本)
+        """
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        key = ("index", path)
+        cached = self.cache.get(key)
+        if cached is not None and cached[1] == stamp:
+            return cached
+        index = TimeIndex(loader(path), column)
+        self.cache.put(key, (index, stamp), index.nbytes)
+        self.log(f"[QUERY] Indexed {len(index.epochs)} rows of {path}")
+        return index, stamp
+
+    def query_range(self, path, column, loader, start, end, pool_address=None):
+        """在一个文件上做区间查询，结果按 (文件版本, 行号区间) 缓存."""
+        index, stamp = self.index(path, column, loader)
+        lo, hi = index.bounds(start, end, pool_address)
+        key = ("range", path, stamp, pool_address and pool_address.lower(), lo, hi)
+        rows = self.cache.get(key)
+        if rows is None:
+            rows = index.rows(lo, hi, pool_address)
+            self.cache.put(key, rows, int(rows.memory_usage(deep=True).sum()))
+        return rows
+
+    def candles(self, symbolA, symbolB, interval, start_time=None, end_time=None, pool_address=None, combined=False):
+        """
+        区间查询：starttime 在 [start_time, end_time) 内的 K 线
+        :param pool_address: 只返回该池的 K 线，None 表示文件中的所有池
+        :param combined: 查询交易对的合并 K 线（{symbol0}-{symbol1}-{interval}-all.csv）
+        :return: DataFrame；K 线文件不存在时为 None
+        """
+        path = self.candle_path(symbolA, symbolB, interval, combined)
+        if path is None:
+            return None
+        start = None if start_time is None else to_epoch_ns(start_time)
+        end = None if end_time is None else to_epoch_ns(end_time)
+        return self.query_range(path, "starttime", self.read_candles, start, end, pool_address)
+
+    def candle_at(self, symbolA, symbolB, interval, moment, pool_address=None, combined=False):
+        """
+        时点查询：包含该时刻的分组（每个池一行）
+        :return: DataFrame；K 线文件不存在时为 None
+        """
+        path = self.candle_path(symbolA, symbolB, interval, combined)
+        if path is None:
+            return None
+        index, _ = self.index(path, "starttime", self.read_candles)
+        return index.at(to_epoch_ns(moment), pool_address)
+
+    def swaps(self, dex, tokenA_name, tokenB_name, start_time=None, end_time=None, pool_address=None):
+        """
+        区间查询：timestamp 在 [start_time, end_time) 内的 swap
+        parquet 存储按池、按日分区，只加载与区间相交的分区（内存映射读取），每个分区单独索引和缓存
+        :param pool_address: 只返回该池的 swap，为 None 时返回交易对在该 DEX 下所有池的 swap（以 pool_address 列区分）
+        :return: DataFrame；没有存储的 swap 时为 None
+        """
+        start = None if start_time is None else to_epoch_ns(start_time)
+        end = None if end_time is None else to_epoch_ns(end_time)
+        if CONFIG["swap_store"] != "parquet":
+            path = os.path.join(self.output_path, f"{dex}-{tokenA_name}-{tokenB_name}.csv")
+            if not os.path.exists(path):
+                return None
+            df = self.query_range(path, "timestamp", self.read_swap_csv, start, end)
+            if pool_address is not None and "pool_address" in df.columns:
+                df = df[df["pool_address"].str.lower() == pool_address.lower()].reset_index(drop=True)
+            return df
+
+        store = SwapStore(os.path.join(self.output_path, "swaps"), self.enable_logging)
+        pool_dirs = store.pool_dirs(dex, tokenA_name, tokenB_name, pool_address)
+        if not pool_dirs:
+            return None
+        loader = lambda path: self.read_partition(store, dex, path)
+        frames = [
+            self.query_range(path, "timestamp", loader, start, end)
+            for path in store.partitions(dex, tokenA_name, tokenB_name, start_time, end_time, pool_address)
+        ]
+        if not frames:
+            return store.from_table(dex, store.schema(dex).empty_table())
+        df = pd.concat(frames, ignore_index=True)
+        if len(pool_dirs) > 1:
+            df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+        return df
+
+    @staticmethod
+    def read_swap_csv(path):
+        METRICS.add("bytes_read", os.path.getsize(path))
+        df = pd.read_csv(path, memory_map=True)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        return df
+
+    @staticmethod
+    def read_partition(store, dex, path):
+        METRICS.add("bytes_read", os.path.getsize(path))
+        return store.from_table(dex, pq.read_table(path, memory_map=True))
+
+    def serve(self, host=None, port=None):
+        """
+        在后台线程中启动本地 HTTP 查询服务（只读，返回 JSON 记录数组）：
+            GET /candles?pair=USDT-WETH&interval=5min&start=...&end=...[&pool=0x...][&combined=1]
+            GET /candle?pair=USDT-WETH&interval=5min&time=...[&pool=0x...][&combined=1]
+            GET /swaps?dex=uniswap_v3&pair=USDT-WETH&start=...&end=...[&pool=0x...]
+        :return: 服务地址
+        """
+        host = host or CONFIG["query_http_host"]
+        port = CONFIG["query_http_port"] if port is None else port
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        self.log(f"[QUERY] Serving candle queries on http://{host}:{port}")
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def handle(self, path, params):
+        """HTTP 请求 -> (状态码, 结果 DataFrame 或错误信息)."""
+        arg = lambda name: params.get(name, [None])[0]
+        pair = arg("pair") or ""
+        if pair.count("-") != 1:
+            return 400, "pair must be {symbolA}-{symbolB}"
+        symbolA, symbolB = pair.split("-")
+        combined = arg("combined") in ("1", "true")
+        if path == "/candles":
+            df = self.candles(symbolA, symbolB, arg("interval"), arg("start"), arg("end"), arg("pool"), combined)
+        elif path == "/candle":
+            if arg("time") is None:
+                return 400, "time is required"
+            df = self.candle_at(symbolA, symbolB, arg("interval"), arg("time"), arg("pool"), combined)
+        elif path == "/swaps":
+            df = self.swaps(arg("dex"), symbolA, symbolB, arg("start"), arg("end"), arg("pool"))
+        else:
+            return 404, f"Unknown endpoint: {path}"
+        if df is None:
+            return 404, f"No data for {pair}"
+        return 200, df
+
+    def handler_class(self):
+        query = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                try:
+                    status, result = query.handle(url.path, parse_qs(url.query))
+                except (ValueError, TypeError) as e:
+                    status, result = 400, str(e)
+                except Exception as e:
+                    print_error(f"[QUERY] {self.path} failed: {e}")
+                    status, result = 500, str(e)
+                if status == 200:
+                    data = result.to_json(orient="records", date_format="iso", default_handler=str).encode()
+                else:
+                    data = json.dumps({"error": result}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # 启动本地查询服务，例如：
+    #     curl "http://127.0.0.1:8600/candles?pair=USDT-WETH&interval=5min&start=2025-01-13T00:00&end=2025-01-13T02:00"
+    query = CandleQuery()
+    query.serve()
+    query.thread.join()
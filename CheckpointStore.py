@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+def merge_ranges(ranges):
+    """合并重叠或相邻的区块区间，返回按起点排序的 [[from, to], ...]."""
+    merged = []
+    for from_block, to_block in sorted(ranges):
+        if merged and from_block <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], to_block)
+        else:
+            merged.append([from_block, to_block])
+    return merged
+
+
+def parse_ranges(value):
+    """检查点文件中的一个条目：区间列表；旧版只记录最后一个区块，视为从区块 0 起连续同步."""
+    if isinstance(value, list):
+        return merge_ranges([int(from_block), int(to_block)] for from_block, to_block in value)
+    return [[0, int(value)]]
+
+
+class CheckpointStore:
+    def __init__(self, checkpoint_path, enable_logging=True, file_lock=None):
+        """
+        每个池的同步检查点：记录已完整写入的区块区间（合并后的 [[from, to], ...]）
+        不只是最后一个区块：请求早于已同步区间的时间窗口时，只有其中的空缺需要拉取，而不是被整体跳过
+        每次提交后立即落盘，进程中断后下次运行从检查点之后继续
+        :param checkpoint_path: 检查点文件路径 (JSON)
+        :param enable_logging: 是否启用日志输出
+        :param file_lock: 可选的跨进程锁；多个进程共用同一文件时，写入前先合并磁盘上其他池的检查点
+        """
+        self.checkpoint_path = checkpoint_path
+        self.enable_logging = enable_logging
+        self.file_lock = file_lock
+        self.checkpoints = {}  # 池标识 -> [[from, to], ...]
+        self._lock = threading.Lock()
+        self.load()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def read(self):
+        """读取磁盘上的检查点，文件不存在或损坏时为 None."""
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                return {key: parse_ranges(value) for key, value in json.load(f).items()}
+        except (OSError, ValueError, TypeError) as e:
+            print_error(f"[CHECKPOINT] Failed to load {self.checkpoint_path}: {e}")
+            return None
+
+    def load(self):
+        """从磁盘加载检查点."""
+        checkpoints = self.read()
+        if checkpoints is None:
+            return
+        self.checkpoints = checkpoints
+        self.log(f"[CHECKPOINT] Loaded {len(self.checkpoints)} checkpoints from {self.checkpoint_path}")
+
+    def get(self, key):
+        """
+        :param key: 池标识
+        :return: 已同步的最后一个区块，没有记录时为 None
+        """
+        ranges = self.checkpoints.get(key)
+        return ranges[-1][1] if ranges else None
+
+    def ranges(self, key):
+        """:return: 已同步的区块区间 [(from, to), ...]，按起点排序."""
+        return [tuple(entry) for entry in self.checkpoints.get(key, ())]
+
+    def missing(self, key, from_block, to_block):
+        """
+        [from_block, to_block] 中尚未同步的区块区间
+        :return: [(from, to), ...]，按起点排序
+        """
+        gaps = []
+        cursor = from_block
+        for covered_from, covered_to in self.checkpoints.get(key, ()):
+            if covered_to < cursor:
+                continue
+            if covered_from > to_block:
+                break
+            if covered_from > cursor:
+                gaps.append((cursor, covered_from - 1))
+            cursor = covered_to + 1
+        if cursor <= to_block:
+            gaps.append((cursor, to_block))
+        return gaps
+
+    def add(self, key, from_block, to_block):
+        """记录 [from_block, to_block] 已完整写入，并立即写盘（原子替换）."""
+        if self.file_lock is None:
+            self._write(key, from_block, to_block)
+        else:
+            with self.file_lock:
+                self.checkpoints.update(self.read() or {})
+                self._write(key, from_block, to_block)
+        self.log(f"[CHECKPOINT] {key} += {from_block}-{to_block}")
+
+    def _write(self, key, from_block, to_block):
+        with self._lock:
+            self.checkpoints[key] = merge_ranges(self.checkpoints.get(key, []) + [[int(from_block), int(to_block)]])
+            directory = os.path.dirname(self.checkpoint_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f"{self.checkpoint_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.checkpoints, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.checkpoint_path)
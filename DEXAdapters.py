@@ -0,0 +1,140 @@
+from web3 import Web3
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+def function_selector(name, types):
+    """函数选择器：签名 keccak256 的前 4 字节."""
+    return Web3.keccak(text=f"{name}({','.join(types)})")[:4]
+
+
+def event_topic(signature):
+    """事件主题：签名的 keccak256（0x 开头的十六进制字符串）."""
+    return Web3.to_hex(Web3.keccak(text=signature))
+
+
+# 工厂合约查询函数的参数类型，选择器在导入时计算一次
+FACTORY_FUNCTIONS = {
+    "getPool": ["address", "address", "uint24"],
+    "getPair": ["address", "address"],
+}
+FACTORY_SELECTORS = {name: function_selector(name, types) for name, types in FACTORY_FUNCTIONS.items()}
+
+# 工厂查询函数 -> 该工厂创建池时发出的事件
+CREATION_EVENTS = {
+    "getPool": "PoolCreated(address,address,uint24,int24,address)",  # Uniswap V3 类：token0/token1/fee 为 indexed
+    "getPair": "PairCreated(address,address,address,uint256)",  # Uniswap V2 类：token0/token1 为 indexed
+}
+CREATION_TOPICS = {name: event_topic(signature) for name, signature in CREATION_EVENTS.items()}
+
+# 两类池 Swap 事件 data 字段的公共部分（每个字段占一个 32 字节的 word）
+V2_LAYOUT = [
+    ("amount0In", "uint256"),
+    ("amount1In", "uint256"),
+    ("amount0Out", "uint256"),
+    ("amount1Out", "uint256"),
+]
+V3_LAYOUT = [
+    ("amount0", "int256"),
+    ("amount1", "int256"),
+    ("sqrtPriceX96", "uint160"),
+    ("liquidity", "uint128"),
+    ("tick", "int24"),
+]
+
+
+class DEXAdapter:
+    def __init__(self, name, swap_event, data_layout, topic_fields, volume_fields, factory_function, fee_tiers=()):
+        """
+        一个 DEX 的固定解码与查询参数，在导入时构造一次；提取、解码、存储与聚合都按 dex 名称查表取用
+        :param name: DEX 名称（factory.csv 的 dex 列）
+        :param swap_event: Swap 事件签名
+        :param data_layout: data 字段布局 [(列名, ABI 类型), ...]
+        :param topic_fields: 需要输出的 indexed 参数 [(列名, topics 下标), ...]
+        :param volume_fields: (token0 交易量列, token1 交易量列)，有符号的列取绝对值后相加
+        :param factory_function: 工厂查询函数名（getPool / getPair），同时决定池创建事件
+        :param fee_tiers: 工厂支持的费率档（getPool 类）
+        """
+        if factory_function not in FACTORY_FUNCTIONS:
+            raise ValueError(f"Unsupported factory function: {factory_function}")
+        self.name = name
+        self.swap_event = swap_event
+        self.swap_topic = event_topic(swap_event)
+        self.data_layout = list(data_layout)
+        self.abi_types = [abi_type for _, abi_type in self.data_layout]
+        self.topic_fields = list(topic_fields)
+        self.min_topics = max([index for _, index in self.topic_fields], default=-1) + 1
+        field_types = dict(self.data_layout)
+        # 每一侧：[(列名, 是否有符号), ...]
+        self.volume_fields = tuple(
+            [(field, field_types[field].startswith("int")) for field in fields] for fields in volume_fields
+        )
+        self.factory_function = factory_function
+        self.factory_selector = FACTORY_SELECTORS[factory_function]
+        self.creation_topic = CREATION_TOPICS[factory_function]
+        self.fee_tiers = tuple(fee_tiers)
+
+    def __repr__(self):
+        return f"DEXAdapter({self.name})"
+
+
+DEX_ADAPTERS = {
+    adapter.name: adapter for adapter in (
+        DEXAdapter(
+            "uniswap_v3",
+            "Swap(address,address,int256,int256,uint160,uint128,int24)",
+            V3_LAYOUT,
+            [],
+            (["amount0"], ["amount1"]),
+            "getPool",
+            (100, 500, 3000, 10000),
+        ),
+        DEXAdapter(
+            "uniswap_v2",
+            "Swap(address,uint256,uint256,uint256,uint256,address)",
+            V2_LAYOUT,
+            [("sender", 1), ("to", 2)],
+            (["amount0In", "amount0Out"], ["amount1In", "amount1Out"]),
+            "getPair",
+        ),
+        DEXAdapter(
+            "PancakeSwap_v2",
+            "Swap(address,uint256,uint256,uint256,uint256,address)",
+            V2_LAYOUT,
+            [("sender", 1), ("to", 2)],
+            (["amount0In", "amount0Out"], ["amount1In", "amount1Out"]),
+            "getPair",
+        ),
+        DEXAdapter(
+            "sushiswap_v2",
+            "Swap(address,uint256,uint256,uint256,uint256,address)",
+            V2_LAYOUT,
+            [("sender", 1), ("to", 2)],
+            (["amount0In", "amount0Out"], ["amount1In", "amount1Out"]),
+            "getPair",
+        ),
+        DEXAdapter(
+            "PancakeSwap_v3",
+            # 比 Uniswap V3 多出两个协议费字段
+            "Swap(address,address,int256,int256,uint160,uint128,int24,uint128,uint128)",
+            V3_LAYOUT + [("protocolFeesToken0", "uint128"), ("protocolFeesToken1", "uint128")],
+            [],
+            (["amount0"], ["amount1"]),
+            "getPool",
+            (100, 500, 2500, 10000),
+        ),
+    )
+}
+
+
+def get_adapter(dex):
+    """
+    按名称取 DEX 适配器
+    :raises ValueError: 未注册的 DEX
+    """
+    adapter = DEX_ADAPTERS.get(dex)
+    if adapter is None:
+        print_error(f"Unsupported DEX type: {dex}")
+        raise ValueError(f"Unsupported DEX type: {dex}")
+    return adapter
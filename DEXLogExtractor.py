@@ -7,34 +7,59 @@ import binascii
 import pandas as pd
 import os
 from .config import CONFIG
+from .RPCClient import RPCClient
+from .BlockIndex import BlockIndex
+from .LogFetcher import LogFetcher, prefetch
+from .SwapDecoder import decode_swaps, swap_key
+from .DEXAdapters import DEX_ADAPTERS, get_adapter
+from .SwapStore import SwapStore
+from .Metrics import METRICS
 def print_error(message):
     # 红色的 ANSI 转义字符代码是 31
     print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
 
 
 class DEXLogExtractor:
-    def __init__(self, rpc_url, dex, pool_address, start_time, end_time, enable_logging):
+    def __init__(self, rpc_url, dex, pool_address, start_time, end_time, enable_logging,
+                 rpc_client=None, block_index=None, log_fetcher=None):
         """
         初始化提取器
         :param rpc_url: 区块链节点的 RPC URL
-        :param dex: DEX 类型，例如 'pancake_v3' 或 'uniswap_v3'
+        :param dex: DEX 类型，例如 'PancakeSwap_v2' 或 'uniswap_v3'（见 DEXAdapters）
         :param pool_address: 流动性池地址
         :param start_time: 查询的开始时间 (datetime 对象)
         :param end_time: 查询的结束时间 (datetime 对象)
         :param enable_logging: 是否启用日志输出 (默认启用)
+        :param rpc_client: 共享的 RPCClient，为空时自行创建
+        :param block_index: 共享的 BlockIndex，为空时使用配置中的索引文件
+        :param log_fetcher: 共享的 LogFetcher，为空时按配置创建
         """
-        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
+        self.rpc = rpc_client or RPCClient(rpc_url, enable_logging=enable_logging)
+        self.web3 = self.rpc.web3
+        self.block_index = block_index or BlockIndex(
+            self.rpc,
+            CONFIG["block_index_path"],
+            enable_logging,
+            batch_size=CONFIG["block_batch_size"],
+            max_workers=CONFIG["block_max_workers"],
+            cache_size=CONFIG["block_cache_size"]
+        )
+        self.log_fetcher = log_fetcher or LogFetcher(
+            self.rpc,
+            chunk_size=CONFIG["log_chunk_size"],
+            max_chunk_size=CONFIG["log_max_chunk_size"],
+            grow_threshold=CONFIG["log_grow_threshold"],
+            max_workers=CONFIG["log_max_workers"],
+            enable_logging=enable_logging
+        )
         #self.web3.middleware_onion.inject(geth_poa_middleware, layer=0)
         self.dex = dex
         self.pool_address = pool_address
         self.start_time = start_time
         self.end_time = end_time
         self.enable_logging = enable_logging  # 控制日志输出的变量
-        self.topic_map = {
-            "PancakeSwap_v2": "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822",
-            "uniswap_v3": "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67",
-            "uniswap_v2": "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
-        }
+        # 未注册的 DEX 在解码时报错
+        self.adapter = DEX_ADAPTERS.get(dex)
 
         # 日志输出初始化信息
         self.log(f"[INIT] Initialized DEXLogExtractor with:")
@@ -50,32 +75,137 @@ class DEXLogExtractor:
             print(message)
 
     def datetime_to_block(self, target_datetime):
-        """Binary search to find the closest block to a given datetime."""
-        target_timestamp = int(target_datetime.timestamp())
-        latest_block = self.web3.eth.block_number
-        earliest_block = 0
-
-        while earliest_block <= latest_block:
-            mid_block = (earliest_block + latest_block) // 2
-            mid_timestamp = self.web3.eth.get_block(mid_block)["timestamp"]
-
-            if mid_timestamp < target_timestamp:
-                earliest_block = mid_block + 1
-            elif mid_timestamp > target_timestamp:
-                latest_block = mid_block - 1
-            else:
-                self.log(f"[BLOCK SEARCH] Exact match found: {mid_block}")
-                return mid_block
-
-        self.log(f"[BLOCK SEARCH] Closest block found: {earliest_block}")
-        return earliest_block
+        """Find the first block at or after a given datetime via the shared block index."""
+        return self.block_index.datetime_to_block(target_datetime)
+
+    def block_range(self):
+        """
+        Resolve class-level start_time and end_time to (start_block, end_block).
+        start_time 为空时起点为 None（由检查点决定），end_time 为空时同步到链头
+        """
+        with METRICS.stage("block_search"):
+            return self.block_index.block_window(self.start_time, self.end_time, CONFIG["sync_confirmations"])
+
+    @property
+    def checkpoint_key(self):
+        """检查点存储中的池标识."""
+        return f"{self.dex}:{self.pool_address.lower()}"
+
+    def pending_ranges(self, start_block, end_block, checkpoints):
+        """
+        计算本次需要同步的区块区间：时间窗口 [start_block, end_block] 中检查点尚未覆盖的部分
+        窗口早于已同步区间时（如先同步了近期、再请求更早的时间窗口），其中的空缺同样需要拉取
+        :param start_block: 时间窗口起点，为 None 时从检查点之后第一个区块开始
+        :param checkpoints: CheckpointStore 实例
+        :return: [(from, to), ...]；既没有检查点也没有起点时为 None
+        """
+        if start_block is None:
+            last_block = checkpoints.get(self.checkpoint_key)
+            if last_block is None:
+                return None
+            start_block = last_block + 1
+        if start_block > end_block:
+            return []
+        return checkpoints.missing(self.checkpoint_key, start_block, end_block)
+
+    def backfill_time(self, ranges, checkpoints):
+        """
+        空缺中位于已同步的最后一个区块之前的部分是补拉的历史数据：其 swap 早于已输出的 K 线，
+        流式聚合（只接受按时间递增的分块）无法处理，需要从该时间起重新计算 K 线
+        :param ranges: pending_ranges 的结果（提交检查点之前）
+        :return: 最早补拉区块的时间（pandas Timestamp，UTC）；没有补拉时为 None
+        """
+        last_block = checkpoints.get(self.checkpoint_key)
+        if last_block is None or not ranges or ranges[0][0] > last_block:
+            return None
+        return pd.Timestamp(self.block_index.get_timestamp(ranges[0][0]), unit="s")
+
+    def commit_chunk(self, logs, chunk_from, chunk_to, checkpoints, tokenA_name, tokenB_name, result_dir, block_timestamps=None):
+        """
+        解码并写入一个区块分块，写入成功后把分块记入检查点
+        :param logs: 该分块内本池的日志
+        :param chunk_from: 分块的第一个区块
+        :param chunk_to: 分块的最后一个区块
+        :param checkpoints: CheckpointStore 实例
+        :return: 该分块的解码结果
+        """
+        decoded_logs = self.decode_logs(logs, block_timestamps)
+        self.commit_decoded(decoded_logs, chunk_from, chunk_to, checkpoints, tokenA_name, tokenB_name, result_dir)
+        return decoded_logs
+
+    def commit_decoded(self, decoded_logs, chunk_from, chunk_to, checkpoints, tokenA_name, tokenB_name, result_dir):
+        """
+        写入已解码的 swap，写入成功后把 [chunk_from, chunk_to] 记入检查点
+        :param decoded_logs: 该分块的解码结果（可为空）
+        """
+        with METRICS.stage("store", self.checkpoint_key):
+            self.save(decoded_logs, tokenA_name, tokenB_name, result_dir)
+        checkpoints.add(self.checkpoint_key, chunk_from, chunk_to)
+
+    def sync(self, checkpoints, tokenA_name, tokenB_name, result_dir, aggregator=None, window=None):
+        """
+        增量同步：只拉取检查点尚未覆盖的区块，逐块写入并提交检查点
+        拉取与时间戳补全在后台线程中提前进行，与解码、写盘重叠
+        :param checkpoints: CheckpointStore 实例
+        :param aggregator: 可选的 CandleAggregator，解码后的分块直接进入 K 线聚合（补拉的历史分块除外）
+        :param window: 已解析的 (start_block, end_block)，为空时按 start_time / end_time 解析
+        :return: 补拉历史数据时最早补拉区块的时间（K 线需要从该时间起重新计算），否则为 None
+        """
+        start_block, end_block = window or self.block_range()
+        ranges = self.pending_ranges(start_block, end_block, checkpoints)
+        if ranges is None:
+            print_error(f"[SYNC] No checkpoint for {self.checkpoint_key}, a start_time is required for the first sync")
+            return None
+        if not ranges:
+            self.log(f"[SYNC] {self.checkpoint_key} is up to date at block {end_block}")
+            return None
+
+        backfill_time = self.backfill_time(ranges, checkpoints)
+        last_block = checkpoints.get(self.checkpoint_key)
+        for range_from, range_to in ranges:
+            self.log(f"[SYNC] {self.checkpoint_key}: blocks {range_from}-{range_to}")
+            # 补拉的区间早于已写出的 K 线，不进入流式聚合
+            stream = aggregator if last_block is None or range_from > last_block else None
+            chunks = self.iter_timestamped_chunks(range_from, range_to)
+            for chunk_from, chunk_to, logs, block_timestamps in prefetch(chunks, CONFIG["stream_queue_depth"]):
+                decoded_logs = self.commit_chunk(
+                    logs, chunk_from, chunk_to, checkpoints, tokenA_name, tokenB_name, result_dir, block_timestamps
+                )
+                if stream is not None:
+                    stream.update(decoded_logs)
+        self.block_index.save()
+        return backfill_time
+
+    def iter_timestamped_chunks(self, start_block, end_block):
+        """
+        按区块顺序产出 (chunk_from, chunk_to, logs, block_timestamps)，时间戳在拉取阶段批量补全
+        """
+        chunks = self.log_fetcher.iter_chunks(self.pool_address, [self.topic], start_block, end_block)
+        while True:
+            with METRICS.stage("fetch", self.checkpoint_key):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            chunk_from, chunk_to, logs = chunk
+            with METRICS.stage("timestamps", self.checkpoint_key):
+                block_timestamps = self.block_index.get_timestamps(
+                    log["blockNumber"] for log in logs if log.get("blockNumber")
+                )
+            yield chunk_from, chunk_to, logs, block_timestamps
+
+    @property
+    def topic(self):
+        """
+        Swap 事件主题
+        :raises ValueError: 未注册的 DEX（不能以空主题拉取该池的全部事件）
+        """
+        return get_adapter(self.dex).swap_topic
 
     def fetch_logs(self):
         """Fetch logs from the specified block range using class-level start_time and end_time."""
         # 获取起始区块号和结束区块号
-        start_block = self.datetime_to_block(self.start_time)
-        end_block = self.datetime_to_block(self.end_time)
-        topic = self.topic_map.get(self.dex)
+        start_block, end_block = self.block_range()
+        topic = self.topic
 
         self.log(f"[FETCH LOGS] Fetching logs for:")
         self.log(f"  - Pool Address: {self.pool_address}")
@@ -83,77 +213,56 @@ class DEXLogExtractor:
         self.log(f"  - From Block: {start_block}")
         self.log(f"  - To Block: {end_block}")
 
-        # 提取日志
-        logs = self.web3.eth.get_logs({
-            "topics": [topic],
-            "fromBlock": start_block,
-            "toBlock": end_block,
-            "address": self.pool_address,
-        })
+        # 分块并发提取日志，区间过大时自动二分
+        logs = self.log_fetcher.fetch(self.pool_address, [topic], start_block, end_block)
 
         self.log(f"[FETCH LOGS] Retrieved {len(logs)} logs")
         return logs
 
-    def decode_logs(self, logs):
-        """Decode logs based on DEX type."""
+    def decode_logs(self, logs, block_timestamps=None):
+        """
+        Decode logs in one vectorized pass (see SwapDecoder).
+        :param logs: get_logs 返回的原始日志
+        :param block_timestamps: 预先批量获取的 {区块号: Unix 时间戳}，为空时只为本池的日志批量获取
+        :return: 列式的解码结果 DataFrame
+        """
+        if block_timestamps is None:
+            block_timestamps = self.block_index.get_timestamps(
+                log["blockNumber"] for log in logs if log.get("blockNumber")
+            )
+        # 未绑定池地址的提取器（如基准中直接解码日志）只计入总的解码耗时
+        pool = self.checkpoint_key if self.pool_address else None
+        with METRICS.stage("decode", pool), METRICS.profile("decode"):
+            decoded_logs, decode_errors = decode_swaps(self.dex, logs, block_timestamps)
+        METRICS.add("logs_decoded", len(decoded_logs))
+
+        self.log(f"[DECODE LOGS] Successfully decoded {len(decoded_logs)} logs")
+        if decode_errors > 0:
+            print_error(f"[DECODE LOGS] Failed to decode {decode_errors} logs")
+        return decoded_logs
+
+    def decode_logs_legacy(self, logs, block_timestamps=None):
+        """
+        Decode logs one by one with eth_abi (reference path kept for benchmarks).
+        :param logs: get_logs 返回的原始日志
+        :param block_timestamps: 预先批量获取的 {区块号: Unix 时间戳}，为空时只为本池的日志批量获取
+        """
         decoded_logs = []
         decode_errors = 0
-        block_cache = {}  # 缓存区块时间戳，减少重复查询
+        if block_timestamps is None:
+            block_timestamps = self.block_index.get_timestamps(
+                log["blockNumber"] for log in logs if log.get("blockNumber")
+            )
 
+        adapter = get_adapter(self.dex)
         for i, log in enumerate(logs):
-            #print("data:", log["data"])  # 打印查看数据
             try:
-                # 解码日志数据
-                #data = binascii.unhexlify(log["data"][2:])
-                data = log["data"]
-                log_data = {}
-
-
-                if self.dex == "PancakeSwap_v2":
-                    # Pancake V3 ABI types
-                    abi_types = ["uint256", "uint256", "uint256", "uint256"]
-                    decoded = decode(abi_types, data)
-                    log_data = {
-                        "transactionHash": log["transactionHash"].hex(),
-                        "amount0In": decoded[0] ,
-                        "amount1In": decoded[1] ,
-                        "amount0Out": decoded[2] ,
-                        "amount1Out": decoded[3] ,
-                        "sender": log["topics"][1].hex(),
-                        "to": log["topics"][2].hex(),
-                    }
-
-                elif self.dex == "uniswap_v3":
-                    # Uniswap V3 ABI types
-                    abi_types = ["int256", "int256", "uint160", "uint128", "int24"]
-                    decoded = decode(abi_types, data)
-                    log_data = {
-                        "transactionHash": log["transactionHash"].hex(),
-                        "amount0": decoded[0] ,
-                        "amount1": decoded[1] ,
-                        "sqrtPriceX96": decoded[2],
-                        "liquidity": decoded[3],
-                        "tick": decoded[4],
-                    }
-
-                elif self.dex == "uniswap_v2":
-                    # Uniswap V2 ABI types
-                    abi_types = ["uint256", "uint256", "uint256", "uint256"]
-                    decoded = decode(abi_types, data)
-                    log_data = {
-                        "transactionHash": log["transactionHash"].hex(),
-                        "amount0In": decoded[0] ,
-                        "amount1In": decoded[1] ,
-                        "amount0Out": decoded[2] ,
-                        "amount1Out": decoded[3] ,
-                        "sender": log["topics"][1].hex(),
-                        "to": log["topics"][2].hex(),
-                    }
-
-                else:
-                    print_error(f"Unsupported DEX type: {self.dex}")
-                    raise ValueError(f"Unsupported DEX type: {self.dex}")
-
+                # 按适配器的固定布局解码日志数据
+                decoded = decode(adapter.abi_types, log["data"])
+                log_data = {"transactionHash": log["transactionHash"].hex(), "logIndex": log.get("logIndex", -1)}
+                log_data.update(zip((name for name, _ in adapter.data_layout), decoded))
+                for name, index in adapter.topic_fields:
+                    log_data[name] = log["topics"][index].hex()
 
                 # 获取时间戳
                 block_number = log.get("blockNumber")
@@ -161,20 +270,12 @@ class DEXLogExtractor:
                     print_error(f"[DECODE ERROR] Missing blockNumber in log {i + 1}/{len(logs)}")
                     continue
 
-                # 检查缓存是否已有区块时间戳
-                if block_number in block_cache:
-                    log_data["timestamp"] = block_cache[block_number]
+                # 时间戳由独立的批量获取阶段提供
+                if block_number in block_timestamps:
+                    log_data["timestamp"] = datetime.utcfromtimestamp(block_timestamps[block_number])
                 else:
-                    # 查询区块信息获取时间戳
-                    try:
-                        block = self.web3.eth.get_block(block_number)
-                        timestamp = datetime.utcfromtimestamp(block["timestamp"])
-                        log_data["timestamp"] = timestamp
-                        # 将区块时间戳缓存起来
-                        block_cache[block_number] = timestamp
-                    except Exception as e:
-                        print_error(f"[DECODE ERROR] Failed to fetch block {block_number}: {e}")
-                        log_data["timestamp"] = None
+                    print_error(f"[DECODE ERROR] Missing timestamp for block {block_number}")
+                    log_data["timestamp"] = None
 
                 # 将解码后的日志添加到结果中
                 decoded_logs.append(log_data)
@@ -189,10 +290,25 @@ class DEXLogExtractor:
 
         return decoded_logs
 
+    def save(self, decoded_logs, tokenA_name, tokenB_name, result_dir):
+        """
+        按 CONFIG["swap_store"] 保存解码结果：parquet 写入分区存储，csv 追加到 CSV 文件
+        swap_csv_export 为 True 时 parquet 模式下同时导出 CSV
+        """
+        if CONFIG["swap_store"] == "parquet":
+            if len(decoded_logs) == 0:
+                self.log(f"[INFO] No decoded logs to save for {tokenA_name} - {tokenB_name}.")
+                return
+            store = SwapStore(os.path.join(result_dir, "swaps"), self.enable_logging)
+            store.write(self.dex, tokenA_name, tokenB_name, self.pool_address, decoded_logs)
+            if not CONFIG["swap_csv_export"]:
+                return
+        self.save_to_csv(decoded_logs, tokenA_name, tokenB_name, result_dir)
+
     def save_to_csv(self, decoded_logs, tokenA_name, tokenB_name,result_dir):
         """Save decoded logs to a CSV file based on DEX type and token addresses."""
         # 检查 decoded_logs 是否为空，如果为空则直接返回
-        if not decoded_logs:
+        if len(decoded_logs) == 0:
             self.log(f"[INFO] No decoded logs to save for {tokenA_name} - {tokenB_name}.")
             return
 
@@ -205,30 +321,43 @@ class DEXLogExtractor:
 
         output_path = os.path.join(result_dir, output_file)
 
-        # 将 decoded_logs 转换为 DataFrame
-        new_data = pd.DataFrame(decoded_logs)
+        # 将 decoded_logs 转换为 DataFrame；同一交易对的多个池写入同一文件，以 pool_address 列区分
+        new_data = pd.DataFrame(decoded_logs).assign(pool_address=self.pool_address)
 
         # 检查文件是否已存在
         if os.path.exists(output_path):
             # 如果文件存在，读取现有的数据
+            METRICS.add("bytes_read", os.path.getsize(output_path))
             existing_data = pd.read_csv(output_path)
 
-            # 使用 'transactionHash' 列进行去重
-            # 保留那些 'transactionHash' 在现有数据中不存在的记录
-            new_data = new_data[~new_data['transactionHash'].isin(existing_data['transactionHash'])]
+            # 按 (transactionHash, logIndex) 去重：同一笔交易可以有多条 Swap 日志；旧版文件只有交易哈希
+            key = swap_key(existing_data)
+            new_data = new_data.drop_duplicates(subset=key, keep="first")
+            known = pd.MultiIndex.from_frame(existing_data[key])
+            new_data = new_data[~pd.MultiIndex.from_frame(new_data[key]).isin(known)]
 
             # 如果没有新的数据，直接返回，不做任何操作
             if new_data.empty:
                 self.log(f"[INFO] No new data to add for {tokenA_name} - {tokenB_name}.")
                 return
 
+            if list(existing_data.columns) != list(new_data.columns):
+                # 旧版文件缺少 logIndex / pool_address 列：整体重写，旧记录的这两列留空
+                pd.concat([existing_data, new_data], ignore_index=True).to_csv(output_path, index=False)
+                METRICS.add("bytes_written", os.path.getsize(output_path))
+                self.log(f"[INFO] Rewrote {output_path} with new columns, {len(new_data)} new entries")
+                return
+
             # 追加新的数据到现有文件
+            size = os.path.getsize(output_path)
             new_data.to_csv(output_path, mode='a', header=False, index=False)
+            METRICS.add("bytes_written", os.path.getsize(output_path) - size)
             self.log(f"[INFO] New logs appended to {output_path}, total {len(new_data)} entries")
 
         else:
             # 如果文件不存在，直接保存
             new_data.to_csv(output_path, index=False)
+            METRICS.add("bytes_written", os.path.getsize(output_path))
             self.log(f"[SAVE TO CSV] Logs saved to {output_path}, total {len(new_data)} entries")
 
 
@@ -253,6 +382,7 @@ if __name__ == "__main__":
     # 保存日志到文件
     #print(logs)
     decoded_logs = extractor.decode_logs(logs)
+    extractor.block_index.save()
 
-    # 保存结果到 CSV
-    extractor.save_to_csv(decoded_logs,tokenAname,tokenBname,CONFIG["output_path"])
+    # 保存结果
+    extractor.save(decoded_logs,tokenAname,tokenBname,CONFIG["output_path"])
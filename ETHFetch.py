@@ -1,13 +1,30 @@
 from datetime import datetime
+import multiprocessing
 import pandas as pd
 import os
 from .config import CONFIG
-from .Calculator import Calculator
-from .DEXLogExtractor import DEXLogExtractor
-from .PoolAddressSearcher import PoolAddressSearcher
+from .PoolDiscovery import PoolDiscovery
+from .PoolRegistry import PoolRegistry
+from .LiveTail import LiveTail, PollingHeadSource, SubscriptionHeadSource
+from .RPCClient import RPCClient
+from .BlockIndex import BlockIndex
+from .LogFetcher import LogFetcher
+from .CheckpointStore import CheckpointStore
+from .MetadataRegistry import MetadataRegistry
+from .ParallelRunner import ParallelRunner, split_pairs
+from .PoolSync import PoolSync
+from .RateLimiter import RateLimiter
+from .RPCCache import RPCCache
+from .RPCScheduler import endpoint_configs, create_scheduler
+from .Metrics import METRICS
 
 class ETHfetch:
     def __init__(self, start_time, end_time, interval):
+        """
+        :param start_time: 开始时间；为 None 时从每个池的检查点继续
+        :param end_time: 结束时间；为 None 时同步到链头（sync to head 模式）
+        :param interval: K 线时间间隔；也可以是间隔列表（如 ["1min", "5min", "1h", "1D"]），一次加载同时输出
+        """
         self.rpc_url = CONFIG["rpc_url"]
         self.input_csv1 = CONFIG["input_csv1"]
         self.input_csv2 = CONFIG["input_csv2"]
@@ -18,104 +35,268 @@ class ETHfetch:
         self.output_path = CONFIG["output_path"]  # 从配置文件读取输出路径
         self.factory_df = pd.read_csv(self.input_csv1)
         self.pair_df = pd.read_csv(self.input_csv2)
+        METRICS.reset()
+        METRICS.configure(profile_dir=CONFIG["profile_dir"])
+        # 所有进程共用的 RPC 速率预算，由与进程池相同的 spawn 上下文创建
+        self.rate_limiter = None
+        if CONFIG["rpc_rate_limit"] > 0:
+            self.rate_limiter = RateLimiter(CONFIG["rpc_rate_limit"], context=multiprocessing.get_context("spawn"))
+        # 请求分发到所有配置的节点，每个节点的配额同样跨进程共享
+        self.endpoints = endpoint_configs(CONFIG["rpc_endpoints"], self.rpc_url)
+        self.endpoint_limiters = [
+            RateLimiter(endpoint["rate_limit"], context=multiprocessing.get_context("spawn"))
+            if endpoint.get("rate_limit") else None
+            for endpoint in self.endpoints
+        ]
+        self.scheduler = create_scheduler(
+            self.endpoints,
+            self.endpoint_limiters,
+            pool_size=CONFIG["rpc_pool_size"],
+            backoff=CONFIG["rpc_backoff"],
+            timeout=CONFIG["rpc_timeout"],
+            max_retries=CONFIG["rpc_max_retries"],
+            hedge_methods=CONFIG["rpc_hedge_methods"],
+            hedge_delay=CONFIG["rpc_hedge_delay"],
+            enable_logging=self.enable_logging
+        )
+        # 已确认的历史数据从磁盘缓存读取，重复运行同一时间窗口不再联网
+        self.rpc_cache = RPCCache(
+            CONFIG["rpc_cache_dir"],
+            max_bytes=CONFIG["rpc_cache_max_bytes"],
+            mode=CONFIG["rpc_cache_mode"],
+            confirmations=CONFIG["rpc_cache_confirmations"],
+            enable_logging=self.enable_logging
+        )
+        # 整个运行共享一个 RPC 客户端（连接池 + 调用计数）
+        self.rpc = RPCClient(
+            self.rpc_url,
+            pool_size=CONFIG["rpc_pool_size"],
+            timeout=CONFIG["rpc_timeout"],
+            enable_logging=self.enable_logging,
+            rate_limiter=self.rate_limiter,
+            cache=self.rpc_cache,
+            scheduler=self.scheduler
+        )
+        # 所有池共享同一个区块时间索引，时间窗口只解析一次
+        self.block_index = BlockIndex(
+            self.rpc,
+            CONFIG["block_index_path"],
+            self.enable_logging,
+            batch_size=CONFIG["block_batch_size"],
+            max_workers=CONFIG["block_max_workers"],
+            cache_size=CONFIG["block_cache_size"]
+        )
+        self.log_fetcher = LogFetcher(
+            self.rpc,
+            chunk_size=CONFIG["log_chunk_size"],
+            max_chunk_size=CONFIG["log_max_chunk_size"],
+            grow_threshold=CONFIG["log_grow_threshold"],
+            max_workers=CONFIG["log_max_workers"],
+            enable_logging=self.enable_logging
+        )
+        self.checkpoints = CheckpointStore(CONFIG["checkpoint_path"], self.enable_logging)
+        self.metadata = MetadataRegistry(self.rpc, CONFIG["metadata_path"], self.enable_logging)
+        self.pool_sync = PoolSync(
+            self.rpc,
+            self.block_index,
+            self.log_fetcher,
+            self.checkpoints,
+            self.metadata,
+            self.output_path,
+            self.start_time,
+            self.end_time,
+            self.interval,
+            self.enable_logging
+        )
 
     def print_error(self, message):
         # 红色的 ANSI 转义字符代码是 31
         print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
 
-    def eth_fetch(self):
-        results = []
-        success_count = 0
-        failure_count = 0
-
-        print("[INFO] PoolAddress Searcher Started")
-        for factory_index, factory_row in self.factory_df.iterrows():
-            dex = factory_row["dex"]
-            factory_address = factory_row["factoryaddress"]
-            factory_abi = eval(factory_row["factoryabi"])
-            function_call = factory_row["getfuction"]
-
-            for pair_index, pair_row in self.pair_df.iterrows():
-                tokenA = pair_row["tokenA"]
-                tokenB = pair_row["tokenB"]
-                tokenAname = pair_row["tokenAname"]
-                tokenBname = pair_row["tokenBname"]
-
-                # 查询池地址
-                searcher = PoolAddressSearcher(
-                    self.rpc_url, tokenA, tokenB, dex, factory_address, factory_abi, function_call, self.enable_logging
-                )
-
-                pool_address = searcher.query_pool_address()
-
-                if pool_address and pool_address.strip():
-                    success_count += 1
-                    results.append({
-                        "dex": dex,
-                        "factory_address": factory_address,
-                        "tokenA": tokenA,
-                        "tokenAname": tokenAname,
-                        "tokenB": tokenB,
-                        "tokenBname": tokenBname,
-                        "pool_address": pool_address
-                    })
-                else:
-                    failure_count += 1
-                    self.print_error(f"[WARNING] Skipping pair (dex：{dex}，TokenA: {tokenA}, TokenB: {tokenB}) due to empty pool address.")
-
-        results_df = pd.DataFrame(results)
-        # 修改输出路径为从配置文件读取
-        output_csv_path = os.path.join(self.output_path, "search_pooladdr_bypair.csv")
-        results_df.to_csv(output_csv_path, index=False)
-        print(f"[INFO] PoolAddress Search completed: {success_count} records succeeded, {failure_count} records failed.")
-
-        print("[INFO] Log Fetch and Decoding...")
+    def load_pool_index(self, output_csv_path):
+        """
+        读取池地址索引，同一个池只保留第一行（如 pair.csv 中同一交易对的两个方向各占一行），
+        否则该池会被同步两次、写入两个目录，并在交易对的合并 K 线中重复计入
+        """
         data = pd.read_csv(output_csv_path)
+        addresses = data["pool_address"].str.lower()
+        duplicated = addresses.notna() & addresses.duplicated()
+        if duplicated.any():
+            self.print_error(f"[WARNING] Ignoring {int(duplicated.sum())} duplicate rows of the pool index")
+        return data[~duplicated].reset_index(drop=True)
+
+    def pool_index_is_fresh(self, output_csv_path):
+        """池地址索引存在且比 factory.csv / pair.csv 新时无需重新查询."""
+        if CONFIG["refresh_pools"] or not os.path.exists(output_csv_path):
+            return False
+        index_mtime = os.path.getmtime(output_csv_path)
+        return all(os.path.getmtime(path) <= index_mtime for path in (self.input_csv1, self.input_csv2))
+
+    def run_parallel(self, data):
+        """
+        多进程模式：交易对按池数均衡地分成 parallel_workers 组，每组一个任务，
+        在 worker 中与单进程模式相同地扫描日志（log_sweep）、流式聚合并计算交易对的 K 线
+        同一交易对的池写入同一 K 线文件，因此同一交易对的池总在同一组；时间窗口在父进程中只解析一次
+        """
+        pairs = {}
         for _, row in data.iterrows():
-            dex = row["dex"]
-            pool_address = row["pool_address"]
-            tokenA = row["tokenA"]
-            tokenAname = row["tokenAname"]
-            tokenB = row["tokenB"]
-            tokenBname = row["tokenBname"]
-
-            if pool_address is None or pool_address == "":
+            if pd.isna(row["pool_address"]) or row["pool_address"] == "":
                 if self.enable_logging:
-                    self.print_error(f"[WARNING] Skipping row {tokenAname}-{tokenBname}-{pool_address} due to missing pool address.")
+                    self.print_error(f"[WARNING] Skipping row {row['tokenAname']}-{row['tokenBname']} due to missing pool address.")
                 continue
+            # 与 Calculator 的输出文件一致：按池的 token0/token1 顺序确定交易对
+            try:
+                metadata = self.metadata.pool_metadata(row["pool_address"])
+                pair = (metadata["symbol0"], metadata["symbol1"])
+            except ValueError:
+                pair = (row["tokenAname"], row["tokenBname"])
+            pairs.setdefault(pair, []).append(row.to_dict())
+
+        groups = split_pairs(pairs, CONFIG["parallel_workers"])
+        print(f"[INFO] Parallel run: {sum(len(rows) for rows in pairs.values())} pools, "
+              f"{len(pairs)} pairs in {len(groups)} groups, {CONFIG['parallel_workers']} workers")
+        if not groups:
+            return
+        window = self.pool_sync.block_range()
+        runner = ParallelRunner(
+            CONFIG["parallel_workers"], self.rate_limiter, self.enable_logging, endpoint_limiters=self.endpoint_limiters
+        )
+        success_count, failure_count = runner.run(
+            groups, window, self.start_time, self.end_time, self.interval, self.output_path, self.rpc
+        )
+        print(f"[INFO] Parallel run completed: {success_count} jobs succeeded, {failure_count} jobs failed.")
+        print(f"[INFO] RPC usage: {self.rpc.format_counts()}")
+        self.write_metrics()
+
+    def write_metrics(self):
+        """输出阶段耗时摘要与最慢的 (池, 阶段)，并写出运行报告."""
+        print(f"[INFO] Stage timings: {METRICS.format_summary()}")
+        for pool, stage, seconds in METRICS.bottlenecks(3):
+            print(f"[METRICS] Slowest: {pool} {stage} {seconds:.2f}s")
+        METRICS.write(CONFIG["metrics_path"], CONFIG["prometheus_path"])
 
-            extractor = DEXLogExtractor(
-                rpc_url=self.rpc_url,
-                dex=dex,
-                pool_address=pool_address,
-                start_time=self.start_time,
-                end_time=self.end_time,
+    def eth_fetch(self):
+        if not self.rpc.health_check():
+            return
+
+        # 修改输出路径为从配置文件读取
+        output_csv_path = os.path.join(self.output_path, "search_pooladdr_bypair.csv")
+        if CONFIG["pool_registry"]:
+            # 注册表增量扫描新建的池（通常只有几次 get_logs），池地址全部在本地查询
+            print("[INFO] Pool Registry Update Started")
+            registry = PoolRegistry(
+                self.rpc,
+                LogFetcher(
+                    self.rpc,
+                    chunk_size=CONFIG["log_chunk_size"],
+                    max_chunk_size=CONFIG["log_max_chunk_size"],
+                    grow_threshold=CONFIG["log_grow_threshold"],
+                    max_workers=CONFIG["log_max_workers"],
+                    enable_logging=self.enable_logging
+                ),
+                CONFIG["pool_registry_path"],
+                start_block=CONFIG["pool_registry_start_block"],
+                confirmations=CONFIG["sync_confirmations"],
+                enable_logging=self.enable_logging
+            )
+            registry.update(self.factory_df)
+            results_df, success_count, failure_count = registry.resolve(self.factory_df, self.pair_df)
+            results_df.to_csv(output_csv_path, index=False)
+            print(f"[INFO] Pool Registry lookup completed: {success_count} pools found, {failure_count} (dex, pair) without pools.")
+        elif self.pool_index_is_fresh(output_csv_path):
+            print(f"[INFO] Reusing pool index {output_csv_path}")
+        else:
+            print("[INFO] PoolAddress Searcher Started")
+            discovery = PoolDiscovery(
+                self.rpc,
+                self.factory_df,
+                self.pair_df,
+                batch_size=CONFIG["discovery_batch_size"],
+                max_workers=CONFIG["discovery_max_workers"],
                 enable_logging=self.enable_logging
             )
-            logs = extractor.fetch_logs()
-            decoded_logs = extractor.decode_logs(logs)
-            extractor.save_to_csv(decoded_logs, tokenAname, tokenBname, self.output_path)  # 修改输出路径
+            results_df, success_count, failure_count = discovery.resolve()
+            results_df.to_csv(output_csv_path, index=False)
+            print(f"[INFO] PoolAddress Search completed: {success_count} records succeeded, {failure_count} records failed.")
+
+        print("[INFO] Log Fetch and Decoding...")
+        data = self.load_pool_index(output_csv_path)
+        # 元数据一次性批量补齐，已知池的计算阶段不再发起 RPC 请求
+        self.metadata.ensure(data["pool_address"].dropna())
+        self.metadata.save()
+        # worker 进程直接从磁盘读取元数据
+        if CONFIG["parallel_workers"] > 1:
+            self.run_parallel(data)
+            return
+
+        aggregators, backfills, first_syncs = self.pool_sync.sync(data)
         print("[INFO] Log Fetch and Decoding Completed")
 
         print("[INFO] Start Calculating...")
-        for _, row in data.iterrows():
-            calculator = Calculator(
-                rpc_url=self.rpc_url,
-                pooladdress=row["pool_address"],
-                tokenA=row["tokenA"],
-                tokenAname=row["tokenAname"],
-                tokenB=row["tokenB"],
-                tokenBname=row["tokenBname"],
-                dex=row["dex"],
-                interval=self.interval,
-                enable_logging=self.enable_logging
-            )
-            calculator.calculate()
+        self.pool_sync.calculate(data, aggregators, backfills, first_syncs)
         print("[INFO] Calculate Completed")
+        print(f"[INFO] RPC usage: {self.rpc.format_counts()}")
+        self.write_metrics()
+
+    def tail(self, head_source=None, on_update=None, max_blocks=None):
+        """
+        实时跟踪模式：先以 eth_fetch 从检查点同步到链头附近，之后跟随新区块，
+        每个区块的 swap 在到达后立即计入内存中的当前 K 线（self.live_tail.candles），
+        超出 tail_finality_depth 的区块才写入存储，重组的区块在内存中回滚
+        :param head_source: 链头来源，默认按配置订阅 tail_ws_url 或轮询
+        :param on_update: 可选的回调 on_update(live_tail, block_number)，每处理完一批新区块调用一次
+        :param max_blocks: 可选的处理区块数上限
+        """
+        if not self.rpc.health_check():
+            return
+        self.end_time = None
+        self.pool_sync.end_time = None
+        self.eth_fetch()
+        # 多进程同步时检查点由 worker 写入磁盘
+        self.checkpoints.load()
+        data = self.load_pool_index(os.path.join(self.output_path, "search_pooladdr_bypair.csv"))
+        aggregators = self.pool_sync.build_aggregators(data)
+        if head_source is None:
+            if CONFIG["tail_ws_url"]:
+                head_source = SubscriptionHeadSource(CONFIG["tail_ws_url"], timeout=CONFIG["rpc_timeout"])
+            else:
+                head_source = PollingHeadSource(self.rpc, CONFIG["tail_poll_interval"])
+        self.live_tail = LiveTail(
+            self.rpc,
+            self.log_fetcher,
+            self.pool_sync.build_jobs(data),
+            aggregators,
+            self.checkpoints,
+            self.block_index,
+            self.output_path,
+            finality_depth=CONFIG["tail_finality_depth"],
+            enable_logging=self.enable_logging,
+            on_update=on_update
+        )
+        try:
+            self.live_tail.run(head_source, max_blocks)
+        except KeyboardInterrupt:
+            print("[INFO] Tail stopped")
+        finally:
+            head_source.close()
+            # 已确认部分中未结束的分组也写出，下次运行会从存储重新计算
+            for aggregator in aggregators.values():
+                aggregator.flush()
+            if CONFIG["pair_aggregate"]:
+                self.pool_sync.calculate_pairs(data, per_pool=False)
+            print(f"[INFO] Tail: {self.live_tail.reorgs} reorgs, {self.live_tail.rolled_back_blocks} blocks rolled back")
+            print(f"[INFO] RPC usage: {self.rpc.format_counts()}")
+            self.write_metrics()
 
 if __name__ == "__main__":
     start_time = datetime(2025, 1, 13, 0, 0, 0)
     end_time = datetime(2025, 1, 13, 2, 0, 0)
-    interval = "5min"
+    interval = ["5min", "1h"]
     analyzer = ETHfetch(start_time, end_time, interval)
     analyzer.eth_fetch()
+
+    # 定时任务：从检查点继续同步到链头
+    # ETHfetch(None, None, interval).eth_fetch()
+
+    # 实时跟踪：同步到链头后持续跟随新区块
+    # ETHfetch(None, None, interval).tail()
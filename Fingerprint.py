@@ -0,0 +1,53 @@
+import numpy as np
+
+# 分组指纹：每笔 swap 一个 128 位摘要（两个 uint64 lane），分组指纹为各 lane 模 2**64 之和
+# 与行顺序无关；新增 swap 只需加上它们的摘要；粗粒度分组的指纹等于其细分组指纹之和
+LANES = 2
+COLUMNS = ["fingerprint0", "fingerprint1"]
+EMPTY = "0" * (16 * LANES)
+
+
+def swap_digests(hashes):
+    """
+    交易哈希 -> 每笔 swap 的 128 位摘要
+    交易哈希本身是 keccak256 输出，均匀分布，直接取其前 16 字节
+    :param hashes: 十六进制交易哈希序列（可带 0x 前缀）
+    :return: (n, 2) uint64 数组
+    """
+    if len(hashes) == 0:
+        return np.zeros((0, LANES), dtype=np.uint64)
+    buffer = bytes.fromhex("".join(value[-64:] for value in hashes))
+    return np.frombuffer(buffer, dtype=">u8").astype(np.uint64).reshape(len(hashes), 4)[:, :LANES]
+
+
+def reduce_sorted(lanes, starts):
+    """按连续分组求和（已按分组排序，uint64 溢出即模 2**64 回绕）."""
+    if len(starts) == 0:
+        return np.zeros((0, LANES), dtype=np.uint64)
+    return np.add.reduceat(lanes, starts, axis=0)
+
+
+def fold(lanes, codes, count):
+    """
+    按任意顺序的分组编号求和
+    :param lanes: (n, 2) uint64
+    :param codes: 每行的分组编号（0 ~ count-1）
+    :return: (count, 2) uint64
+    """
+    totals = np.zeros((count, LANES), dtype=np.uint64)
+    np.add.at(totals, codes, lanes)
+    return totals
+
+
+def to_hex(lanes):
+    """(n, 2) uint64 -> 32 位十六进制字符串列表."""
+    text = np.ascontiguousarray(lanes, dtype=">u8").tobytes().hex()
+    width = 16 * LANES
+    return [text[i:i + width] for i in range(0, len(lanes) * width, width)]
+
+
+def from_hex(values):
+    """to_hex 的逆操作."""
+    if len(values) == 0:
+        return np.zeros((0, LANES), dtype=np.uint64)
+    return np.frombuffer(bytes.fromhex("".join(values)), dtype=">u8").astype(np.uint64).reshape(len(values), LANES)
@@ -0,0 +1,86 @@
+import numpy as np
+from .SwapDecoder import encode_words
+
+
+LOW32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+ONE = np.uint64(1)
+
+
+def to_limbs(values):
+    """
+    整数列 -> (n, 4) 大端 uint64 limb（256 位补码），limbs[:, 0] 为最高 64 位
+    int64 / uint64 列全程向量化；Python int 的 object 列（超出 int64 的 uint256/int256）逐个转为 32 字节
+    :param values: int64 / uint64 数组，Python int 或十进制字符串的 object 数组
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "u":
+        limbs = np.zeros((len(values), 4), dtype=np.uint64)
+        limbs[:, 3] = values.astype(np.uint64)
+        return limbs
+    if values.dtype.kind in "fO" and len(values) and not isinstance(values[0], (int, np.integer)):
+        # 旧版 CSV 中的大整数可能被读成字符串或浮点数
+        values = np.array([int(value) for value in values], dtype=object)
+    return np.frombuffer(encode_words(values), dtype=">u8").astype(np.uint64).reshape(len(values), 4)
+
+
+def abs_limbs(limbs):
+    """
+    有符号 256 位补码的绝对值（原地取反加一），结果按无符号解释
+    :param limbs: to_limbs 的输出
+    """
+    limbs = limbs.copy()
+    negative = limbs[:, 0] >> np.uint64(63) == ONE
+    if not negative.any():
+        return limbs
+    magnitude = ~limbs[negative]
+    carry = np.ones(len(magnitude), dtype=bool)
+    for k in (3, 2, 1, 0):
+        magnitude[:, k] += carry.astype(np.uint64)
+        carry &= magnitude[:, k] == 0
+    limbs[negative] = magnitude
+    return limbs
+
+
+def split32(limbs):
+    """
+    (n, 4) 大端 64 位 limb -> (n, 8) 小端 32 位 limb（存于 uint64，求和时留出进位空间）
+    """
+    # 反转 limb 顺序后按小端 uint32 重新解释，低 32 位在前
+    little = np.ascontiguousarray(limbs[:, ::-1], dtype="<u8")
+    return little.view("<u4").reshape(len(limbs), 8).astype(np.uint64)
+
+
+def group_sum(limbs32, starts):
+    """
+    按连续分组对 32 位 limb 精确求和：每个 limb 在 uint64 中累加（单组 2**32 行以内不会溢出），
+    再逐 limb 传播进位，最后每组只做一次 Python int 拼接
+    :param limbs32: 已按分组排序的 split32 输出
+    :param starts: 每个分组第一行的下标（升序，首个为 0）
+    :return: object 数组，每组的精确和（Python int）
+    """
+    if len(starts) == 0:
+        return np.empty(0, dtype=object)
+    sums = np.add.reduceat(limbs32, starts, axis=0)
+    for k in range(7):
+        sums[:, k + 1] += sums[:, k] >> SHIFT32
+        sums[:, k] &= LOW32
+    low = [(sums[:, 2 * i + 1] << SHIFT32) | sums[:, 2 * i] for i in range(3)]
+    totals = np.empty(len(sums), dtype=object)
+    totals[:] = [
+        (top << 224) | (l6 << 192) | (l2 << 128) | (l1 << 64) | l0
+        for top, l6, l2, l1, l0 in zip(
+            sums[:, 7].tolist(), sums[:, 6].tolist(), low[2].tolist(), low[1].tolist(), low[0].tolist()
+        )
+    ]
+    return totals
+
+
+def scale(totals, decimals):
+    """
+    精确整数按 decimals 缩放为浮点数：整数除法由 Python 正确舍入，只在最后舍入一次
+    :param totals: Python int 序列
+    :return: float64 数组
+    """
+    unit = 10 ** int(decimals)
+    return np.fromiter((int(total) / unit for total in totals), dtype=float, count=len(totals))
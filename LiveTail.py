@@ -0,0 +1,329 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from .SwapDecoder import decode_swaps
+from .Metrics import METRICS
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+def parse_header(block):
+    """JSON-RPC 区块头（十六进制字段）转为 {"number", "hash", "parentHash", "timestamp"}."""
+    return {
+        "number": int(block["number"], 16),
+        "hash": block["hash"],
+        "parentHash": block["parentHash"],
+        "timestamp": int(block["timestamp"], 16),
+    }
+
+
+class ReorgTooDeep(RuntimeError):
+    """重组深度超过 finality_depth，已写入的数据无法回滚."""
+
+
+class PollingHeadSource:
+    def __init__(self, rpc_client, poll_interval=1.0):
+        """
+        轮询链头：每隔 poll_interval 秒请求一次 latest 区块头，链头变化时产出
+        :param rpc_client: 共享的 RPCClient 实例
+        :param poll_interval: 轮询间隔（秒），应小于出块间隔
+        """
+        self.rpc = rpc_client
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def heads(self):
+        """生成器，产出新的链头（parse_header 格式），close() 后结束."""
+        last_hash = None
+        while not self._stopped.is_set():
+            try:
+                block = self.rpc.request("eth_getBlockByNumber", ["latest", False])
+            except Exception as e:
+                print_error(f"[TAIL] Failed to poll head: {e}")
+                block = None
+            if block and block["hash"] != last_hash:
+                last_hash = block["hash"]
+                yield parse_header(block)
+            self._stopped.wait(self.poll_interval)
+
+    def close(self):
+        self._stopped.set()
+
+
+class SubscriptionHeadSource:
+    def __init__(self, ws_url, timeout=30):
+        """
+        订阅链头：通过 WebSocket 的 eth_subscribe("newHeads") 接收新区块，延迟低于轮询
+        :param ws_url: 节点的 WebSocket URL
+        :param timeout: 连接与订阅确认的超时时间（秒）
+        """
+        try:
+            from websockets.sync.client import connect
+        except ImportError as e:  # websockets 为可选依赖，仅订阅模式需要
+            raise ImportError("SubscriptionHeadSource requires websockets (pip install websockets), "
+                              "or use PollingHeadSource") from e
+        self.connect = connect
+        self.ws_url = ws_url
+        self.timeout = timeout
+        self._stopped = threading.Event()
+
+    def heads(self):
+        """生成器，产出新的链头（parse_header 格式），close() 后结束."""
+        with self.connect(self.ws_url, open_timeout=self.timeout) as ws:
+            ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+            reply = json.loads(ws.recv(timeout=self.timeout))
+            if "error" in reply:
+                raise ValueError(reply["error"])
+            while not self._stopped.is_set():
+                try:
+                    message = json.loads(ws.recv(timeout=1.0))
+                except TimeoutError:
+                    continue
+                params = message.get("params")
+                if params and params.get("subscription") == reply.get("result"):
+                    yield parse_header(params["result"])
+
+    def close(self):
+        self._stopped.set()
+
+
+class LiveTail:
+    def __init__(self, rpc_client, log_fetcher, jobs, aggregators, checkpoints, block_index, output_path,
+                 finality_depth=12, batch_blocks=100, enable_logging=True, on_update=None):
+        """
+        实时跟踪：每个新区块到达时，用一次多地址 get_logs 拉取所有池的 Swap，解码后立即计入内存中的当前 K 线
+        距链头 finality_depth 个区块以内的 swap 只保存在内存中，按区块记录；发生重组时回滚到共同祖先后重新拉取
+        区块超出 finality_depth 后才写入 swap 存储、推进检查点并进入 CandleAggregator，已结束的分组随即写出
+        :param rpc_client: 共享的 RPCClient 实例
+        :param log_fetcher: 共享的 LogFetcher
+        :param jobs: [(extractor, tokenAname, tokenBname), ...]，与 PoolSync.sweep_logs 相同
+        :param aggregators: {池地址（小写）: CandleAggregator}
+        :param checkpoints: CheckpointStore 实例，跟踪从各池的检查点之后开始
+        :param block_index: 共享的 BlockIndex，新区块的时间戳直接登记
+        :param output_path: swap 存储目录
+        :param finality_depth: 可被重组的区块数
+        :param batch_blocks: 落后较多时每轮最多处理的区块数
+        :param enable_logging: 是否启用日志输出
+        :param on_update: 可选的回调 on_update(tail, block_number)，每处理完一批新区块调用一次
+        """
+        self.rpc = rpc_client
+        self.log_fetcher = log_fetcher
+        self.checkpoints = checkpoints
+        self.block_index = block_index
+        self.output_path = output_path
+        self.finality_depth = max(0, int(finality_depth))
+        self.batch_blocks = max(1, int(batch_blocks))
+        self.enable_logging = enable_logging
+        self.on_update = on_update
+        self.pools = {}  # 池地址（小写） -> (extractor, aggregator, tokenAname, tokenBname)
+        for extractor, tokenAname, tokenBname in jobs:
+            address = extractor.pool_address.lower()
+            self.pools[address] = (extractor, aggregators.get(address), tokenAname, tokenBname)
+        self.address_topics = {extractor.pool_address: extractor.topic for extractor, _, _, _ in self.pools.values()}
+        self.headers = OrderedDict()  # 区块号 -> 区块头，覆盖 finalized 之后（含 finalized）的区块
+        self.unconfirmed = {address: OrderedDict() for address in self.pools}  # 池 -> {区块号: 解码后的 swap}
+        self.pool_starts = {}  # 池 -> 开始跟踪时的检查点，之前的区块已写入
+        self.cursor = None  # 已处理到的区块
+        self.finalized = None  # 已写入存储的区块
+        self.reorgs = 0
+        self.rolled_back_blocks = 0
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def start_block(self):
+        """所有池检查点中最早的一个；没有检查点的池需要先以 start_time 完成一次历史同步."""
+        for address, (extractor, _, _, _) in self.pools.items():
+            last_block = self.checkpoints.get(extractor.checkpoint_key)
+            if last_block is None:
+                raise ValueError(f"No checkpoint for {extractor.checkpoint_key}, run a historical sync first")
+            self.pool_starts[address] = last_block
+        return min(self.pool_starts.values())
+
+    def fetch_headers(self, block_numbers):
+        """
+        批量获取区块头
+        :return: 按区块号排列的区块头列表；节点尚未产出的区块缺失
+        """
+        results = self.rpc.batch_request([("eth_getBlockByNumber", [hex(n), False]) for n in block_numbers])
+        return [parse_header(block) for block in results if block]
+
+    def find_ancestor(self):
+        """
+        从已处理的最高区块向下比较本地与节点的区块哈希，找到共同祖先
+        :raises ReorgTooDeep: finalized 区块也已被替换
+        """
+        numbers = sorted(self.headers, reverse=True)
+        canonical = {header["number"]: header["hash"] for header in self.fetch_headers(numbers)}
+        for number in numbers:
+            if canonical.get(number) == self.headers[number]["hash"]:
+                return number
+        raise ReorgTooDeep(f"Reorg deeper than finality depth {self.finality_depth} below block {self.cursor}")
+
+    def rollback(self, ancestor):
+        """丢弃共同祖先之后的区块头与未确认 swap."""
+        dropped = [number for number in self.headers if number > ancestor]
+        for number in dropped:
+            del self.headers[number]
+        for blocks in self.unconfirmed.values():
+            for number in [number for number in blocks if number > ancestor]:
+                del blocks[number]
+        self.cursor = ancestor
+        self.reorgs += 1
+        self.rolled_back_blocks += len(dropped)
+        METRICS.add("tail_reorgs")
+        METRICS.add("tail_rolled_back_blocks", len(dropped))
+        print_error(f"[TAIL] Reorg: rolled back {len(dropped)} blocks to {ancestor}")
+
+    def advance(self, head):
+        """
+        处理到新链头：检查重组，拉取 cursor 之后的区块头与日志，计入未确认 swap，再提交已确认的区块
+        :param head: parse_header 格式的链头
+        :return: 是否推进了 cursor（区块头或日志在拉取期间变化时本轮放弃，等待下一个链头）
+        """
+        known = self.headers.get(head["number"])
+        if known is not None and known["hash"] == head["hash"]:
+            return False
+        parent = self.headers.get(head["number"] - 1)
+        if head["number"] <= self.cursor or (parent is not None and head["parentHash"] != parent["hash"]):
+            # 同高度或更低的新链头，或父区块不是本地记录的区块
+            self.rollback(self.find_ancestor())
+        from_block = self.cursor + 1
+        to_block = min(head["number"], from_block + self.batch_blocks - 1)
+        if from_block > to_block:
+            return False
+        headers = self.fetch_headers(range(from_block, to_block + 1))
+        if not headers:
+            return False
+        previous = self.headers.get(from_block - 1)
+        if previous is not None and headers[0]["parentHash"] != previous["hash"]:
+            self.rollback(self.find_ancestor())
+            return False
+        for parent, child in zip(headers, headers[1:]):
+            if child["parentHash"] != parent["hash"]:
+                self.log(f"[TAIL] Chain changed while fetching headers at {child['number']}, retrying")
+                return False
+        to_block = headers[-1]["number"]
+        hashes = {header["number"]: header["hash"] for header in headers}
+
+        with METRICS.stage("fetch"):
+            routed = self.fetch_logs(from_block, to_block)
+        for logs in routed.values():
+            for log in logs:
+                if self.block_hash(log) != hashes.get(log["blockNumber"]):
+                    self.log(f"[TAIL] Log from a replaced block {log['blockNumber']}, retrying")
+                    return False
+
+        block_timestamps = {header["number"]: header["timestamp"] for header in headers}
+        for number, timestamp in block_timestamps.items():
+            self.block_index.add(number, timestamp)
+        for address, logs in routed.items():
+            extractor = self.pools[address][0]
+            by_block = OrderedDict()
+            for log in logs:
+                by_block.setdefault(log["blockNumber"], []).append(log)
+            for number, block_logs in by_block.items():
+                if number <= self.pool_starts[address]:
+                    continue
+                with METRICS.stage("decode", extractor.checkpoint_key):
+                    decoded_logs, decode_errors = decode_swaps(extractor.dex, block_logs, block_timestamps)
+                METRICS.add("logs_decoded", len(decoded_logs))
+                if decode_errors:
+                    print_error(f"[TAIL] Failed to decode {decode_errors} logs of {address} in block {number}")
+                self.unconfirmed[address][number] = decoded_logs
+
+        for header in headers:
+            self.headers[header["number"]] = header
+        self.cursor = to_block
+        self.finalize(head["number"] - self.finality_depth)
+        return True
+
+    @staticmethod
+    def block_hash(log):
+        value = log.get("blockHash")
+        if value is None or isinstance(value, str):
+            return value
+        return "0x" + bytes(value).hex()
+
+    def fetch_logs(self, from_block, to_block):
+        """一次多地址 get_logs 拉取区间内所有池的 Swap，按池分发."""
+        return self.log_fetcher.fetch_by_address(self.address_topics, from_block, to_block)
+
+    def finalize(self, final_block):
+        """
+        final_block 及之前的区块不会再被重组：写入 swap 存储、推进检查点，并交给 CandleAggregator 写出已结束的分组
+        :param final_block: 已确认的最高区块
+        """
+        final_block = min(final_block, self.cursor)
+        if final_block <= self.finalized:
+            return
+        for address, (extractor, aggregator, tokenAname, tokenBname) in self.pools.items():
+            blocks = self.unconfirmed[address]
+            confirmed = [blocks.pop(number) for number in [number for number in blocks if number <= final_block]]
+            confirmed = [df for df in confirmed if len(df)]
+            decoded_logs = pd.concat(confirmed, ignore_index=True) if confirmed else pd.DataFrame()
+            last_block = self.checkpoints.get(extractor.checkpoint_key)
+            if last_block is None or last_block < final_block:
+                commit_from = self.finalized + 1 if last_block is None else last_block + 1
+                extractor.commit_decoded(
+                    decoded_logs, commit_from, final_block, self.checkpoints, tokenAname, tokenBname, self.output_path
+                )
+            if aggregator is not None and len(decoded_logs):
+                aggregator.update(decoded_logs)
+                aggregator.flush(final=False)
+        # 最新的已确认区块头保留，用于检查下一个区块的父哈希
+        for number in [number for number in self.headers if number < final_block]:
+            del self.headers[number]
+        self.finalized = final_block
+        self.block_index.save()
+
+    def candles(self, pool_address, interval):
+        """
+        某个池当前的 K 线：从下一个待写出的分组开始，包括未确认区块中的 swap
+        :return: K 线 DataFrame，没有数据时为 None
+        """
+        address = pool_address.lower()
+        aggregator = self.pools[address][1]
+        if aggregator is None:
+            return None
+        return aggregator.snapshot(interval, self.unconfirmed[address].values())
+
+    def follow(self, head):
+        """
+        处理一个链头，直到本地追上它；一个链头可能需要多轮（落后较多，或区块在拉取期间变化）
+        :return: cursor 前进的区块数（重组回滚时可能为负）
+        """
+        start = self.cursor
+        while self.cursor < head["number"] or self.headers.get(head["number"], head)["hash"] != head["hash"]:
+            if not self.advance(head):
+                break
+        return self.cursor - start
+
+    def run(self, head_source, max_blocks=None):
+        """
+        跟随链头直到 head_source 结束（或处理了 max_blocks 个区块）
+        :param head_source: 提供 heads() 生成器的对象，如 PollingHeadSource / SubscriptionHeadSource
+        :param max_blocks: 可选的处理区块数上限（用于测试与基准）
+        """
+        if not self.pools:
+            print_error("[TAIL] No pools to follow")
+            return
+        start = self.start_block()
+        self.cursor = self.finalized = start
+        self.headers[start] = self.fetch_headers([start])[0]
+        print(f"[INFO] Tailing {len(self.pools)} pools from block {start + 1}, finality depth {self.finality_depth}")
+        processed = 0
+        for head in head_source.heads():
+            received = time.perf_counter()
+            processed += self.follow(head)
+            METRICS.record_stage("tail", time.perf_counter() - received)
+            if self.on_update is not None:
+                self.on_update(self, self.cursor)
+            if max_blocks is not None and processed >= max_blocks:
+                break
+        head_source.close()
@@ -0,0 +1,225 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from web3 import Web3
+from .RPCScheduler import RPCUnavailable
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# 节点拒绝过大查询时错误信息中常见的片段（不同服务商措辞不同）
+TOO_LARGE_MARKERS = (
+    "-32005",
+    "more than",
+    "too many",
+    "too large",
+    "limit",
+    "exceed",
+    "range",
+    "response size",
+)
+
+
+def prefetch(iterable, depth=2):
+    """
+    在后台线程中提前消费生成器，最多缓冲 depth 个结果：
+    下游处理当前分块（解码、写盘、聚合）时，上游继续拉取后续分块，内存以 depth 个分块为上限
+    上游抛出的异常在下游取到该位置时重新抛出
+    :param iterable: 上游生成器
+    :param depth: 缓冲的结果数上限
+    """
+    buffer = queue.Queue(maxsize=max(1, int(depth)))
+    stop = threading.Event()
+    end = object()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # 下游提前结束或出错时通知上游停止
+        stop.set()
+        producer.join()
+
+
+class LogFetcher:
+    def __init__(self, rpc_client, chunk_size=2000, min_chunk_size=1, max_chunk_size=100000,
+                 grow_threshold=2000, max_workers=4, enable_logging=True):
+        """
+        自适应分块、并发的 eth_getLogs 拉取器
+        :param rpc_client: 共享的 RPCClient 实例
+        :param chunk_size: 初始分块大小（区块数）
+        :param min_chunk_size: 最小分块大小
+        :param max_chunk_size: 最大分块大小
+        :param grow_threshold: 单块返回日志数低于该值时增大分块
+        :param max_workers: 同时在途的 get_logs 请求数上限
+        :param enable_logging: 是否启用日志输出
+        """
+        self.rpc = rpc_client
+        self.web3 = rpc_client.web3
+        self.chunk_size = chunk_size
+        self.min_chunk_size = max(1, min_chunk_size)
+        self.max_chunk_size = max(self.min_chunk_size, max_chunk_size)
+        self.grow_threshold = grow_threshold
+        self.max_workers = max(1, int(max_workers))
+        self.enable_logging = enable_logging
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    @staticmethod
+    def is_too_large(error):
+        """判断节点错误是否属于结果过多 / 区间过大."""
+        if isinstance(error, RPCUnavailable):
+            # 所有节点都不可用（超时 / 限流），拆分区间无济于事
+            return False
+        text = str(error).lower()
+        return any(marker in text for marker in TOO_LARGE_MARKERS)
+
+    def _get_logs(self, address, topics, from_block, to_block):
+        return self.web3.eth.get_logs({
+            "topics": topics,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "address": address,
+        })
+
+    def iter_chunks(self, address, topics, from_block, to_block):
+        """
+        按区块顺序逐块产出日志
+        区间被拒绝时自动二分，返回日志较少时逐步扩大分块；
+        请求并发执行，但结果按区块顺序连续产出
+        :param address: 合约地址或地址列表
+        :param topics: 主题过滤条件
+        :param from_block: 起始区块（含）
+        :param to_block: 结束区块（含）
+        :return: 生成器，产出 (chunk_from, chunk_to, logs)，logs 按 (blockNumber, logIndex) 排序
+        """
+        pending = deque()  # 二分后等待重新请求的区间
+        completed = {}  # chunk_from -> (chunk_to, logs)
+        cursor = from_block
+        next_block = from_block
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+            while cursor <= to_block or pending or in_flight:
+                while len(in_flight) < self.max_workers and (pending or cursor <= to_block):
+                    if pending:
+                        chunk = pending.popleft()
+                    else:
+                        chunk = (cursor, min(cursor + self.chunk_size - 1, to_block))
+                        cursor = chunk[1] + 1
+                    future = executor.submit(self._get_logs, address, topics, *chunk)
+                    in_flight[future] = chunk
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_from, chunk_to = in_flight.pop(future)
+                    try:
+                        logs = future.result()
+                    except Exception as e:
+                        if not self.is_too_large(e) or chunk_to <= chunk_from:
+                            print_error(f"[FETCH LOGS] get_logs failed for blocks {chunk_from}-{chunk_to}: {e}")
+                            raise
+                        middle = (chunk_from + chunk_to) // 2
+                        pending.appendleft((middle + 1, chunk_to))
+                        pending.appendleft((chunk_from, middle))
+                        self.chunk_size = max(self.min_chunk_size, middle - chunk_from + 1)
+                        self.log(f"[FETCH LOGS] Range {chunk_from}-{chunk_to} rejected, split at {middle}")
+                        continue
+
+                    if len(logs) < self.grow_threshold:
+                        self.chunk_size = min(self.max_chunk_size, max(self.chunk_size, chunk_to - chunk_from + 1) * 2)
+                    completed[chunk_from] = (chunk_to, logs)
+
+                # 按区块顺序产出已连续完成的分块
+                while next_block in completed:
+                    chunk_to, logs = completed.pop(next_block)
+                    logs = sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+                    yield next_block, chunk_to, logs
+                    next_block = chunk_to + 1
+
+    def fetch(self, address, topics, from_block, to_block):
+        """
+        拉取整个区间的日志
+        :return: 按 (blockNumber, logIndex) 排序的日志列表
+        """
+        logs = []
+        chunks = 0
+        for _, _, chunk_logs in self.iter_chunks(address, topics, from_block, to_block):
+            logs.extend(chunk_logs)
+            chunks += 1
+        self.log(f"[FETCH LOGS] Retrieved {len(logs)} logs in {chunks} chunks")
+        return logs
+
+    def iter_by_address(self, address_topics, from_block, to_block):
+        """
+        多地址合并拉取：每个区块分块只发一次 get_logs（完整地址列表 + 主题集合），
+        再按 log.address 分发到各个池
+        :param address_topics: {池地址: 该池的 Swap 主题}
+        :param from_block: 起始区块（含）
+        :param to_block: 结束区块（含）
+        :return: 生成器，按区块顺序产出 (chunk_from, chunk_to, {池地址（小写）: 日志列表})
+        :raises ValueError: 某个池没有主题（其 DEX 未在 DEXAdapters 中注册）
+        """
+        missing = [address for address, topic in address_topics.items() if not topic]
+        if missing:
+            raise ValueError(f"No event topic for pools {', '.join(missing)}; check their dex against DEXAdapters")
+        wanted = {address.lower(): topic.lower() for address, topic in address_topics.items()}
+        addresses = [Web3.to_checksum_address(address) for address in wanted]
+        topic_set = sorted(set(wanted.values()))
+
+        for chunk_from, chunk_to, logs in self.iter_chunks(addresses, [topic_set], from_block, to_block):
+            routed = {address: [] for address in wanted}
+            for log in logs:
+                address = log["address"].lower()
+                # 只保留该池自身 Swap 主题的日志
+                if address in routed and Web3.to_hex(log["topics"][0]) == wanted[address]:
+                    routed[address].append(log)
+            yield chunk_from, chunk_to, routed
+
+    def fetch_by_address(self, address_topics, from_block, to_block):
+        """
+        多地址合并拉取整个区间
+        :return: {池地址（小写）: 按区块顺序排列的日志列表}
+        """
+        routed = {address.lower(): [] for address in address_topics}
+        for _, _, chunk_routed in self.iter_by_address(address_topics, from_block, to_block):
+            for address, logs in chunk_routed.items():
+                routed[address].extend(logs)
+        total = sum(len(logs) for logs in routed.values())
+        self.log(f"[FETCH LOGS] Swept {total} logs for {len(routed)} pools")
+        return routed
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+from eth_abi import decode
+from web3 import Web3
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# 无参数 view 函数的选择器，导入时计算一次
+SELECTORS = {
+    name: "0x" + Web3.keccak(text=f"{name}()")[:4].hex()
+    for name in ("token0", "token1", "symbol", "decimals")
+}
+
+
+def decode_symbol(result):
+    """symbol() 返回 string；少数老代币（如 MKR）返回 bytes32."""
+    data = bytes.fromhex(result[2:])
+    try:
+        return decode(["string"], data)[0]
+    except Exception:
+        return data[:32].rstrip(b"\x00").decode("utf-8", errors="ignore")
+
+
+class MetadataRegistry:
+    def __init__(self, rpc_client, metadata_path, enable_logging=True):
+        """
+        池与代币元数据的持久化缓存：池的 token0/token1，代币的 symbol/decimals
+        这些值对给定地址永不改变，只在缺失时以 JSON-RPC batch 批量补齐
+        :param rpc_client: 共享的 RPCClient 实例（全部命中缓存时不会发起请求）
+        :param metadata_path: 元数据文件路径 (JSON)
+        :param enable_logging: 是否启用日志输出
+        """
+        self.rpc = rpc_client
+        self.metadata_path = metadata_path
+        self.enable_logging = enable_logging
+        self.pools = {}  # 池地址（小写） -> {"token0": ..., "token1": ...}
+        self.tokens = {}  # 代币地址（小写） -> {"symbol": ..., "decimals": ...}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def load(self):
+        """从磁盘加载元数据."""
+        if not os.path.exists(self.metadata_path):
+            return
+        try:
+            with open(self.metadata_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print_error(f"[METADATA] Failed to load {self.metadata_path}: {e}")
+            return
+        self.pools = data.get("pools", {})
+        self.tokens = data.get("tokens", {})
+        self.log(f"[METADATA] Loaded {len(self.pools)} pools and {len(self.tokens)} tokens")
+
+    def save(self):
+        """有新增条目时写回磁盘."""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {"pools": self.pools, "tokens": self.tokens}
+            self.dirty = False
+        directory = os.path.dirname(self.metadata_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{self.metadata_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.metadata_path)
+
+    def _batch_call(self, targets, names):
+        """
+        对每个目标地址调用一组无参数函数，合并为一个 JSON-RPC batch
+        :return: {(地址, 函数名): 原始返回值}
+        """
+        keys = [(address, name) for address in targets for name in names]
+        calls = [
+            ("eth_call", [{"to": Web3.to_checksum_address(address), "data": SELECTORS[name]}, "latest"])
+            for address, name in keys
+        ]
+        results = self.rpc.batch_request(calls)
+        return {key: result for key, result in zip(keys, results) if result and result != "0x"}
+
+    def ensure(self, pool_addresses):
+        """
+        批量补齐缺失的池与代币元数据
+        :param pool_addresses: 池地址集合（可以是生成器，下面会遍历两次）
+        """
+        pool_addresses = list(pool_addresses)
+        missing_pools = sorted({address.lower() for address in pool_addresses} - set(self.pools))
+        if missing_pools:
+            results = self._batch_call(missing_pools, ("token0", "token1"))
+            for address in missing_pools:
+                if (address, "token0") in results and (address, "token1") in results:
+                    self.pools[address] = {
+                        name: Web3.to_checksum_address(decode(["address"], bytes.fromhex(results[(address, name)][2:]))[0])
+                        for name in ("token0", "token1")
+                    }
+                    self.dirty = True
+                else:
+                    print_error(f"[METADATA] Failed to fetch token0/token1 for pool {address}")
+
+        token_addresses = {
+            pool[name].lower()
+            for address in pool_addresses
+            for pool in [self.pools.get(address.lower())] if pool
+            for name in ("token0", "token1")
+        }
+        missing_tokens = sorted(token_addresses - set(self.tokens))
+        if missing_tokens:
+            results = self._batch_call(missing_tokens, ("symbol", "decimals"))
+            for address in missing_tokens:
+                if (address, "symbol") in results and (address, "decimals") in results:
+                    self.tokens[address] = {
+                        "symbol": decode_symbol(results[(address, "symbol")]),
+                        "decimals": int(results[(address, "decimals")], 16),
+                    }
+                    self.dirty = True
+                else:
+                    print_error(f"[METADATA] Failed to fetch symbol/decimals for token {address}")
+
+        if missing_pools or missing_tokens:
+            self.log(f"[METADATA] Fetched {len(missing_pools)} pools and {len(missing_tokens)} tokens")
+
+    def is_complete(self, pool_address):
+        """池及其两个代币的元数据是否都已登记."""
+        pool = self.pools.get(pool_address.lower())
+        return pool is not None and pool["token0"].lower() in self.tokens and pool["token1"].lower() in self.tokens
+
+    def pool_metadata(self, pool_address):
+        """
+        获取池的代币元数据，缺失时补齐
+        :return: {"token0", "token1", "symbol0", "symbol1", "decimals0", "decimals1"}
+        """
+        if not self.is_complete(pool_address):
+            self.ensure([pool_address])
+            self.save()
+        if not self.is_complete(pool_address):
+            raise ValueError(f"Metadata unavailable for pool {pool_address}")
+        pool = self.pools[pool_address.lower()]
+        token0 = self.tokens[pool["token0"].lower()]
+        token1 = self.tokens[pool["token1"].lower()]
+        return {
+            "token0": pool["token0"],
+            "token1": pool["token1"],
+            "symbol0": token0["symbol"],
+            "symbol1": token1["symbol"],
+            "decimals0": token0["decimals"],
+            "decimals1": token1["decimals"],
+        }
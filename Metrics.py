@@ -0,0 +1,249 @@
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# RPC 延迟直方图的桶上界（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "eth_fetch"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+class Metrics:
+    def __init__(self):
+        """
+        一次运行的性能统计：各阶段（及每个池各阶段）的耗时、按方法的 RPC 调用数与延迟直方图、
+        解码日志数、读写字节数等计数器；可导出 JSON 运行报告和 Prometheus 文本格式
+        进程内共享一个实例（METRICS），进程池 worker 的统计以 report() 快照带回父进程后 merge
+        """
+        self._lock = threading.Lock()
+        self.profile_dir = None
+        self.profilers = {}  # 名称 -> cProfile.Profile，跨 reset 累积
+        self.reset()
+
+    def reset(self):
+        """清空全部统计（cProfile 结果除外）."""
+        with self._lock:
+            self.started = time.time()
+            self.stage_seconds = Counter()  # 阶段 -> 累计秒数
+            self.stage_runs = Counter()  # 阶段 -> 次数
+            self.pool_seconds = defaultdict(Counter)  # 池 -> {阶段: 累计秒数}
+            self.counters = Counter()  # logs_decoded / bytes_read / bytes_written / rpc_bytes_* 等
+            self.rpc_calls = Counter()  # 方法 -> 调用数（batch 中每个调用各计一次）
+            self.rpc_latency = {}  # 方法 -> [各桶计数..., +Inf 桶计数, 总秒数, 请求数]
+
+    def configure(self, profile_dir=None):
+        """
+        :param profile_dir: 不为空时，profile() 包裹的热点路径以 cProfile 采集，write_profiles 写入该目录
+        """
+        self.profile_dir = profile_dir or None
+
+    def record_stage(self, stage, seconds, pool=None):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_runs[stage] += 1
+            if pool is not None:
+                self.pool_seconds[str(pool)][stage] += seconds
+
+    @contextmanager
+    def stage(self, stage, pool=None):
+        """
+        计时一个阶段（墙钟时间），同一阶段的多次执行累加
+        :param stage: 阶段名，如 "fetch"、"decode"、"aggregate"
+        :param pool: 可选的池标识，同时计入该池的阶段耗时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start, pool)
+
+    def add(self, name, value=1):
+        """累加一个计数器."""
+        with self._lock:
+            self.counters[name] += value
+
+    def observe_rpc(self, methods, seconds):
+        """
+        记录一个 HTTP 请求：其中每个方法的调用数，以及该请求的延迟（计入请求中出现的每个方法的直方图）
+        :param methods: 该请求中的方法名列表（单个请求为一个元素，batch 为多个）
+        :param seconds: 请求耗时
+        """
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self.rpc_calls.update(methods)
+            for method in set(methods):
+                histogram = self.rpc_latency.setdefault(method, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0])
+                histogram[index] += 1
+                histogram[-2] += seconds
+                histogram[-1] += 1
+
+    @contextmanager
+    def profile(self, name):
+        """
+        在 cProfile 下执行热点路径（仅在 configure 了 profile_dir 时）；同一名称的多次执行累积到一个 profile
+        其他分析器已激活时（如另一个线程正在采集）跳过本次
+        """
+        if self.profile_dir is None:
+            yield
+            return
+        with self._lock:
+            profiler = self.profilers.setdefault(name, cProfile.Profile())
+        try:
+            profiler.enable()
+        except ValueError:
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def report(self):
+        """
+        JSON 可序列化的运行报告
+        :return: dict
+        """
+        with self._lock:
+            elapsed = time.time() - self.started
+            decode_seconds = self.stage_seconds.get("decode", 0.0)
+            return {
+                "started": self.started,
+                "elapsed_seconds": elapsed,
+                "stages": {
+                    stage: {"seconds": seconds, "runs": self.stage_runs[stage]}
+                    for stage, seconds in self.stage_seconds.most_common()
+                },
+                "pools": {pool: dict(stages) for pool, stages in self.pool_seconds.items()},
+                "counters": dict(self.counters),
+                "logs_decoded_per_second": self.counters["logs_decoded"] / decode_seconds if decode_seconds else 0.0,
+                "rpc": {
+                    method: {
+                        "calls": self.rpc_calls[method],
+                        "requests": self.rpc_latency[method][-1],
+                        "latency_seconds": self.rpc_latency[method][-2],
+                        "buckets": dict(zip([str(le) for le in LATENCY_BUCKETS] + ["+Inf"], self.rpc_latency[method][:-2])),
+                    }
+                    for method in sorted(self.rpc_latency)
+                },
+            }
+
+    def merge(self, report):
+        """合并另一个进程的 report() 快照."""
+        with self._lock:
+            for stage, entry in report["stages"].items():
+                self.stage_seconds[stage] += entry["seconds"]
+                self.stage_runs[stage] += entry["runs"]
+            for pool, stages in report["pools"].items():
+                self.pool_seconds[pool].update(stages)
+            self.counters.update(report["counters"])
+            for method, entry in report["rpc"].items():
+                self.rpc_calls[method] += entry["calls"]
+                histogram = self.rpc_latency.setdefault(method, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0])
+                for i, count in enumerate(entry["buckets"].values()):
+                    histogram[i] += count
+                histogram[-2] += entry["latency_seconds"]
+                histogram[-1] += entry["requests"]
+
+    def bottlenecks(self, limit=5):
+        """
+        耗时最多的 (池, 阶段)
+        :return: [(池, 阶段, 秒数), ...]
+        """
+        with self._lock:
+            entries = [
+                (pool, stage, seconds)
+                for pool, stages in self.pool_seconds.items()
+                for stage, seconds in stages.items()
+            ]
+        return sorted(entries, key=lambda entry: -entry[2])[:limit]
+
+    def to_prometheus(self):
+        """Prometheus 文本格式（exposition format 0.0.4）."""
+        report = self.report()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+            for suffix, labels, value in samples:
+                lines.append(f"{PREFIX}_{name}{suffix}{format_labels(labels)} {value}")
+
+        metric("stage_seconds_total", "counter", "Wall time spent per pipeline stage.",
+               [("", [("stage", stage)], entry["seconds"]) for stage, entry in report["stages"].items()])
+        metric("stage_runs_total", "counter", "Number of times each pipeline stage ran.",
+               [("", [("stage", stage)], entry["runs"]) for stage, entry in report["stages"].items()])
+        metric("pool_stage_seconds_total", "counter", "Wall time spent per pool and stage.",
+               [("", [("pool", pool), ("stage", stage)], seconds)
+                for pool, stages in report["pools"].items() for stage, seconds in stages.items()])
+        metric("rpc_calls_total", "counter", "JSON-RPC calls by method (each batch member counts once).",
+               [("", [("method", method)], entry["calls"]) for method, entry in report["rpc"].items()])
+
+        samples = []
+        for method, entry in report["rpc"].items():
+            cumulative = 0
+            for le, count in entry["buckets"].items():
+                cumulative += count
+                samples.append(("_bucket", [("method", method), ("le", le)], cumulative))
+            samples.append(("_sum", [("method", method)], entry["latency_seconds"]))
+            samples.append(("_count", [("method", method)], entry["requests"]))
+        metric("rpc_latency_seconds", "histogram", "HTTP request latency of JSON-RPC requests by method.", samples)
+
+        for name, value in sorted(report["counters"].items()):
+            metric(f"{name}_total", "counter", f"Total {name.replace('_', ' ')}.", [("", [], value)])
+        metric("logs_decoded_per_second", "gauge", "Decoded logs per second of decode stage time.",
+               [("", [], report["logs_decoded_per_second"])])
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=None, prometheus_path=None):
+        """写出 JSON 运行报告和 / 或 Prometheus 文本，路径为空时跳过."""
+        for path, content in ((json_path, lambda: json.dumps(self.report(), indent=2)),
+                              (prometheus_path, self.to_prometheus)):
+            if not path:
+                continue
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content())
+            os.replace(tmp_path, path)
+        self.write_profiles()
+
+    def write_profiles(self):
+        """把 cProfile 结果写入 profile_dir/{名称}-{pid}.prof（可用 pstats 或 snakeviz 查看）."""
+        if self.profile_dir is None or not self.profilers:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        with self._lock:
+            profilers = dict(self.profilers)
+        for name, profiler in profilers.items():
+            try:
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}-{os.getpid()}.prof"))
+            except (OSError, TypeError) as e:
+                print_error(f"[METRICS] Failed to write profile {name}: {e}")
+
+    def format_summary(self):
+        """单行摘要：各阶段耗时与解码速率."""
+        report = self.report()
+        stages = ", ".join(f"{stage}={entry['seconds']:.2f}s" for stage, entry in report["stages"].items())
+        return f"{stages or 'no stages'}; {report['logs_decoded_per_second']:.0f} logs/s decoded"
+
+
+# 进程内共享的统计实例
+METRICS = Metrics()
@@ -0,0 +1,216 @@
+import os
+import numpy as np
+import pandas as pd
+from .config import CONFIG
+from .Calculator import Calculator, interval_seconds, recompute_start
+from .FixedPoint import scale
+from .Metrics import METRICS
+from . import Fingerprint
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+def pair_key(tokenA, tokenB):
+    """交易对标识：两个代币地址（小写）排序后的元组，与 DEX 和 tokenA/tokenB 的顺序无关."""
+    return tuple(sorted((tokenA.lower(), tokenB.lower())))
+
+
+def group_pairs(rows):
+    """
+    按交易对分组池地址索引中的行（跳过没有池地址的行）
+    :param rows: 可迭代的行（dict 或 pandas Series）
+    :return: {pair_key: [行, ...]}
+    """
+    pairs = {}
+    for row in rows:
+        if pd.isna(row["pool_address"]) or row["pool_address"] == "":
+            continue
+        pairs.setdefault(pair_key(row["tokenA"], row["tokenB"]), []).append(row)
+    return pairs
+
+
+class PairAggregator:
+    def __init__(self, calculators, breakdown=False, enable_logging=True):
+        """
+        单次遍历聚合一个交易对的所有池（跨 DEX）：
+        每个池的 swap 只加载一次、最细部分聚合只计算一次；各池的 K 线按输出文件合并后一次 upsert 写出；
+        交易对的合并 K 线（{symbol0}-{symbol1}-{interval}-all.csv）由所有池的部分聚合一次分组得到
+        各池按交易对的 token0/token1 统一方向后，原始整数交易量精确相加，再按交易对代币的 decimals 缩放一次
+        :param calculators: 同一交易对（相同的两个代币）各池的 Calculator，粒度相同
+        :param breakdown: 是否在合并 K 线中输出每个 DEX 的交易量列（volume0_{dex} / volume1_{dex}）
+        :param enable_logging: 是否启用日志输出
+        """
+        if not calculators:
+            raise ValueError("PairAggregator requires at least one pool")
+        # 同一个池只计入一次（如 pair.csv 中同一交易对的两个方向各占一行）
+        unique = {}
+        for calculator in calculators:
+            unique.setdefault(calculator.pooladdress.lower(), calculator)
+        self.calculators = list(unique.values())
+        self.breakdown = breakdown
+        self.enable_logging = enable_logging
+        first = self.calculators[0]
+        self.intervals = first.intervals
+        # 交易对的方向与 decimals 取第一个池；其他池的 token0 不同时交换两侧交易量
+        self.metadata = first.metadata.pool_metadata(first.pooladdress)
+        self.label = f"{self.metadata['symbol0']}-{self.metadata['symbol1']}"
+        self.flipped = {}
+        tokens = {self.metadata["token0"].lower(), self.metadata["token1"].lower()}
+        for calculator in self.calculators:
+            metadata = calculator.metadata.pool_metadata(calculator.pooladdress)
+            if {metadata["token0"].lower(), metadata["token1"].lower()} != tokens:
+                raise ValueError(f"Pool {calculator.pooladdress} does not trade {self.label}")
+            self.flipped[calculator.pooladdress.lower()] = metadata["token0"].lower() != self.metadata["token0"].lower()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def combined_path(self, interval):
+        """合并 K 线文件路径：{symbol0}-{symbol1}-{interval}-all.csv."""
+        return os.path.join(CONFIG["output_path"], f"{self.label}-{interval}-all.csv")
+
+    def load_combined(self, path):
+        """读取已有的合并 K 线文件，不存在时为 None."""
+        if not os.path.exists(path):
+            return None
+        METRICS.add("bytes_read", os.path.getsize(path))
+        existing_df = pd.read_csv(path, dtype={"transactionHashHash": str})
+        existing_df["starttime"] = pd.to_datetime(existing_df["starttime"])
+        existing_df["endtime"] = pd.to_datetime(existing_df["endtime"])
+        return existing_df
+
+    def load_partials(self, start_time):
+        """
+        每个池加载一次 swap 并计算最细部分聚合，两侧交易量统一为交易对的方向
+        :return: [(calculator, 原方向的部分聚合, 统一方向的部分聚合), ...]，没有 swap 的池不在其中
+        """
+        parts = []
+        for calculator in self.calculators:
+            if not calculator.data_exists():
+                self.log(f"[PAIR] No stored swaps for {calculator.dex}:{calculator.pooladdress}, skipping")
+                continue
+            raw_data = calculator.load_data(start_time)
+            if raw_data.empty:
+                continue
+            partials = calculator.process_data(raw_data)
+            oriented = partials
+            if self.flipped[calculator.pooladdress.lower()]:
+                oriented = partials.rename(columns={"raw_volume0": "raw_volume1", "raw_volume1": "raw_volume0"})
+            parts.append((calculator, partials, oriented))
+        return parts
+
+    def dense(self, buckets, start, end, step):
+        """
+        把以分组起始 epoch 为索引的部分聚合展开为 [start, end) 的连续分组，空分组交易量与指纹为 0
+        :return: (原始交易量0, 原始交易量1, 指纹) 数组
+        """
+        count = (end - start) // step
+        positions = (buckets.index.to_numpy() - start) // step
+        volume0 = np.zeros(count, dtype=object)
+        volume1 = np.zeros(count, dtype=object)
+        fingerprints = np.zeros((count, Fingerprint.LANES), dtype=np.uint64)
+        volume0[positions] = buckets["raw_volume0"].to_numpy()
+        volume1[positions] = buckets["raw_volume1"].to_numpy()
+        fingerprints[positions] = buckets[Fingerprint.COLUMNS].to_numpy(dtype=np.uint64)
+        return volume0, volume1, fingerprints
+
+    def combine(self, oriented, dexes, interval):
+        """
+        所有池统一方向的部分聚合一次分组得到交易对的合并 K 线；breakdown 时按 DEX 另外输出交易量列
+        :param oriented: 各池已汇总到目标粒度的部分聚合拼接成的 DataFrame
+        :param dexes: 与 oriented 逐行对应的 DEX 名称
+        """
+        step = interval_seconds(interval)
+        totals = Calculator.combine(oriented)
+        start = int(totals.index.min())
+        end = int(totals.index.max()) + step
+        volume0, volume1, fingerprints = self.dense(totals, start, end, step)
+        candles = pd.DataFrame({
+            "transactionHashHash": Fingerprint.to_hex(fingerprints),
+            "volume0": scale(volume0, self.metadata["decimals0"]),
+            "volume1": scale(volume1, self.metadata["decimals1"]),
+        })
+        if self.breakdown:
+            for dex in dict.fromkeys(dexes):
+                volume0, volume1, _ = self.dense(Calculator.combine(oriented[dexes == dex]), start, end, step)
+                candles[f"volume0_{dex}"] = scale(volume0, self.metadata["decimals0"])
+                candles[f"volume1_{dex}"] = scale(volume1, self.metadata["decimals1"])
+        candles["symbol0"] = self.metadata["symbol0"]
+        candles["symbol1"] = self.metadata["symbol1"]
+        candles["starttime"] = pd.to_datetime(np.arange(start, end, step, dtype=np.int64), unit="s")
+        candles["endtime"] = candles["starttime"] + pd.to_timedelta(step, unit="s")
+        return candles
+
+    def save_combined(self, candles, existing_df, interval):
+        """按 starttime 把重新计算的分组 upsert 到合并 K 线文件（原子替换）."""
+        path = self.combined_path(interval)
+        count = len(candles)
+        if existing_df is not None:
+            candles = pd.concat([existing_df[~existing_df["starttime"].isin(candles["starttime"])], candles], ignore_index=True)
+        candles = candles.sort_values("starttime", kind="stable")
+        tmp_path = f"{path}.tmp"
+        candles.to_csv(tmp_path, index=False)
+        METRICS.add("bytes_written", os.path.getsize(tmp_path))
+        os.replace(tmp_path, path)
+        self.log(f"[PAIR] Upserted {count} combined buckets into {path}")
+
+    def calculate(self, per_pool=True, since=None):
+        """
+        一次加载交易对所有池的 swap，同时输出全部粒度的各池 K 线与合并 K 线，每个文件只写一次
+        从各输出中最早的未完成分组开始重新计算（新加入的池没有输出时从头计算）
+        :param per_pool: 为 False 时只输出合并 K 线（各池的 K 线已由流式聚合写出）；
+                         合并 K 线不区分池，新加入的池须通过 since 传入它的起始时间
+        :param since: 可选的时间，补拉了该时间之后的历史 swap、或有新加入的池时从这里起重新计算
+        :return: 是否成功
+        """
+        try:
+            self.log(f"[PAIR] Aggregating {len(self.calculators)} pools of {self.label}")
+            with METRICS.stage("load", self.label):
+                existing = {}  # (K 线文件路径, 粒度) -> 已有内容
+                resume_times = []
+                if per_pool:
+                    for calculator in self.calculators:
+                        for interval in self.intervals:
+                            key = (calculator.candle_path(interval), interval)
+                            if key not in existing:
+                                existing[key] = calculator.load_candles(key[0])
+                            resume_times.append(calculator.resume_time(existing[key]))
+                combined_existing = {interval: self.load_combined(self.combined_path(interval)) for interval in self.intervals}
+                resume_times += [
+                    df["starttime"].max() if df is not None and not df.empty else None
+                    for df in combined_existing.values()
+                ]
+                start_time = recompute_start(resume_times, since, self.intervals)
+                parts = self.load_partials(start_time)
+            if not parts:
+                self.log(f"[PAIR] No new swaps for {self.label} since {start_time}")
+                return True
+
+            outputs = {}  # (K 线文件路径, 粒度) -> (calculator, [各池 K 线])
+            combined = {}
+            with METRICS.stage("aggregate", self.label), METRICS.profile("aggregate"):
+                for interval in self.intervals:
+                    oriented = []
+                    dexes = []
+                    for calculator, partials, oriented_partials in parts:
+                        if per_pool:
+                            candles = calculator.to_candles(calculator.rollup(partials, interval), interval)
+                            key = (calculator.candle_path(interval), interval)
+                            outputs.setdefault(key, (calculator, []))[1].append(candles)
+                        rolled = calculator.rollup(oriented_partials, interval)
+                        oriented.append(rolled)
+                        dexes += [calculator.dex] * len(rolled)
+                    combined[interval] = self.combine(pd.concat(oriented), np.array(dexes), interval)
+            with METRICS.stage("candle_store", self.label):
+                for (path, interval), (calculator, frames) in outputs.items():
+                    merged = calculator.merge_data(pd.concat(frames, ignore_index=True))
+                    calculator.save_to_csv(merged, existing[(path, interval)], interval)
+                for interval, candles in combined.items():
+                    self.save_combined(candles, combined_existing[interval], interval)
+            return True
+        except Exception as e:
+            print_error(f"[ERROR] Pair aggregation failed for {self.label}: {e}")
+            return False
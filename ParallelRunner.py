@@ -0,0 +1,215 @@
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from .config import CONFIG
+from .PoolSync import PoolSync
+from .RPCClient import RPCClient
+from .RPCCache import RPCCache
+from .RPCScheduler import endpoint_configs, create_scheduler
+from .BlockIndex import BlockIndex
+from .LogFetcher import LogFetcher
+from .CheckpointStore import CheckpointStore
+from .MetadataRegistry import MetadataRegistry
+from .Metrics import METRICS
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# worker 进程内的共享对象，由 init_worker 设置
+_shared = {}
+
+
+def init_worker(config_snapshot, rate_limiter, file_lock, endpoint_limiters=None):
+    """
+    进程池 initializer：spawn 出的进程重新导入 config，先恢复父进程中的配置（可能在运行时被修改）
+    :param config_snapshot: 父进程的 CONFIG 副本
+    :param rate_limiter: 所有进程共用的 RateLimiter
+    :param file_lock: 检查点文件的跨进程锁
+    :param endpoint_limiters: 所有进程共用的各节点 RateLimiter 列表
+    """
+    CONFIG.update(config_snapshot)
+    METRICS.configure(profile_dir=CONFIG["profile_dir"])
+    _shared["rate_limiter"] = rate_limiter
+    _shared["file_lock"] = file_lock
+    _shared["endpoint_limiters"] = endpoint_limiters
+
+
+def make_rpc():
+    """worker 内的 RPC 客户端，与其他进程共用速率预算（包括各节点配额）和磁盘响应缓存."""
+    if "rpc_cache" not in _shared:
+        _shared["rpc_cache"] = RPCCache(
+            CONFIG["rpc_cache_dir"],
+            max_bytes=CONFIG["rpc_cache_max_bytes"],
+            mode=CONFIG["rpc_cache_mode"],
+            confirmations=CONFIG["rpc_cache_confirmations"],
+            enable_logging=CONFIG["enable_logging"]
+        )
+    if "scheduler" not in _shared:
+        _shared["scheduler"] = create_scheduler(
+            endpoint_configs(CONFIG["rpc_endpoints"], CONFIG["rpc_url"]),
+            _shared.get("endpoint_limiters"),
+            pool_size=CONFIG["rpc_pool_size"],
+            backoff=CONFIG["rpc_backoff"],
+            timeout=CONFIG["rpc_timeout"],
+            max_retries=CONFIG["rpc_max_retries"],
+            hedge_methods=CONFIG["rpc_hedge_methods"],
+            hedge_delay=CONFIG["rpc_hedge_delay"],
+            enable_logging=CONFIG["enable_logging"]
+        )
+    return RPCClient(
+        CONFIG["rpc_url"],
+        pool_size=CONFIG["rpc_pool_size"],
+        timeout=CONFIG["rpc_timeout"],
+        enable_logging=CONFIG["enable_logging"],
+        rate_limiter=_shared.get("rate_limiter"),
+        cache=_shared["rpc_cache"],
+        scheduler=_shared["scheduler"]
+    )
+
+
+def run_job(job, body):
+    """执行一个任务，异常转为结果中的错误信息，调用统计与性能统计随结果带回父进程."""
+    rpc = make_rpc()
+    METRICS.reset()
+    result = {"job": job, "error": None, "traceback": None, "calls": {}, "metrics": None}
+    try:
+        error = body(rpc)
+        if error:
+            result["error"] = error
+    except Exception as e:
+        result["error"] = str(e)
+        result["traceback"] = traceback.format_exc()
+    result["calls"] = dict(rpc.call_counts)
+    result["metrics"] = METRICS.report()
+    METRICS.write_profiles()
+    return result
+
+
+def split_pairs(pairs, groups):
+    """
+    把交易对按池数均衡地分成若干组（每次放入当前池数最少的组），同一交易对的池总在同一组
+    :param pairs: {(symbol0, symbol1): [池地址索引中的行, ...]}
+    :param groups: 组数上限
+    :return: [[行, ...], ...]，不含空组
+    """
+    buckets = [[] for _ in range(max(1, min(int(groups), len(pairs))))]
+    for rows in sorted(pairs.values(), key=len, reverse=True):
+        min(buckets, key=len).extend(rows)
+    return [bucket for bucket in buckets if bucket]
+
+
+def sync_group(job):
+    """
+    worker：一组交易对的同步与计算，与单进程模式相同：一次多地址扫描（log_sweep）、流式聚合、交易对聚合
+    :param job: {"rows": 池地址索引中的行, "window": 父进程解析的 (start_block, end_block),
+                 "start_time", "end_time", "interval", "output_path"}
+    """
+    def body(rpc):
+        enable_logging = CONFIG["enable_logging"]
+        file_lock = _shared.get("file_lock")
+        # 时间窗口已在父进程中解析，区块索引只用于补全时间戳（不加载索引文件）
+        block_index = BlockIndex(
+            rpc,
+            None,
+            enable_logging,
+            batch_size=CONFIG["block_batch_size"],
+            max_workers=CONFIG["block_max_workers"],
+            cache_size=CONFIG["block_cache_size"]
+        )
+        log_fetcher = LogFetcher(
+            rpc,
+            chunk_size=CONFIG["log_chunk_size"],
+            max_chunk_size=CONFIG["log_max_chunk_size"],
+            grow_threshold=CONFIG["log_grow_threshold"],
+            max_workers=CONFIG["log_max_workers"],
+            enable_logging=enable_logging
+        )
+        pool_sync = PoolSync(
+            rpc,
+            block_index,
+            log_fetcher,
+            CheckpointStore(CONFIG["checkpoint_path"], enable_logging, file_lock=file_lock),
+            MetadataRegistry(rpc, CONFIG["metadata_path"], enable_logging),
+            job["output_path"],
+            job["start_time"],
+            job["end_time"],
+            job["interval"],
+            enable_logging
+        )
+        data = pd.DataFrame(job["rows"])
+        aggregators, backfills, first_syncs = pool_sync.sync(data, tuple(job["window"]))
+        failed = pool_sync.calculate(data, aggregators, backfills, first_syncs)
+        if failed:
+            return f"calculation failed for {', '.join(map(str, failed))}"
+
+    return run_job(job, body)
+
+
+class ParallelRunner:
+    def __init__(self, max_workers, rate_limiter=None, enable_logging=True, endpoint_limiters=None):
+        """
+        跨交易对的多进程执行：每组交易对是一个任务，worker 内与单进程模式相同地扫描、解码、聚合
+        解码和聚合是 CPU 密集的 pandas/numpy 代码，多进程绕开 GIL；所有进程共用同一 RPC 速率预算，
+        检查点文件在跨进程锁下合并写入
+        :param max_workers: 进程数
+        :param rate_limiter: 所有进程共用的 RateLimiter（须由 spawn 上下文创建）
+        :param enable_logging: 是否启用日志输出
+        :param endpoint_limiters: 所有进程共用的各节点 RateLimiter 列表（须由 spawn 上下文创建）
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.context = multiprocessing.get_context("spawn")
+        self.rate_limiter = rate_limiter
+        self.endpoint_limiters = endpoint_limiters
+        self.file_lock = self.context.Lock()
+        self.enable_logging = enable_logging
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def run(self, groups, window, start_time, end_time, interval, output_path, rpc=None):
+        """
+        执行所有组的同步与计算
+        :param groups: [[池地址索引中的行（dict）, ...], ...]，见 split_pairs
+        :param window: 父进程解析的 (start_block, end_block)，所有组共用
+        :param rpc: 父进程的 RPCClient，worker 的调用统计合并到其中
+        :return: (成功任务数, 失败任务数)
+        """
+        success_count, failure_count = 0, 0
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self.context,
+            initializer=init_worker,
+            initargs=(dict(CONFIG), self.rate_limiter, self.file_lock, self.endpoint_limiters)
+        ) as executor:
+            futures = {}
+            for index, rows in enumerate(groups):
+                job = {
+                    "rows": rows, "window": window, "start_time": start_time, "end_time": end_time,
+                    "interval": interval, "output_path": output_path
+                }
+                futures[executor.submit(sync_group, job)] = f"group {index} ({len(rows)} pools)"
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # worker 进程崩溃等无法在任务内捕获的错误
+                    result = {"error": str(e), "traceback": None, "calls": {}, "metrics": None}
+                if rpc is not None:
+                    rpc.merge_counts(result["calls"])
+                if result["metrics"]:
+                    METRICS.merge(result["metrics"])
+                if result["error"]:
+                    failure_count += 1
+                    print_error(f"[PARALLEL] Sync failed for {name}: {result['error']}")
+                    if result["traceback"]:
+                        self.log(result["traceback"])
+                else:
+                    success_count += 1
+                    self.log(f"[PARALLEL] Sync completed for {name}")
+        return success_count, failure_count
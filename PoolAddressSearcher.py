@@ -1,12 +1,16 @@
 import pandas as pd
-from web3 import Web3
+from eth_abi import encode, decode
+from .RPCClient import RPCClient
+from .DEXAdapters import FACTORY_FUNCTIONS, get_adapter
+from .PoolDiscovery import PoolDiscovery
+from .Metrics import METRICS
 def print_error(message):
     # 红色的 ANSI 转义字符代码是 31
     print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
 
 
 class PoolAddressSearcher:
-    def __init__(self, rpc_url, tokenA, tokenB, dex, factory_address, factory_abi, function_call, enable_logging=True):
+    def __init__(self, rpc_url, tokenA, tokenB, dex, factory_address, function_call, enable_logging=True, rpc_client=None):
         """
         初始化 PoolAddressSearcher 类
         :param rpc_url: 以太坊节点的 RPC URL
@@ -14,21 +18,19 @@ class PoolAddressSearcher:
         :param tokenB: 第二个代币地址
         :param dex: DEX 名称
         :param factory_address: 工厂合约地址
-        :param factory_abi: 工厂合约的 ABI
         :param function_call: 调用的函数名称
         :param enable_logging: 是否启用日志输出
+        :param rpc_client: 共享的 RPCClient，为空时自行创建
         """
         self.enable_logging = enable_logging
-        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
-        if self.web3.is_connected():
-            self.log("Connected to Ethereum node")
-        else:
-            print_error("Failed to connect")
+        self.rpc = rpc_client or RPCClient(rpc_url, enable_logging=enable_logging)
+        self.rpc.health_check()
+        self.web3 = self.rpc.web3
         self.tokenA = self.web3.to_checksum_address(tokenA)
         self.tokenB = self.web3.to_checksum_address(tokenB)
         self.dex = dex
         self.factory_address = self.web3.to_checksum_address(factory_address)
-        self.factory_abi = factory_abi
+        self.adapter = get_adapter(dex)
         self.function_call = function_call
         self.log(f"[INIT] DEX: {self.dex}, TokenA: {self.tokenA}, TokenB: {self.tokenB}")
 
@@ -44,20 +46,16 @@ class PoolAddressSearcher:
         """
         try:
             self.log(f"[QUERY] Querying pool address for factory: {self.factory_address}")
-            # 初始化工厂合约
-            factory_contract = self.web3.eth.contract(address=self.factory_address, abi=self.factory_abi)
-
-            # 根据 function_call 调用函数
-            if self.function_call == "factory_contract.functions.getPool(tokenA, tokenB, 500).call()":
-                pool_address = factory_contract.functions.getPool(self.tokenA, self.tokenB, 500).call()
-            elif self.function_call == "factory_contract.functions.getPool(tokenA, tokenB, 3000).call()":
-                pool_address = factory_contract.functions.getPool(self.tokenA, self.tokenB, 3000).call()
-            elif self.function_call == "factory_contract.functions.getPool(tokenA, tokenB, 10000).call()":
-                pool_address = factory_contract.functions.getPool(self.tokenA, self.tokenB, 10000).call()
-            elif self.function_call == "factory_contract.functions.getPair(tokenA, tokenB).call()":
-                pool_address = factory_contract.functions.getPair(self.tokenA, self.tokenB).call()
-            else:
-                raise ValueError(f"Unsupported function call: {self.function_call}")
+            # 选择器与参数类型来自 DEX 适配器，不再按 ABI 构造合约对象
+            name, extra_args = PoolDiscovery.parse_factory_row({"dex": self.dex, "getfuction": self.function_call})
+            calldata = self.adapter.factory_selector + encode(
+                FACTORY_FUNCTIONS[name], [self.tokenA, self.tokenB] + extra_args
+            )
+            result = self.rpc.request("eth_call", [{"to": self.factory_address, "data": "0x" + calldata.hex()}, "latest"])
+            pool_address = None
+            if result and result != "0x":
+                (pool_address,) = decode(["address"], bytes.fromhex(result[2:]))
+                pool_address = self.web3.to_checksum_address(pool_address)
 
             # 检查查询到的池地址是否为空
             if pool_address == "0x0000000000000000000000000000000000000000" or not pool_address:
@@ -75,7 +73,8 @@ class PoolAddressSearcher:
         返回包含 dex、tokenA、tokenB 和 pool_address 的 pandas DataFrame
         """
         self.log("[PROCESS] Processing data...")
-        pool_address = self.query_pool_address()
+        with METRICS.stage("discovery", f"{self.dex}:{self.factory_address}"):
+            pool_address = self.query_pool_address()
         data = {
             "dex": [self.dex],
             "tokenA": [self.tokenA],
@@ -105,7 +104,6 @@ if __name__ == "__main__":
             # 获取当前行的数据
             dex = row["dex"]
             factory_address = row["factoryaddress"]
-            factory_abi = eval(row["factoryabi"])
             function_call = row["getfuction"]
 
             # 示例交易对：指定 tokenA 和 tokenB
@@ -114,7 +112,7 @@ if __name__ == "__main__":
 
             # 初始化 PoolAddressSearcher 并处理数据
             searcher = PoolAddressSearcher(
-                rpc_url, tokenA, tokenB, dex, factory_address, factory_abi, function_call, enable_logging
+                rpc_url, tokenA, tokenB, dex, factory_address, function_call, enable_logging
             )
             result_df = searcher.process_data()
 
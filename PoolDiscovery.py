@@ -0,0 +1,154 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from eth_abi import encode, decode
+from web3 import Web3
+from .DEXAdapters import FACTORY_FUNCTIONS, FACTORY_SELECTORS, get_adapter
+from .Metrics import METRICS
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+class PoolDiscovery:
+    def __init__(self, rpc_client, factory_df, pair_df, batch_size=100, max_workers=4, enable_logging=True):
+        """
+        批量并发查询池地址：收集所有 (factory, function, tokenA, tokenB) 组合，
+        以 JSON-RPC batch 请求一次性解析
+        :param rpc_client: 共享的 RPCClient 实例
+        :param factory_df: 工厂数据 DataFrame (dex, factoryaddress, factoryabi, getfuction)
+        :param pair_df: 交易对数据 DataFrame (tokenA, tokenB, tokenAname, tokenBname)
+        :param batch_size: 每个 JSON-RPC batch 中包含的 eth_call 数量
+        :param max_workers: 同时在途的 batch 请求数上限
+        :param enable_logging: 是否启用日志输出
+        """
+        self.rpc = rpc_client
+        self.factory_df = factory_df
+        self.pair_df = pair_df
+        self.batch_size = max(1, int(batch_size))
+        self.max_workers = max(1, int(max_workers))
+        self.enable_logging = enable_logging
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    @staticmethod
+    def parse_function_call(function_call):
+        """
+        解析 factory.csv 中的 getfuction 字符串
+        :param function_call: 例如 "factory_contract.functions.getPool(tokenA, tokenB, 500).call()"
+        :return: (函数名, 额外参数列表)
+        """
+        match = re.search(r"functions\.(\w+)\(([^)]*)\)", function_call)
+        if not match or match.group(1) not in FACTORY_FUNCTIONS:
+            raise ValueError(f"Unsupported function call: {function_call}")
+        name = match.group(1)
+        args = [arg.strip() for arg in match.group(2).split(",") if arg.strip()]
+        if args[:2] != ["tokenA", "tokenB"] or len(args) != len(FACTORY_FUNCTIONS[name]):
+            raise ValueError(f"Unsupported function call: {function_call}")
+        return name, [int(arg) for arg in args[2:]]
+
+    @classmethod
+    def parse_factory_row(cls, factory_row):
+        """
+        按 DEX 适配器校验 factory.csv 的一行：查询函数必须与该 DEX 的工厂一致，费率档不在已知列表中时给出警告
+        :return: (函数名, 额外参数列表)
+        """
+        adapter = get_adapter(factory_row["dex"])
+        name, extra_args = cls.parse_function_call(factory_row["getfuction"])
+        if name != adapter.factory_function:
+            raise ValueError(f"{adapter.name} factories expose {adapter.factory_function}, not {name}")
+        if extra_args and adapter.fee_tiers and extra_args[0] not in adapter.fee_tiers:
+            print_error(f"[WARNING] Fee tier {extra_args[0]} is not a known {adapter.name} fee tier {adapter.fee_tiers}")
+        return name, extra_args
+
+    def build_jobs(self):
+        """
+        生成所有待查询的组合
+        :return: 查询任务列表，每个任务包含输出行所需的字段和 eth_call 参数
+        """
+        jobs = []
+        for _, factory_row in self.factory_df.iterrows():
+            dex = factory_row["dex"]
+            factory_address = factory_row["factoryaddress"]
+            try:
+                name, extra_args = self.parse_factory_row(factory_row)
+            except ValueError as e:
+                print_error(f"[QUERY ERROR] Error querying pool address: {e}")
+                continue
+
+            for _, pair_row in self.pair_df.iterrows():
+                tokenA = Web3.to_checksum_address(pair_row["tokenA"])
+                tokenB = Web3.to_checksum_address(pair_row["tokenB"])
+                calldata = FACTORY_SELECTORS[name] + encode(
+                    FACTORY_FUNCTIONS[name], [tokenA, tokenB] + extra_args
+                )
+                jobs.append({
+                    "dex": dex,
+                    "factory_address": factory_address,
+                    "tokenA": pair_row["tokenA"],
+                    "tokenAname": pair_row["tokenAname"],
+                    "tokenB": pair_row["tokenB"],
+                    "tokenBname": pair_row["tokenBname"],
+                    "call": {
+                        "to": Web3.to_checksum_address(factory_address),
+                        "data": "0x" + calldata.hex(),
+                    },
+                })
+        self.log(f"[DISCOVERY] Built {len(jobs)} pool queries")
+        return jobs
+
+    def _post_batch(self, jobs):
+        """
+        发送一个 JSON-RPC batch 请求
+        :param jobs: 该批次的查询任务
+        :return: 与 jobs 等长的池地址列表，失败项为 None
+        """
+        calls = [("eth_call", [job["call"], "latest"]) for job in jobs]
+        try:
+            results = self.rpc.batch_request(calls)
+        except Exception as e:
+            print_error(f"[QUERY ERROR] Batch request failed: {e}")
+            return [None] * len(jobs)
+
+        addresses = []
+        for result in results:
+            if not result or result == "0x":
+                addresses.append(None)
+                continue
+            (address,) = decode(["address"], bytes.fromhex(result[2:]))
+            address = Web3.to_checksum_address(address)
+            addresses.append(None if address == ZERO_ADDRESS else address)
+        return addresses
+
+    def resolve(self):
+        """
+        并发执行所有批次并汇总结果
+        :return: (结果 DataFrame, 成功数, 失败数)
+        """
+        jobs = self.build_jobs()
+        batches = [jobs[offset:offset + self.batch_size] for offset in range(0, len(jobs), self.batch_size)]
+        with METRICS.stage("discovery"), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            batch_results = list(executor.map(self._post_batch, batches))
+
+        results = []
+        failure_count = 0
+        for batch_jobs, addresses in zip(batches, batch_results):
+            for job, pool_address in zip(batch_jobs, addresses):
+                if pool_address:
+                    row = {key: value for key, value in job.items() if key != "call"}
+                    row["pool_address"] = pool_address
+                    results.append(row)
+                else:
+                    failure_count += 1
+                    print_error(
+                        f"[WARNING] Skipping pair (dex：{job['dex']}，TokenA: {job['tokenA']}, "
+                        f"TokenB: {job['tokenB']}) due to empty pool address."
+                    )
+
+        columns = ["dex", "factory_address", "tokenA", "tokenAname", "tokenB", "tokenBname", "pool_address"]
+        return pd.DataFrame(results, columns=columns), len(results), failure_count
@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+import pandas as pd
+from web3 import Web3
+from .DEXAdapters import CREATION_TOPICS, get_adapter
+from .Metrics import METRICS
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# 主网工厂合约的部署区块：更早的区块中不可能有它们的创建事件；其他工厂用 eth_getCode 二分查找
+FACTORY_DEPLOYMENT_BLOCKS = {
+    "0x5c69bee701ef814a2b6a3edd4b1652cb9cc5aa6f": 10000835,  # Uniswap V2
+    "0xc0aee478e3658e2610c5f7a4a2e1777ce9e4f2ac": 10794229,  # SushiSwap
+    "0x1f98431c8ad98523631ae4a59f267346ea31f984": 12369621,  # Uniswap V3
+}
+
+
+def as_bytes(value):
+    """HexBytes / bytes / 十六进制字符串统一转为 bytes."""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def parse_creation(kind, log):
+    """
+    解码一条池创建事件
+    :param kind: 工厂查询函数名（"getPool" / "getPair"）
+    :return: (token0, token1, fee, 池地址)；V2 类工厂的 fee 为 None
+    """
+    topics = [as_bytes(topic) for topic in log["topics"]]
+    data = as_bytes(log["data"])
+    token0 = Web3.to_checksum_address(topics[1][-20:])
+    token1 = Web3.to_checksum_address(topics[2][-20:])
+    if kind == "getPool":
+        # data: int24 tickSpacing, address pool
+        return token0, token1, int.from_bytes(topics[3], "big"), Web3.to_checksum_address(data[44:64])
+    # data: address pair, uint256 allPairsLength
+    return token0, token1, None, Web3.to_checksum_address(data[12:32])
+
+
+def sort_tokens(tokenA, tokenB):
+    """与工厂一致按地址排序，返回小写地址."""
+    return tuple(sorted((tokenA.lower(), tokenB.lower())))
+
+
+class PoolRegistry:
+    def __init__(self, rpc_client, log_fetcher, registry_path, start_block=None, confirmations=12, enable_logging=True):
+        """
+        本地池注册表：扫描各工厂的 PoolCreated / PairCreated 事件建立 (token0, token1, fee) -> 池 的索引，
+        之后每次运行只扫描上次之后的新区块
+        查询池地址是本地字典查找，覆盖所有费率档（包括 factory.csv 中没有列出的），不再按交易对发起 eth_call
+        :param rpc_client: 共享的 RPCClient 实例
+        :param log_fetcher: 共享的 LogFetcher（自适应分块的 get_logs）
+        :param registry_path: 注册表文件路径 (JSON)
+        :param start_block: 新工厂从该区块开始扫描；为 None 时从各工厂的部署区块开始（见 deployment_block）
+        :param confirmations: 只扫描到链头减去该确认数，避免记录可能被重组的池
+        :param enable_logging: 是否启用日志输出
+        """
+        self.rpc = rpc_client
+        self.log_fetcher = log_fetcher
+        self.registry_path = registry_path
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.enable_logging = enable_logging
+        self.factories = {}  # 工厂地址（小写） -> {"dex", "kind", "last_block"}
+        self.pools = {}  # 池地址（小写） -> [工厂地址（小写）, token0, token1, fee, 创建区块]
+        self.index = {}  # (token0, token1)（小写） -> [池地址（小写）, ...]
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def load(self):
+        """从磁盘加载注册表并重建交易对索引."""
+        if not os.path.exists(self.registry_path):
+            return
+        try:
+            with open(self.registry_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print_error(f"[POOL REGISTRY] Failed to load {self.registry_path}: {e}")
+            return
+        self.factories = data.get("factories", {})
+        self.pools = {}
+        self.index = {}
+        for pool, entry in data.get("pools", {}).items():
+            self.add(pool, *entry)
+        self.dirty = False
+        self.log(f"[POOL REGISTRY] Loaded {len(self.pools)} pools of {len(self.factories)} factories")
+
+    def save(self):
+        """有新池或新的扫描进度时写盘（原子替换）."""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {"factories": self.factories, "pools": self.pools}
+            self.dirty = False
+        directory = os.path.dirname(self.registry_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{self.registry_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.registry_path)
+
+    def add(self, pool, factory, token0, token1, fee, block_number):
+        """登记一个池（重复登记同一池地址无副作用）."""
+        pool = pool.lower()
+        with self._lock:
+            if pool in self.pools:
+                return False
+            self.pools[pool] = [factory.lower(), token0, token1, fee, block_number]
+            self.index.setdefault(sort_tokens(token0, token1), []).append(pool)
+            self.dirty = True
+            return True
+
+    def has_code(self, address, block_number):
+        return self.rpc.request("eth_getCode", [Web3.to_checksum_address(address), hex(block_number)]) not in (None, "0x")
+
+    def deployment_block(self, factory):
+        """
+        工厂合约的部署区块：已知的主网工厂查表，其他工厂以 eth_getCode 二分查找合约代码首次出现的区块
+        （约 log2(链头) 次调用，需要节点保留历史状态）；查找失败时回退到从 0 开始扫描
+        :param factory: 工厂地址（小写）
+        """
+        if factory in FACTORY_DEPLOYMENT_BLOCKS:
+            return FACTORY_DEPLOYMENT_BLOCKS[factory]
+        try:
+            low, high = 0, self.rpc.web3.eth.block_number
+            if not self.has_code(factory, high):
+                print_error(f"[POOL REGISTRY] No contract code at factory {factory}, scanning from block 0")
+                return 0
+            while low < high:
+                middle = (low + high) // 2
+                if self.has_code(factory, middle):
+                    high = middle
+                else:
+                    low = middle + 1
+        except Exception as e:
+            print_error(f"[POOL REGISTRY] Failed to find the deployment block of {factory}, scanning from block 0: {e}")
+            return 0
+        self.log(f"[POOL REGISTRY] Factory {factory} deployed at block {low}")
+        return low
+
+    def register_factories(self, factory_df):
+        """
+        登记 factory.csv 中的工厂（同一工厂的多行只登记一次），新工厂从 start_block（默认为其部署区块）开始扫描
+        创建事件由该行 DEX 的适配器决定，不解析 getfuction
+        :return: {工厂地址（小写）: 查询函数名}
+        """
+        kinds = {}
+        for _, row in factory_df.iterrows():
+            try:
+                kind = get_adapter(row["dex"]).factory_function
+            except ValueError as e:
+                print_error(f"[POOL REGISTRY] Skipping factory {row['factoryaddress']}: {e}")
+                continue
+            factory = row["factoryaddress"].lower()
+            kinds[factory] = kind
+            if factory not in self.factories:
+                start_block = self.start_block if self.start_block is not None else self.deployment_block(factory)
+                self.factories[factory] = {"dex": row["dex"], "kind": kind, "last_block": start_block - 1}
+                self.dirty = True
+        return kinds
+
+    def update(self, factory_df):
+        """
+        增量扫描所有工厂的池创建事件：从各工厂已扫描到的最早区块开始，一次多地址 get_logs 扫描到安全链头
+        :return: 新登记的池数量
+        """
+        kinds = self.register_factories(factory_df)
+        if not kinds:
+            return 0
+        safe_head = self.rpc.web3.eth.block_number - self.confirmations
+        from_block = min(self.factories[factory]["last_block"] for factory in kinds) + 1
+        if from_block > safe_head:
+            return 0
+
+        self.log(f"[POOL REGISTRY] Scanning {len(kinds)} factories, blocks {from_block}-{safe_head}")
+        added = 0
+        address_topics = {factory: CREATION_TOPICS[kind] for factory, kind in kinds.items()}
+        try:
+            with METRICS.stage("discovery"):
+                for _, chunk_to, routed in self.log_fetcher.iter_by_address(address_topics, from_block, safe_head):
+                    for factory, logs in routed.items():
+                        for log in logs:
+                            try:
+                                token0, token1, fee, pool = parse_creation(kinds[factory], log)
+                            except (IndexError, ValueError) as e:
+                                print_error(f"[POOL REGISTRY] Undecodable creation event from {factory}: {e}")
+                                continue
+                            added += self.add(pool, factory, token0, token1, fee, log["blockNumber"])
+                    # 已完整扫描的区块立即记为进度，中断后从这里继续
+                    for factory in kinds:
+                        entry = self.factories[factory]
+                        if entry["last_block"] < chunk_to:
+                            entry["last_block"] = chunk_to
+                    self.dirty = True
+        finally:
+            self.save()
+        self.log(f"[POOL REGISTRY] Registered {added} new pools, {len(self.pools)} in total")
+        return added
+
+    def lookup(self, tokenA, tokenB, fee=None, factory=None):
+        """
+        本地查询两个代币之间的池
+        :param fee: 只返回该费率档的池，为 None 时返回所有费率档
+        :param factory: 只返回该工厂的池
+        :return: [{"pool_address", "factory_address", "dex", "token0", "token1", "fee", "block"}, ...]
+        """
+        results = []
+        for pool in self.index.get(sort_tokens(tokenA, tokenB), ()):
+            pool_factory, token0, token1, pool_fee, block_number = self.pools[pool]
+            if fee is not None and pool_fee != fee:
+                continue
+            if factory is not None and pool_factory != factory.lower():
+                continue
+            results.append({
+                "pool_address": Web3.to_checksum_address(pool),
+                "factory_address": pool_factory,
+                "dex": self.factories.get(pool_factory, {}).get("dex"),
+                "token0": token0,
+                "token1": token1,
+                "fee": pool_fee,
+                "block": block_number,
+            })
+        return results
+
+    def resolve(self, factory_df, pair_df):
+        """
+        与 PoolDiscovery.resolve 输出相同的池地址索引，但完全来自本地注册表：
+        每个 (工厂, 交易对) 输出该工厂下所有费率档的池
+        :return: (结果 DataFrame, 成功数, 失败数)
+        """
+        factories = {}
+        for _, row in factory_df.iterrows():
+            factories.setdefault(row["factoryaddress"].lower(), (row["dex"], row["factoryaddress"]))
+
+        results = []
+        failure_count = 0
+        with METRICS.stage("discovery"):
+            for _, pair_row in pair_df.iterrows():
+                for factory, (dex, factory_address) in factories.items():
+                    matches = self.lookup(pair_row["tokenA"], pair_row["tokenB"], factory=factory)
+                    if not matches:
+                        failure_count += 1
+                        print_error(
+                            f"[WARNING] Skipping pair (dex：{dex}，TokenA: {pair_row['tokenA']}, "
+                            f"TokenB: {pair_row['tokenB']}) due to empty pool address."
+                        )
+                        continue
+                    for match in sorted(matches, key=lambda match: (match["fee"] is None, match["fee"])):
+                        results.append({
+                            "dex": dex,
+                            "factory_address": factory_address,
+                            "tokenA": pair_row["tokenA"],
+                            "tokenAname": pair_row["tokenAname"],
+                            "tokenB": pair_row["tokenB"],
+                            "tokenBname": pair_row["tokenBname"],
+                            "fee": match["fee"],
+                            "pool_address": match["pool_address"],
+                        })
+
+        columns = ["dex", "factory_address", "tokenA", "tokenAname", "tokenB", "tokenBname", "fee", "pool_address"]
+        return pd.DataFrame(results, columns=columns), len(results), failure_count
@@ -0,0 +1,288 @@
+import pandas as pd
+from .config import CONFIG
+from .Calculator import Calculator
+from .DEXLogExtractor import DEXLogExtractor
+from .CandleAggregator import CandleAggregator
+from .PairAggregator import PairAggregator, group_pairs
+from .LogFetcher import prefetch
+from .Metrics import METRICS
+from .DEXAdapters import get_adapter
+
+
+class PoolSync:
+    def __init__(self, rpc_client, block_index, log_fetcher, checkpoints, metadata_registry, output_path,
+                 start_time, end_time, interval, enable_logging=True):
+        """
+        一组池的增量同步与 K 线计算：提取器、流式聚合器与计算器共用同一 RPC 客户端、区块索引、日志拉取器、
+        检查点与元数据；单进程模式下为池地址索引中的全部池，多进程模式下每个 worker 处理一组交易对
+        :param rpc_client: 共享的 RPCClient 实例
+        :param block_index: 共享的 BlockIndex 实例
+        :param log_fetcher: 共享的 LogFetcher 实例
+        :param checkpoints: CheckpointStore 实例
+        :param metadata_registry: MetadataRegistry 实例
+        :param output_path: 输出目录
+        :param start_time: 开始时间；为 None 时从每个池的检查点继续
+        :param end_time: 结束时间；为 None 时同步到链头
+        :param interval: K 线时间间隔或间隔列表
+        :param enable_logging: 是否启用日志输出
+        """
+        self.rpc = rpc_client
+        self.rpc_url = rpc_client.rpc_url
+        self.block_index = block_index
+        self.log_fetcher = log_fetcher
+        self.checkpoints = checkpoints
+        self.metadata = metadata_registry
+        self.output_path = output_path
+        self.start_time = start_time
+        self.end_time = end_time
+        self.interval = interval
+        self.enable_logging = enable_logging
+
+    def print_error(self, message):
+        # 红色的 ANSI 转义字符代码是 31
+        print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+    def block_range(self):
+        """把时间窗口解析为 (start_block, end_block)，所有池共用；多进程模式下由父进程解析一次后传给各 worker."""
+        with METRICS.stage("block_search"):
+            return self.block_index.block_window(self.start_time, self.end_time, CONFIG["sync_confirmations"])
+
+    def sweep_logs(self, jobs, aggregators=None, window=None):
+        """
+        所有池共用一次多地址 get_logs 扫描，按池地址分发日志，逐块写入并提交检查点
+        每个池只写入检查点尚未覆盖的区块；拉取与时间戳补全在后台线程中进行，与解码、写盘和聚合重叠
+        :param jobs: [(extractor, tokenAname, tokenBname), ...]
+        :param aggregators: 可选的 {池地址（小写）: CandleAggregator}，解码后的分块直接进入 K 线聚合（补拉的历史分块除外）
+        :param window: 已解析的 (start_block, end_block)，为空时在这里解析
+        :return: {池地址（小写）: 最早补拉区块的时间}，只包含补拉了历史数据、K 线需要重新计算的池
+        """
+        # 所有池共享同一时间窗口，区块范围只需解析一次
+        start_block, end_block = window or self.block_range()
+        pools = {}
+        backfills = {}
+        for extractor, tokenAname, tokenBname in jobs:
+            ranges = extractor.pending_ranges(start_block, end_block, self.checkpoints)
+            if ranges is None:
+                self.print_error(f"[SYNC] No checkpoint for {extractor.checkpoint_key}, a start_time is required for the first sync")
+            elif ranges:
+                address = extractor.pool_address.lower()
+                backfill_time = extractor.backfill_time(ranges, self.checkpoints)
+                if backfill_time is not None:
+                    backfills[address] = backfill_time
+                last_block = self.checkpoints.get(extractor.checkpoint_key)
+                pools[address] = (ranges, last_block, extractor, tokenAname, tokenBname)
+        if not pools:
+            print(f"[INFO] All pools are up to date at block {end_block}")
+            return backfills
+
+        from_block = min(ranges[0][0] for ranges, _, _, _, _ in pools.values())
+        address_topics = {extractor.pool_address: extractor.topic for _, _, extractor, _, _ in pools.values()}
+        chunks = self.iter_timestamped_chunks(address_topics, from_block, end_block)
+        for chunk_from, chunk_to, routed, block_timestamps in prefetch(chunks, CONFIG["stream_queue_depth"]):
+            for address, (ranges, last_block, extractor, tokenAname, tokenBname) in pools.items():
+                # 分块与该池每个未覆盖区间的交集分别写入、提交
+                for range_from, range_to in ranges:
+                    commit_from, commit_to = max(chunk_from, range_from), min(chunk_to, range_to)
+                    if commit_from > commit_to:
+                        continue
+                    logs = [log for log in routed[address] if commit_from <= log["blockNumber"] <= commit_to]
+                    decoded_logs = extractor.commit_chunk(
+                        logs, commit_from, commit_to, self.checkpoints, tokenAname, tokenBname, self.output_path, block_timestamps
+                    )
+                    if aggregators and address in aggregators and (last_block is None or range_from > last_block):
+                        aggregators[address].update(decoded_logs)
+        self.block_index.save()
+        return backfills
+
+    def first_syncs(self, jobs, window):
+        """
+        首次同步的池（同步前没有检查点）：它的 swap 从未计入交易对的合并 K 线，
+        合并 K 线需要从时间窗口起点重新计算，而不是从合并文件的最后一个分组继续
+        :param jobs: [(extractor, tokenAname, tokenBname), ...]
+        :param window: 已解析的 (start_block, end_block)
+        :return: {池地址（小写）: 时间窗口第一个区块的时间}
+        """
+        start_block = window[0]
+        if start_block is None:
+            return {}
+        addresses = [
+            extractor.pool_address.lower()
+            for extractor, _, _ in jobs
+            if self.checkpoints.get(extractor.checkpoint_key) is None
+        ]
+        if not addresses:
+            return {}
+        start_time = pd.Timestamp(self.block_index.get_timestamp(start_block), unit="s")
+        return dict.fromkeys(addresses, start_time)
+
+    def iter_timestamped_chunks(self, address_topics, from_block, to_block):
+        """
+        按区块顺序产出 (chunk_from, chunk_to, {池地址: 日志}, block_timestamps)
+        时间戳补全：一个分块内所有池的区块号合并为批量请求
+        """
+        chunks = self.log_fetcher.iter_by_address(address_topics, from_block, to_block)
+        while True:
+            with METRICS.stage("fetch"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            chunk_from, chunk_to, routed = chunk
+            with METRICS.stage("timestamps"):
+                block_timestamps = self.block_index.get_timestamps(
+                    log["blockNumber"] for logs in routed.values() for log in logs
+                )
+            yield chunk_from, chunk_to, routed, block_timestamps
+
+    def make_calculator(self, row):
+        """为池地址索引中的一行创建 Calculator."""
+        return Calculator(
+            rpc_url=self.rpc_url,
+            pooladdress=row["pool_address"],
+            tokenA=row["tokenA"],
+            tokenAname=row["tokenAname"],
+            tokenB=row["tokenB"],
+            tokenBname=row["tokenBname"],
+            dex=row["dex"],
+            interval=self.interval,
+            enable_logging=self.enable_logging,
+            rpc_client=self.rpc,
+            metadata_registry=self.metadata
+        )
+
+    def build_jobs(self, data):
+        """
+        为池地址索引中的每个池创建提取器
+        :return: [(extractor, tokenAname, tokenBname), ...]
+        """
+        jobs = []
+        for _, row in data.iterrows():
+            dex = row["dex"]
+            pool_address = row["pool_address"]
+            tokenAname = row["tokenAname"]
+            tokenBname = row["tokenBname"]
+
+            if pool_address is None or pool_address == "":
+                if self.enable_logging:
+                    self.print_error(f"[WARNING] Skipping row {tokenAname}-{tokenBname}-{pool_address} due to missing pool address.")
+                continue
+            try:
+                get_adapter(dex)
+            except ValueError as e:
+                self.print_error(f"[WARNING] Skipping pool {pool_address} of {tokenAname}-{tokenBname}: {e}")
+                continue
+
+            extractor = DEXLogExtractor(
+                rpc_url=self.rpc_url,
+                dex=dex,
+                pool_address=pool_address,
+                start_time=self.start_time,
+                end_time=self.end_time,
+                enable_logging=self.enable_logging,
+                rpc_client=self.rpc,
+                block_index=self.block_index,
+                log_fetcher=self.log_fetcher
+            )
+            jobs.append((extractor, tokenAname, tokenBname))
+        return jobs
+
+    def build_aggregators(self, data):
+        """
+        为每个池创建流式 K 线聚合器
+        :return: {池地址（小写）: CandleAggregator}
+        """
+        aggregators = {}
+        for _, row in data.iterrows():
+            if pd.isna(row["pool_address"]) or row["pool_address"] == "":
+                continue
+            try:
+                aggregators[row["pool_address"].lower()] = CandleAggregator(
+                    self.make_calculator(row), CONFIG["candle_flush_buckets"]
+                )
+            except Exception as e:
+                self.print_error(f"[ERROR] Failed to start aggregation for {row['pool_address']}: {e}")
+        return aggregators
+
+    def calculate_pairs(self, data, per_pool=True, backfills=None, first_syncs=None):
+        """
+        按交易对聚合：同一交易对的所有池（跨 DEX）一次加载、一次写出，并输出交易对的合并 K 线
+        :param per_pool: 为 False 时只输出合并 K 线
+        :param backfills: 可选的 {池地址（小写）: 最早补拉区块的时间}；包含这些池的交易对从该时间起重新计算全部 K 线
+        :param first_syncs: 可选的 {池地址（小写）: 首次同步的起始时间}；包含这些池的交易对从该时间起重新计算合并 K 线
+        :return: 计算失败的交易对
+        """
+        backfills = backfills or {}
+        first_syncs = first_syncs or {}
+        failed = []
+        for rows in group_pairs(row for _, row in data.iterrows()).values():
+            label = f"{rows[0]['tokenAname']}-{rows[0]['tokenBname']}"
+            try:
+                calculators = [self.make_calculator(row) for row in rows]
+                since = [backfills[row["pool_address"].lower()] for row in rows if row["pool_address"].lower() in backfills]
+                added = [first_syncs[row["pool_address"].lower()] for row in rows if row["pool_address"].lower() in first_syncs]
+                aggregator = PairAggregator(calculators, CONFIG["pair_breakdown"], self.enable_logging)
+                if since:
+                    succeeded = aggregator.calculate(per_pool=True, since=min(since + added))
+                else:
+                    # 新加入的池：各池的 K 线没有它的输出、会从头计算，合并 K 线则从它的起始时间重新计算
+                    succeeded = aggregator.calculate(per_pool, since=min(added) if added else None)
+                if not succeeded:
+                    failed.append(label)
+            except Exception as e:
+                self.print_error(f"[ERROR] Failed to aggregate {label}: {e}")
+                failed.append(label)
+        return failed
+
+    def sync(self, data, window=None):
+        """
+        增量同步：每个池只处理检查点尚未覆盖的区块，逐块提交
+        :param data: 池地址索引
+        :param window: 已解析的 (start_block, end_block)，为空时在这里解析
+        :return: (aggregators, backfills, first_syncs)；aggregators 为流式聚合器（未开启时为空），
+                 backfills 见 sweep_logs，first_syncs 见 first_syncs
+        """
+        jobs = self.build_jobs(data)
+        # 流式聚合：解码后的分块直接进入各池的 K 线聚合器，无需在同步后重新加载
+        aggregators = self.build_aggregators(data) if CONFIG["stream_aggregate"] else {}
+        backfills = {}
+        if not jobs:
+            return aggregators, backfills, {}
+        window = window or self.block_range()
+        first_syncs = self.first_syncs(jobs, window)
+        if CONFIG["log_sweep"]:
+            backfills = self.sweep_logs(jobs, aggregators, window)
+        else:
+            for extractor, tokenAname, tokenBname in jobs:
+                backfill_time = extractor.sync(
+                    self.checkpoints, tokenAname, tokenBname, self.output_path,
+                    aggregators.get(extractor.pool_address.lower()), window
+                )
+                if backfill_time is not None:
+                    backfills[extractor.pool_address.lower()] = backfill_time
+        return aggregators, backfills, first_syncs
+
+    def calculate(self, data, aggregators, backfills, first_syncs=None):
+        """
+        输出 K 线：流式聚合器写出剩余分组，再按配置计算交易对的合并 K 线或各池的 K 线
+        :param backfills: sync 返回的补拉时间
+        :param first_syncs: sync 返回的首次同步时间，交易对新加入的池需要计入合并 K 线
+        :return: 计算失败的交易对或池
+        """
+        failed = []
+        if aggregators:
+            for aggregator in aggregators.values():
+                aggregator.flush()
+            if CONFIG["pair_aggregate"]:
+                # 各池的 K 线已由流式聚合写出，只补充交易对的合并 K 线（补拉了历史数据的交易对全部重新计算）
+                failed += self.calculate_pairs(data, per_pool=False, backfills=backfills, first_syncs=first_syncs)
+            else:
+                for _, row in data.iterrows():
+                    if str(row["pool_address"]).lower() in backfills:
+                        if not self.make_calculator(row).calculate(since=backfills[str(row["pool_address"]).lower()]):
+                            failed.append(row["pool_address"])
+        elif CONFIG["pair_aggregate"]:
+            failed += self.calculate_pairs(data, backfills=backfills, first_syncs=first_syncs)
+        else:
+            for _, row in data.iterrows():
+                if not self.make_calculator(row).calculate(since=backfills.get(str(row["pool_address"]).lower())):
+                    failed.append(row["pool_address"])
+        return failed
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from .MetadataRegistry import SELECTORS
+from .DEXAdapters import FACTORY_SELECTORS
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+MODES = ("off", "readwrite", "record", "replay")
+ZERO_WORD = "0x" + "00" * 32
+# 以 "latest" 调用、结果非空时不会再改变的 view 函数：工厂的 getPool/getPair，池的 token0/token1，代币的 symbol/decimals
+IMMUTABLE_SELECTORS = {SELECTORS[name].lower() for name in SELECTORS} | {
+    "0x" + bytes(selector).hex() for selector in FACTORY_SELECTORS.values()
+}
+
+
+def block_number(tag):
+    """区块参数转为区块号；"latest" 等标签返回 None."""
+    if isinstance(tag, int):
+        return tag
+    if isinstance(tag, str) and tag.startswith("0x"):
+        return int(tag, 16)
+    return None
+
+
+def json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return str(value)
+
+
+class ReplayMiss(LookupError):
+    """replay 模式下请求不在缓存中."""
+
+
+class RPCCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, mode="readwrite", confirmations=64, enable_logging=True):
+        """
+        RPC 响应的内容寻址磁盘缓存：以 (chain id, method, params) 的 SHA256 为键，每个响应一个 JSON 文件，
+        总大小超过上限时按最近使用时间淘汰；键中包含链 ID，同一缓存目录用于不同的链（如主网与测试节点）时互不命中
+        只缓存不会再改变的结果：已确认区块的区块头与日志、指定已确认区块的 eth_call，
+        以及 "latest" 下结果非空的不可变 view 函数（getPool/getPair/token0/token1/symbol/decimals）
+        :param cache_dir: 缓存目录
+        :param max_bytes: 缓存总大小上限（字节）
+        :param mode: "readwrite" 命中则直接返回，未命中时请求并缓存不可变结果；
+                     "record" 总是请求节点，并记录所有响应（包括依赖链头的响应）；
+                     "replay" 严格回放，只从缓存返回（包括 record 记录的依赖链头的响应），未命中时抛出 ReplayMiss；
+                     "off" 不使用缓存
+        :param confirmations: 距链头该区块数以内的数据视为可能被重组，不缓存
+        :param enable_logging: 是否启用日志输出
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unsupported RPC cache mode: {mode}")
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        self.mode = mode
+        self.confirmations = confirmations
+        self.enable_logging = enable_logging
+        self.head_fn = None  # 返回链头区块号的函数，由 RPCClient 设置
+        self.chain_id_fn = None  # 向节点查询链 ID 的函数（不经过缓存），由 RPCClient 设置
+        self.endpoint = None  # 节点 URL，replay 模式据此从 chains.json 查找记录时的链 ID
+        self._chain_id = None
+        self._chain_lock = threading.Lock()
+        self.head_ttl = 60  # 链头的缓存时间（秒）
+        self._head = None
+        self._head_time = 0.0
+        self.entries = OrderedDict()  # 键 -> 文件大小，最久未使用的在前
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        if mode != "off":
+            self.load()
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def load(self):
+        """扫描缓存目录，按修改时间（最近使用时间）重建 LRU 顺序."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for directory, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".json") or filename == "chains.json":
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, filename))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, filename[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self.log(f"[RPC CACHE] Loaded {len(self.entries)} entries ({self.total_bytes} bytes) from {self.cache_dir}")
+
+    @property
+    def chains_path(self):
+        """节点 URL -> 链 ID 的记录，replay 模式不联网也能确定缓存键."""
+        return os.path.join(self.cache_dir, "chains.json")
+
+    def chain_id(self):
+        """当前节点的链 ID，每个缓存实例只查询一次."""
+        with self._chain_lock:
+            if self._chain_id is None:
+                self._chain_id = self.resolve_chain_id()
+            return self._chain_id
+
+    def resolve_chain_id(self):
+        """
+        非 replay 模式向节点查询并记录到 chains.json；replay 模式使用记录的值
+        （按节点 URL 查找，URL 不同但只记录过一条链时使用该链）
+        :raises ReplayMiss: replay 模式下没有可用的记录
+        """
+        try:
+            with open(self.chains_path, "r") as f:
+                chains = json.load(f)
+        except (OSError, ValueError):
+            chains = {}
+        if self.mode == "replay":
+            if self.endpoint in chains:
+                return int(chains[self.endpoint])
+            if len(set(chains.values())) == 1:
+                return int(next(iter(chains.values())))
+            raise ReplayMiss(f"[RPC CACHE] Replay miss: no recorded chain id for {self.endpoint}")
+        if self.chain_id_fn is None:
+            raise ValueError("RPC cache needs the chain id of the node, chain_id_fn is not set")
+        chain_id = int(self.chain_id_fn())
+        if chains.get(self.endpoint) != chain_id:
+            chains[self.endpoint] = chain_id
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.chains_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(chains, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.chains_path)
+        return chain_id
+
+    def key(self, method, params):
+        payload = json.dumps([self.chain_id(), method, params], sort_keys=True, separators=(",", ":"), default=json_default)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def safe_head(self):
+        """可缓存的最高区块：链头减去确认数；无法获取链头时为 -1（不缓存任何依赖区块号的结果）."""
+        if self.head_fn is None:
+            return -1
+        now = time.time()
+        if self._head is None or now - self._head_time > self.head_ttl:
+            try:
+                self._head = self.head_fn()
+                self._head_time = now
+            except Exception as e:
+                print_error(f"[RPC CACHE] Failed to fetch chain head: {e}")
+                return -1
+        return self._head - self.confirmations
+
+    def is_immutable(self, method, params, result):
+        """该响应是否永不改变."""
+        if result is None:
+            return False
+        if method == "eth_getBlockByNumber":
+            number = block_number(params[0])
+            return number is not None and number <= self.safe_head()
+        if method == "eth_getLogs":
+            log_filter = params[0]
+            from_block = block_number(log_filter.get("fromBlock"))
+            to_block = block_number(log_filter.get("toBlock"))
+            return from_block is not None and to_block is not None and to_block <= self.safe_head()
+        if method == "eth_call":
+            call = params[0]
+            number = block_number(params[1] if len(params) > 1 else "latest")
+            if number is not None:
+                return number <= self.safe_head()
+            selector = (call.get("data") or call.get("input") or "")[:10].lower()
+            # 零地址（池尚未创建）或空结果以后可能改变
+            return selector in IMMUTABLE_SELECTORS and result not in ("0x", ZERO_WORD)
+        return False
+
+    def get(self, method, params):
+        """
+        查找缓存
+        :return: (是否命中, 结果)
+        """
+        if self.mode in ("off", "record"):
+            return False, None
+        if method == "eth_chainId":
+            # 链 ID 是缓存键的一部分，不以缓存条目保存；replay 模式返回记录的值
+            return (True, hex(self.chain_id())) if self.mode == "replay" else (False, None)
+        key = self.key(method, params)
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is None or (not entry["immutable"] and self.mode != "replay"):
+            if self.mode == "replay":
+                raise ReplayMiss(f"[RPC CACHE] Replay miss: {method} {json.dumps(params, default=json_default)}")
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+        return True, entry["result"]
+
+    def put(self, method, params, result):
+        """缓存一个成功的响应（readwrite 模式只缓存不可变结果，record 模式记录全部）."""
+        if self.mode in ("off", "replay") or method == "eth_chainId":
+            return
+        immutable = self.is_immutable(method, params, result)
+        if not immutable and self.mode != "record":
+            return
+        key = self.key(method, params)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = json.dumps({"method": method, "immutable": immutable, "result": result}, separators=(",", ":"))
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self.path(old_key))
+            except OSError:
+                # 其他进程可能已淘汰该条目
+                pass
+        if evicted:
+            self.log(f"[RPC CACHE] Evicted {len(evicted)} entries, {self.total_bytes} bytes in use")
@@ -0,0 +1,269 @@
+import json
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from .Metrics import METRICS
+from .RPCScheduler import count_bytes
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+class CountingHTTPProvider(Web3.HTTPProvider):
+    """在 web3 的 HTTPProvider 上记录每个 RPC 方法的调用次数，并经过客户端的响应缓存与多节点调度."""
+
+    def __init__(self, endpoint_uri, client, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.client = client
+
+    def make_request(self, method, params):
+        hit, result = self.client.cache_lookup(method, params)
+        if hit:
+            return {"jsonrpc": "2.0", "id": self.client._next_id(), "result": result}
+        self.client.record(method)
+        self.client.throttle()
+        start = time.perf_counter()
+        try:
+            if self.client.scheduler is not None:
+                response = self.client.post(json.loads(self.encode_rpc_request(method, params)))
+            else:
+                response = super().make_request(method, params)
+        finally:
+            METRICS.observe_rpc([method], time.perf_counter() - start)
+        if "error" not in response:
+            self.client.cache_store(method, params, response.get("result"))
+        return response
+
+    def make_batch_request(self, requests):
+        responses = [None] * len(requests)
+        missing = []
+        for i, (method, params) in enumerate(requests):
+            hit, result = self.client.cache_lookup(method, params)
+            if hit:
+                responses[i] = {"jsonrpc": "2.0", "id": self.client._next_id(), "result": result}
+            else:
+                missing.append(i)
+        if not missing:
+            return responses
+
+        # 只有未命中的请求发往节点
+        requests_to_send = [requests[i] for i in missing]
+        for method, _ in requests_to_send:
+            self.client.record(method)
+        self.client.throttle(len(requests_to_send))
+        start = time.perf_counter()
+        try:
+            if self.client.scheduler is not None:
+                fetched = self.client.post(json.loads(self.encode_batch_rpc_request(requests_to_send)))
+                if isinstance(fetched, list):
+                    fetched = sorted(fetched, key=lambda response: response.get("id", 0))
+            else:
+                fetched = super().make_batch_request(requests_to_send)
+        finally:
+            METRICS.observe_rpc([method for method, _ in requests_to_send], time.perf_counter() - start)
+        if not isinstance(fetched, list):
+            return fetched
+        for i, response in zip(missing, fetched):
+            responses[i] = response
+            if "error" not in response:
+                self.client.cache_store(*requests[i], response.get("result"))
+        return responses
+
+
+class RPCClient:
+    def __init__(self, rpc_url, pool_size=20, timeout=30, enable_logging=True, rate_limiter=None, cache=None,
+                 scheduler=None):
+        """
+        共享的 RPC 客户端：一个 keep-alive 连接池，供一次运行中的所有组件复用
+        :param rpc_url: 以太坊节点的 RPC URL
+        :param pool_size: HTTP 连接池大小（应不小于最大并发请求数）
+        :param timeout: 单个 HTTP 请求的超时时间（秒）
+        :param enable_logging: 是否启用日志输出
+        :param rate_limiter: 可选的 RateLimiter，多个客户端（包括其他进程中的）共用同一速率预算
+        :param cache: 可选的 RPCCache，命中的请求不发往节点
+        :param scheduler: 可选的 RPCScheduler，设置后所有请求经调度器分发到多个节点（带重试与对冲），不再直接发往 rpc_url
+        """
+        self.rpc_url = rpc_url
+        self.timeout = timeout
+        self.enable_logging = enable_logging
+        self.rate_limiter = rate_limiter
+        self.call_counts = Counter()
+        self.cache_hits = Counter()
+        self.cache = cache
+        self.scheduler = scheduler
+        if cache is not None:
+            # 判断结果是否已确认时需要链头，仅在写入缓存时按需获取
+            cache.head_fn = lambda: int(self.request("eth_blockNumber", []), 16)
+            # 缓存键包含链 ID；eth_chainId 本身不经缓存
+            cache.chain_id_fn = lambda: int(self.request("eth_chainId", []), 16)
+            cache.endpoint = rpc_url
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._healthy = None
+
+        # 单个 Session 复用 TCP/TLS 连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.hooks["response"].append(count_bytes)
+
+        self.provider = CountingHTTPProvider(
+            rpc_url, self, session=self.session, request_kwargs={"timeout": timeout}
+        )
+        self.web3 = Web3(self.provider)
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def record(self, method, count=1):
+        """记录 RPC 方法调用次数."""
+        with self._lock:
+            self.call_counts[method] += count
+
+    def throttle(self, count=1):
+        """发送前按调用数占用速率预算."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(count)
+
+    def cache_lookup(self, method, params):
+        """
+        查找响应缓存，命中时计数
+        :return: (是否命中, 结果)
+        """
+        if self.cache is None:
+            return False, None
+        hit, result = self.cache.get(method, params)
+        if hit:
+            with self._lock:
+                self.cache_hits[method] += 1
+            METRICS.add("rpc_cache_hits")
+        return hit, result
+
+    def cache_store(self, method, params, result):
+        """把节点返回的结果交给响应缓存（由缓存判断是否可缓存）."""
+        if self.cache is not None:
+            self.cache.put(method, params, result)
+
+    def merge_counts(self, counts):
+        """合并其他客户端（如进程池 worker）的调用统计."""
+        with self._lock:
+            self.call_counts.update(counts)
+
+    def _next_id(self):
+        with self._lock:
+            self._request_id += 1
+            return self._request_id
+
+    def post(self, payload):
+        """
+        发送 JSON-RPC 请求或 batch：配置了调度器时经调度器发往多个节点，否则直接发往 rpc_url
+        :param payload: 单个请求 dict 或 batch 列表
+        :return: 解析后的 JSON 响应
+        """
+        if self.scheduler is not None:
+            return self.scheduler.post(payload)
+        response = self.session.post(self.rpc_url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def health_check(self):
+        """
+        连通性检查，每个客户端只执行一次
+        :return: 是否连接成功
+        """
+        if self._healthy is None:
+            self._healthy = self.web3.is_connected()
+            if self._healthy:
+                self.log("Connected to Ethereum node")
+            else:
+                print_error("Failed to connect")
+        return self._healthy
+
+    def request(self, method, params):
+        """
+        发送单个 JSON-RPC 请求，返回原始 JSON 结果
+        :param method: RPC 方法名
+        :param params: 参数列表
+        :return: result 字段
+        """
+        hit, result = self.cache_lookup(method, params)
+        if hit:
+            return result
+        self.record(method)
+        self.throttle()
+        payload = {"jsonrpc": "2.0", "id": self._next_id(), "method": method, "params": params}
+        start = time.perf_counter()
+        try:
+            reply = self.post(payload)
+        finally:
+            METRICS.observe_rpc([method], time.perf_counter() - start)
+        if "error" in reply:
+            raise ValueError(reply["error"])
+        self.cache_store(method, params, reply.get("result"))
+        return reply.get("result")
+
+    def batch_request(self, calls):
+        """
+        发送一个 JSON-RPC batch 请求
+        :param calls: [(method, params), ...]
+        :return: 与 calls 等长的 result 列表，出错的项为 None
+        """
+        if not calls:
+            return []
+        results = [None] * len(calls)
+        missing = []
+        for i, (method, params) in enumerate(calls):
+            hit, result = self.cache_lookup(method, params)
+            if hit:
+                results[i] = result
+            else:
+                missing.append(i)
+        if not missing:
+            return results
+
+        # 只有未命中的调用发往节点
+        payload = []
+        for i in missing:
+            method, params = calls[i]
+            payload.append({"jsonrpc": "2.0", "id": self._next_id(), "method": method, "params": params})
+            self.record(method)
+        self.throttle(len(missing))
+
+        start = time.perf_counter()
+        try:
+            replies = self.post(payload)
+        finally:
+            METRICS.observe_rpc([calls[i][0] for i in missing], time.perf_counter() - start)
+        if not isinstance(replies, list):
+            raise ValueError(f"Unexpected batch response: {replies}")
+
+        by_id = {reply.get("id"): reply for reply in replies}
+        for i, request in zip(missing, payload):
+            method, params = calls[i]
+            reply = by_id.get(request["id"], {})
+            if "error" in reply:
+                print_error(f"[RPC ERROR] {method} failed: {reply['error']}")
+            elif "result" in reply:
+                self.cache_store(method, params, reply["result"])
+            results[i] = reply.get("result")
+        return results
+
+    def format_counts(self):
+        """按调用次数输出每个 RPC 方法的统计（以及缓存命中数）."""
+        with self._lock:
+            items = self.call_counts.most_common()
+            hits = sum(self.cache_hits.values())
+        total = sum(count for _, count in items)
+        detail = ", ".join(f"{method}={count}" for method, count in items)
+        summary = f"{total} calls ({detail})" if items else "0 calls"
+        if hits:
+            summary = f"{summary}, {hits} served from cache"
+        if self.scheduler is not None and len(self.scheduler.endpoints) > 1:
+            summary = f"{summary}; endpoints: {self.scheduler.format_status()}"
+        return summary
@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from .Metrics import METRICS
+from .RateLimiter import RateLimiter
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+# 以 HTTP 200 返回、但实际是限流的 JSON-RPC 错误信息片段
+RATE_LIMIT_MARKERS = ("rate limit", "rate exceeded", "too many requests", "capacity exceeded", "throttl")
+
+
+def is_rate_limited(error):
+    text = str(error).lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+def count_bytes(response, *args, **kwargs):
+    """requests 的响应钩子：统计 RPC 请求与响应的字节数."""
+    body = response.request.body
+    METRICS.add("rpc_bytes_sent", len(body) if body else 0)
+    METRICS.add("rpc_bytes_received", len(response.content))
+
+
+def endpoint_configs(endpoints, default_url):
+    """
+    规范化节点配置
+    :param endpoints: URL 字符串或 {"url": ..., "rate_limit": 次/秒} 的列表
+    :param default_url: 列表为空时使用的单个节点
+    :return: [{"url": ..., "rate_limit": ...}, ...]
+    """
+    configs = [{"url": endpoint} if isinstance(endpoint, str) else dict(endpoint) for endpoint in endpoints or []]
+    return configs or [{"url": default_url}]
+
+
+class RetryableError(Exception):
+    """可换节点重试的错误：超时、连接失败、429、5xx 或限流."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RPCUnavailable(Exception):
+    """重试次数用尽，所有节点都不可用."""
+
+
+class Endpoint:
+    def __init__(self, url, rate_limiter=None, pool_size=20, backoff=0.5, max_backoff=30.0):
+        """
+        一个 RPC 节点：独立的连接池、速率预算和健康状态
+        :param url: 节点 URL
+        :param rate_limiter: 可选的 RateLimiter（该节点的配额，可跨进程共享）
+        :param pool_size: HTTP 连接池大小
+        :param backoff: 首次失败后的冷却时间（秒），连续失败时指数增长
+        :param max_backoff: 冷却时间上限（秒）
+        """
+        self.url = url
+        self.rate_limiter = rate_limiter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.hooks["response"].append(count_bytes)
+        self.latency = None  # 成功请求延迟的指数移动平均（秒）
+        self.failures = 0  # 连续失败次数
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def score(self, now, count):
+        """预计完成时间：冷却剩余时间 + 等待速率预算 + 按在途请求数放大的延迟；越小越优先."""
+        cooldown = max(0.0, self.cooldown_until - now)
+        budget = self.rate_limiter.wait_time(count) if self.rate_limiter is not None else 0.0
+        return cooldown + budget + (self.latency or 0.0) * (1 + self.in_flight)
+
+    def begin(self, count):
+        """占用速率预算（可能阻塞）并计入在途请求."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(count)
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def succeeded(self, seconds):
+        with self._lock:
+            self.failures = 0
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+    def failed(self, retry_after=None):
+        """记录失败并进入冷却：优先使用节点给出的 Retry-After，否则指数退避（带抖动）."""
+        with self._lock:
+            self.failures += 1
+            self.errors += 1
+            if retry_after is None:
+                retry_after = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.0)
+            self.cooldown_until = max(self.cooldown_until, time.time() + retry_after)
+
+
+class RPCScheduler:
+    def __init__(self, endpoints, timeout=30, max_retries=5, hedge_methods=(), hedge_delay=None,
+                 max_workers=8, enable_logging=True):
+        """
+        多节点 RPC 调度：每个请求发往预计最快完成的节点（考虑冷却、速率预算、延迟和在途请求），
+        因此总吞吐量是各节点配额之和；超时、429、5xx 与限流错误换节点重试，失败的节点指数退避冷却；
+        对延迟敏感的方法（如区块头）可在主请求迟迟未返回时向另一个节点发出对冲请求，取先返回的结果
+        :param endpoints: Endpoint 列表
+        :param timeout: 单个 HTTP 请求的超时时间（秒）
+        :param max_retries: 最大重试次数
+        :param hedge_methods: 需要对冲的方法名集合（batch 中全部为这些方法时才对冲）
+        :param hedge_delay: 发出对冲请求前的等待时间（秒），为 None 时取主节点平均延迟的 3 倍
+        :param max_workers: 对冲请求使用的线程数
+        :param enable_logging: 是否启用日志输出
+        """
+        if not endpoints:
+            raise ValueError("RPCScheduler requires at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
+        self.hedge_methods = set(hedge_methods)
+        self.hedge_delay = hedge_delay
+        self.enable_logging = enable_logging
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)))
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def choose(self, count, exclude=()):
+        """选择预计最快完成的节点，冷却中的节点只在没有其他节点时使用."""
+        now = time.time()
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+        healthy = [endpoint for endpoint in candidates if endpoint.cooldown_until <= now]
+        return min(healthy or candidates, key=lambda endpoint: endpoint.score(now, count))
+
+    def attempt(self, endpoint, payload, count):
+        """
+        向一个节点发送请求
+        :return: 解析后的 JSON 响应
+        :raises RetryableError: 可换节点重试的错误（节点已进入冷却）
+        """
+        wait_time = endpoint.cooldown_until - time.time()
+        if wait_time > 0:
+            time.sleep(wait_time)
+        endpoint.begin(count)
+        start = time.perf_counter()
+        try:
+            try:
+                response = endpoint.session.post(endpoint.url, json=payload, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                raise RetryableError(f"{endpoint.url}: {type(e).__name__}")
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = response.headers.get("Retry-After")
+                raise RetryableError(
+                    f"{endpoint.url}: HTTP {response.status_code}",
+                    float(retry_after) if retry_after and retry_after.replace(".", "", 1).isdigit() else None
+                )
+            response.raise_for_status()
+            reply = response.json()
+            if isinstance(reply, dict) and "error" in reply and is_rate_limited(reply["error"]):
+                raise RetryableError(f"{endpoint.url}: {reply['error']}")
+            endpoint.succeeded(time.perf_counter() - start)
+            return reply
+        except RetryableError as e:
+            endpoint.failed(e.retry_after)
+            raise
+        finally:
+            endpoint.end()
+
+    def hedged(self, primary, payload, count):
+        """主请求在 hedge_delay 内未返回时向另一个节点发出相同请求，取先成功的结果."""
+        delay = self.hedge_delay if self.hedge_delay is not None else 3 * (primary.latency or 0.3)
+        futures = {self.executor.submit(self.attempt, primary, payload, count): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            secondary = self.choose(count, exclude={primary})
+            futures[self.executor.submit(self.attempt, secondary, payload, count)] = secondary
+            METRICS.add("rpc_hedged_requests")
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except RetryableError as e:
+                    error = e
+        raise error
+
+    def post(self, payload):
+        """
+        发送一个 JSON-RPC 请求或 batch，失败时换节点重试
+        :param payload: 单个请求 dict 或 batch 列表
+        :return: 解析后的 JSON 响应
+        :raises RPCUnavailable: 重试次数用尽
+        """
+        requests_in_payload = payload if isinstance(payload, list) else [payload]
+        count = len(requests_in_payload)
+        hedge = (
+            len(self.endpoints) > 1
+            and self.hedge_methods
+            and all(request.get("method") in self.hedge_methods for request in requests_in_payload)
+        )
+        error = None
+        for attempt in range(self.max_retries + 1):
+            endpoint = self.choose(count)
+            try:
+                if hedge:
+                    return self.hedged(endpoint, payload, count)
+                return self.attempt(endpoint, payload, count)
+            except RetryableError as e:
+                error = e
+                METRICS.add("rpc_retries")
+                self.log(f"[RPC SCHEDULER] Attempt {attempt + 1} failed ({e}), retrying")
+        print_error(f"[RPC SCHEDULER] Giving up after {self.max_retries + 1} attempts: {error}")
+        raise RPCUnavailable(f"RPC request failed after {self.max_retries + 1} attempts: {error}")
+
+    def format_status(self):
+        """每个节点的请求数、错误数与平均延迟."""
+        return ", ".join(
+            f"{endpoint.url} requests={endpoint.requests} errors={endpoint.errors} "
+            f"latency={(endpoint.latency or 0.0) * 1000:.0f}ms"
+            for endpoint in self.endpoints
+        )
+
+
+def create_scheduler(configs, limiters=None, pool_size=20, backoff=0.5, **kwargs):
+    """
+    按节点配置创建调度器
+    :param configs: endpoint_configs 的结果
+    :param limiters: 与 configs 等长的 RateLimiter 列表（跨进程共享节点配额时由父进程创建），为空时按 rate_limit 在本进程创建
+    :param pool_size: 每个节点的 HTTP 连接池大小
+    :param backoff: 首次失败后的冷却时间（秒）
+    :param kwargs: 传给 RPCScheduler
+    """
+    if limiters is None:
+        limiters = [RateLimiter(config["rate_limit"]) if config.get("rate_limit") else None for config in configs]
+    endpoints = [
+        Endpoint(config["url"], limiter, pool_size=pool_size, backoff=backoff)
+        for config, limiter in zip(configs, limiters)
+    ]
+    return RPCScheduler(endpoints, **kwargs)
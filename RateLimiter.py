@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None, context=None):
+        """
+        跨进程共享的 RPC 速率预算（GCRA 漏桶）：按调用数计费，batch 中的每个调用各占一份
+        状态保存在共享内存中，把同一个实例传给进程池的 initializer 后所有 worker 共用同一预算
+        :param rate: 每秒允许的 RPC 调用数，<= 0 表示不限制
+        :param burst: 允许的突发调用数，默认为 1 秒的预算
+        :param context: multiprocessing 上下文，需与进程池使用的上下文一致
+        """
+        context = context or multiprocessing
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(self.rate, 1.0)
+        self._next = context.Value("d", 0.0, lock=False)  # 理论上下一个调用的到达时间
+        self._lock = context.Lock()
+
+    def acquire(self, count=1):
+        """
+        预约 count 个调用的预算，超出时阻塞到允许发送为止
+        :param count: 调用数
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            arrival = max(self._next.value, now) + count / self.rate
+            self._next.value = arrival
+        delay = arrival - self.burst / self.rate - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def wait_time(self, count=1):
+        """
+        现在预约 count 个调用需要等待的秒数（不占用预算，用于在多个节点之间选择）
+        :param count: 调用数
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.time()
+        arrival = max(self._next.value, now) + count / self.rate
+        return max(0.0, arrival - self.burst / self.rate - now)
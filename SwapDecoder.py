@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from .DEXAdapters import get_adapter
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+WORD_SIZE = 32
+# 一条 swap 的唯一标识：同一笔交易可以包含多条 Swap 日志（如经过多个费率档的路由）
+SWAP_KEY = ["transactionHash", "logIndex"]
+INT64_MAX = np.uint64(2 ** 63 - 1)
+ALL_ONES = np.uint64(2 ** 64 - 1)
+
+
+def bytes_column(values):
+    """HexBytes / bytes / 十六进制字符串列统一转为 bytes 列（bytes 类型原样返回）."""
+    if values and isinstance(values[0], str):
+        return [bytes.fromhex(value[2:] if value.startswith("0x") else value) for value in values]
+    return values
+
+
+def swap_key(df):
+    """df 中可用于去重的 SWAP_KEY 列（旧版 CSV 没有 logIndex 时只按交易哈希）."""
+    return [column for column in SWAP_KEY if column in df.columns]
+
+
+def int_column(values):
+    """十六进制字符串 / int 列转为 int64 数组，缺失值为 -1."""
+    return np.array(
+        [-1 if value is None else int(value, 16) if isinstance(value, str) else int(value) for value in values],
+        dtype=np.int64,
+    )
+
+
+def hex_column(buffer, count):
+    """把 count 个连续的 32 字节值转成不带 0x 前缀的十六进制字符串列表."""
+    text = buffer.hex()
+    width = WORD_SIZE * 2
+    return [text[i:i + width] for i in range(0, count * width, width)]
+
+
+def word_column(limbs, abi_type):
+    """
+    从 (n, 4) 的大端 uint64 limb 数组中按列取出一个 ABI 字段
+    能放进 int64 的值走 NumPy 快速路径，否则退化为 Python int 的 object 列
+    :param limbs: 每行一个 256 位 word，limbs[:, 0] 为最高 64 位
+    :param abi_type: uint256 / int256 / uint160 / uint128 / int24
+    :return: np.ndarray (int64 或 object)
+    """
+    high, low = limbs[:, :3], limbs[:, 3]
+    if abi_type == "int24":
+        # int24 在 word 内按符号扩展，低 64 位按补码解释即为原值
+        return low.view(np.int64)
+
+    signed = abi_type.startswith("int")
+    positive = (high == 0).all(axis=1) & (low <= INT64_MAX)
+    if signed:
+        negative = (high == ALL_ONES).all(axis=1) & (low > INT64_MAX)
+        fits = positive | negative
+    else:
+        fits = positive
+    if fits.all():
+        return low.view(np.int64)
+
+    # 大数：在 object 列上用移位拼接 limb，只对放不下 int64 的行计算
+    values = low.view(np.int64).astype(object)
+    wide = ~fits
+    big = limbs[wide].astype(object)
+    combined = (big[:, 0] << 192) | (big[:, 1] << 128) | (big[:, 2] << 64) | big[:, 3]
+    if signed:
+        combined = np.where(big[:, 0] >= 2 ** 63, combined - (1 << 256), combined)
+    values[wide] = combined
+    return values
+
+
+def encode_words(values):
+    """
+    word_column 的逆操作：把一列整数编码为补码、大端、逐个 32 字节拼接的缓冲区
+    :param values: int64 数组或 Python int 的 object 数组
+    :return: bytes，长度为 len(values) * 32
+    """
+    values = np.asarray(values)
+    if values.dtype != object:
+        low = values.astype(np.int64)
+        limbs = np.zeros((len(low), 4), dtype=np.uint64)
+        limbs[:, 3] = low.view(np.uint64)
+        limbs[low < 0, :3] = ALL_ONES
+        return limbs.astype(">u8").tobytes()
+    # object 列中能放进 int64 的行仍走向量化路径，只有大数逐个转换
+    small = np.abs(values.astype(np.float64)) < 2.0 ** 62
+    if small.all():
+        return encode_words(values.astype(np.int64))
+    words = np.empty((len(values), WORD_SIZE), dtype=np.uint8)
+    words[small] = np.frombuffer(encode_words(values[small].astype(np.int64)), dtype=np.uint8).reshape(-1, WORD_SIZE)
+    # uint256 可能 >= 2**255，只有负数按有符号编码
+    words[~small] = np.frombuffer(
+        b"".join(int(value).to_bytes(WORD_SIZE, "big", signed=value < 0) for value in values[~small]), dtype=np.uint8
+    ).reshape(-1, WORD_SIZE)
+    return words.tobytes()
+
+
+def decode_swaps(dex, logs, block_timestamps):
+    """
+    批量解码 Swap 日志：把所有日志的 data 拼成一个缓冲区，按 word 列式切出各字段
+    :param dex: DEX 类型（见 DEXAdapters）
+    :param logs: get_logs 返回的日志（web3 AttributeDict 或原始 JSON 字典）
+    :param block_timestamps: {区块号: Unix 时间戳}
+    :return: (DataFrame, 解码失败的日志数)
+    """
+    adapter = get_adapter(dex)
+    layout = adapter.data_layout
+    topic_fields = adapter.topic_fields
+    data_size = len(layout) * WORD_SIZE
+
+    # 按列取出字段，避免逐条日志的 Python 分支
+    datas = bytes_column([log["data"] for log in logs])
+    blocks = [log.get("blockNumber") for log in logs]
+    log_topics = [log["topics"] for log in logs]
+    min_topics = adapter.min_topics
+
+    valid = np.fromiter(map(len, datas), dtype=np.int64, count=len(datas)) == data_size
+    if min_topics:
+        valid &= np.fromiter(map(len, log_topics), dtype=np.int64, count=len(log_topics)) >= min_topics
+    errors = int((~valid).sum())
+    for i in np.flatnonzero(~valid):
+        print_error(f"[DECODE ERROR] Error decoding log {i + 1}/{len(logs)}: unexpected layout")
+    has_block = np.array([bool(block) for block in blocks], dtype=bool)
+    for i in np.flatnonzero(valid & ~has_block):
+        print_error(f"[DECODE ERROR] Missing blockNumber in log {i + 1}/{len(logs)}")
+    keep = valid & has_block
+    if not keep.all():
+        indices = np.flatnonzero(keep)
+        logs = [logs[i] for i in indices]
+        datas = [datas[i] for i in indices]
+        blocks = [blocks[i] for i in indices]
+        log_topics = [log_topics[i] for i in indices]
+
+    if blocks and isinstance(blocks[0], str):
+        blocks = [int(block, 16) for block in blocks]
+    hashes = bytes_column([log["transactionHash"] for log in logs])
+    topics = [bytes_column([entry[index] for entry in log_topics]) for _, index in topic_fields]
+
+    count = len(datas)
+    columns = {
+        "transactionHash": hex_column(b"".join(hashes), count),
+        "logIndex": int_column([log.get("logIndex") for log in logs]),
+    }
+    words = np.frombuffer(b"".join(datas), dtype=">u8").astype(np.uint64).reshape(count, len(layout), 4)
+    for position, (name, abi_type) in enumerate(layout):
+        columns[name] = word_column(words[:, position, :], abi_type)
+    for (name, _), column in zip(topic_fields, topics):
+        columns[name] = hex_column(b"".join(column), count)
+
+    timestamps = pd.Series(blocks, dtype="int64").map(block_timestamps)
+    missing = int(timestamps.isna().sum())
+    if missing:
+        print_error(f"[DECODE ERROR] Missing timestamp for {missing} logs")
+    columns["timestamp"] = pd.to_datetime(timestamps, unit="s")
+    return pd.DataFrame(columns), errors
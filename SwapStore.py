@@ -0,0 +1,213 @@
+import os
+import numpy as np
+import pandas as pd
+from .Metrics import METRICS
+from .DEXAdapters import get_adapter
+from .SwapDecoder import SWAP_KEY, WORD_SIZE, encode_words, word_column
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，仅 Parquet 存储需要
+    pa = None
+    pq = None
+def print_error(message):
+    # 红色的 ANSI 转义字符代码是 31
+    print(f"\033[31m{message}\033[0m")  # 31 是红色，0 是重置颜色
+
+
+class SwapStore:
+    def __init__(self, root, enable_logging=True):
+        """
+        列式、分区的 swap 存储：按池和按天分区写为 Parquet
+        目录结构为 {root}/{dex}-{tokenA}-{tokenB}/{池地址（小写）}/{YYYY-MM-DD}.parquet
+        同一交易对在同一 DEX 可以有多个池（如 V3 的各费率档），每个池单独分区，按 (transactionHash, logIndex) 去重
+        交易哈希和地址以字典编码存储，uint256/int256 以 32 字节补码定长二进制存储，不经过文本
+        :param root: 存储根目录
+        :param enable_logging: 是否启用日志输出
+        """
+        if pa is None:
+            raise ImportError("SwapStore requires pyarrow (pip install pyarrow), or set CONFIG['swap_store'] to 'csv'")
+        self.root = root
+        self.enable_logging = enable_logging
+
+    def log(self, message):
+        """控制日志输出的函数."""
+        if self.enable_logging:
+            print(message)
+
+    def pair_dir(self, dex, tokenA_name, tokenB_name):
+        return os.path.join(self.root, f"{dex}-{tokenA_name}-{tokenB_name}")
+
+    def pool_dir(self, dex, tokenA_name, tokenB_name, pool_address):
+        return os.path.join(self.pair_dir(dex, tokenA_name, tokenB_name), pool_address.lower())
+
+    def pool_dirs(self, dex, tokenA_name, tokenB_name, pool_address=None):
+        """
+        已存在的池分区目录
+        :param pool_address: 为 None 时返回该交易对在该 DEX 下的所有池
+        """
+        if pool_address is not None:
+            pool_dir = self.pool_dir(dex, tokenA_name, tokenB_name, pool_address)
+            return [pool_dir] if os.path.isdir(pool_dir) else []
+        pair_dir = self.pair_dir(dex, tokenA_name, tokenB_name)
+        if not os.path.isdir(pair_dir):
+            return []
+        return [
+            os.path.join(pair_dir, name) for name in sorted(os.listdir(pair_dir))
+            if os.path.isdir(os.path.join(pair_dir, name))
+        ]
+
+    @staticmethod
+    def schema(dex):
+        """该 DEX 的 Arrow schema（列顺序与解码结果一致）."""
+        adapter = get_adapter(dex)
+        fields = [
+            pa.field("transactionHash", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("logIndex", pa.int32()),
+        ]
+        for name, abi_type in adapter.data_layout:
+            fields.append(pa.field(name, pa.int32() if abi_type == "int24" else pa.binary(WORD_SIZE)))
+        for name, _ in adapter.topic_fields:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        fields.append(pa.field("timestamp", pa.timestamp("ms")))
+        fields.append(pa.field("pool_address", pa.dictionary(pa.int32(), pa.string())))
+        return pa.schema(fields)
+
+    def to_table(self, dex, df):
+        """解码结果 DataFrame -> Arrow Table."""
+        schema = self.schema(dex)
+        arrays = []
+        for field in schema:
+            column = df[field.name]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(column.astype(str).tolist(), type=pa.string()).dictionary_encode())
+            elif pa.types.is_fixed_size_binary(field.type):
+                buffer = pa.py_buffer(encode_words(column.to_numpy()))
+                arrays.append(pa.FixedSizeBinaryArray.from_buffers(field.type, len(column), [None, buffer]))
+            elif field.name == "timestamp":
+                arrays.append(pa.array(pd.to_datetime(column).astype("datetime64[ms]"), type=field.type))
+            else:
+                arrays.append(pa.array(column.to_numpy(), type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def from_table(self, dex, table):
+        """Arrow Table -> 与解码结果同结构的 DataFrame（大整数精确还原）."""
+        columns = {}
+        abi_types = dict(get_adapter(dex).data_layout)
+        for field in table.schema:
+            column = table.column(field.name).combine_chunks()
+            if pa.types.is_dictionary(field.type):
+                columns[field.name] = column.dictionary_decode().to_pandas()
+            elif pa.types.is_fixed_size_binary(field.type):
+                count = len(column)
+                limbs = np.frombuffer(
+                    column.buffers()[1], dtype=">u8", count=count * 4, offset=column.offset * WORD_SIZE
+                ).astype(np.uint64).reshape(count, 4)
+                columns[field.name] = word_column(limbs, abi_types[field.name])
+            elif field.name == "timestamp":
+                columns[field.name] = column.to_pandas().astype("datetime64[ns]")
+            else:
+                columns[field.name] = column.to_numpy().astype(np.int64)
+        return pd.DataFrame(columns)
+
+    def write(self, dex, tokenA_name, tokenB_name, pool_address, decoded_logs):
+        """
+        写入一个池的解码结果：只读取并重写涉及到的日分区，按 (transactionHash, logIndex) 去重
+        :param pool_address: swap 所属的池，决定分区目录并写入 pool_address 列
+        :param decoded_logs: 解码结果 DataFrame
+        :return: 实际新增的记录数
+        """
+        new_data = pd.DataFrame(decoded_logs)
+        missing = new_data["timestamp"].isna()
+        if missing.any():
+            print_error(f"[SWAP STORE] Dropping {int(missing.sum())} logs without timestamp")
+            new_data = new_data[~missing]
+        if new_data.empty:
+            return 0
+        new_data = new_data.assign(pool_address=pool_address)
+
+        pool_dir = self.pool_dir(dex, tokenA_name, tokenB_name, pool_address)
+        os.makedirs(pool_dir, exist_ok=True)
+        added = 0
+        days = pd.to_datetime(new_data["timestamp"]).dt.strftime("%Y-%m-%d")
+        for day, day_data in new_data.groupby(days.to_numpy(), sort=True):
+            path = os.path.join(pool_dir, f"{day}.parquet")
+            day_data = day_data.drop_duplicates(subset=SWAP_KEY, keep="first")
+            table = self.to_table(dex, day_data)
+            if os.path.exists(path):
+                METRICS.add("bytes_read", os.path.getsize(path))
+                existing = pq.read_table(path)
+                known = pd.MultiIndex.from_arrays([
+                    existing.column("transactionHash").combine_chunks().dictionary_decode().to_pylist(),
+                    existing.column("logIndex").to_numpy(),
+                ])
+                keep = ~pd.MultiIndex.from_frame(day_data[SWAP_KEY]).isin(known)
+                if not keep.any():
+                    continue
+                table = pa.concat_tables([existing, table.filter(pa.array(keep))]).unify_dictionaries()
+                added += int(keep.sum())
+            else:
+                added += len(day_data)
+            tmp_path = f"{path}.tmp"
+            pq.write_table(table, tmp_path)
+            METRICS.add("bytes_written", os.path.getsize(tmp_path))
+            os.replace(tmp_path, path)
+
+        self.log(f"[SWAP STORE] {added} new swaps written to {pool_dir}")
+        return added
+
+    def partitions(self, dex, tokenA_name, tokenB_name, start_time=None, end_time=None, pool_address=None):
+        """
+        列出与时间范围相交的日分区文件
+        :param pool_address: 只列出该池的分区，为 None 时列出交易对在该 DEX 下所有池的分区
+        :return: 分区文件路径列表（按池、日期升序）
+        """
+        first_day = pd.Timestamp(start_time).strftime("%Y-%m-%d") if start_time is not None else None
+        last_day = pd.Timestamp(end_time).strftime("%Y-%m-%d") if end_time is not None else None
+        paths = []
+        for pool_dir in self.pool_dirs(dex, tokenA_name, tokenB_name, pool_address):
+            for filename in sorted(os.listdir(pool_dir)):
+                if not filename.endswith(".parquet"):
+                    continue
+                day = filename[:-len(".parquet")]
+                if (first_day is None or day >= first_day) and (last_day is None or day <= last_day):
+                    paths.append(os.path.join(pool_dir, filename))
+        return paths
+
+    def read(self, dex, tokenA_name, tokenB_name, start_time=None, end_time=None, pool_address=None):
+        """
+        读取 swap，时间范围下推到分区裁剪和 Parquet 行组过滤
+        :param start_time: 起始时间（含），None 表示不限
+        :param end_time: 结束时间（不含），None 表示不限
+        :param pool_address: 只读取该池，为 None 时读取交易对在该 DEX 下的所有池（按时间排序）
+        :return: DataFrame；没有存储的池时为 None
+        """
+        pool_dirs = self.pool_dirs(dex, tokenA_name, tokenB_name, pool_address)
+        if not pool_dirs:
+            return None
+        filters = []
+        if start_time is not None:
+            filters.append(("timestamp", ">=", pd.Timestamp(start_time).to_pydatetime()))
+        if end_time is not None:
+            filters.append(("timestamp", "<", pd.Timestamp(end_time).to_pydatetime()))
+
+        paths = self.partitions(dex, tokenA_name, tokenB_name, start_time, end_time, pool_address)
+        METRICS.add("bytes_read", sum(os.path.getsize(path) for path in paths))
+        tables = [pq.read_table(path, filters=filters or None) for path in paths]
+        if not tables:
+            return self.from_table(dex, self.schema(dex).empty_table())
+        table = pa.concat_tables(tables).unify_dictionaries()
+        self.log(f"[SWAP STORE] Read {table.num_rows} swaps from {len(tables)} partitions")
+        df = self.from_table(dex, table)
+        if len(pool_dirs) > 1:
+            df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+        return df
+
+    def export_csv(self, dex, tokenA_name, tokenB_name, output_path, start_time=None, end_time=None, pool_address=None):
+        """导出为 CSV 文件（pool_address 为 None 时导出交易对在该 DEX 下的所有池）."""
+        df = self.read(dex, tokenA_name, tokenB_name, start_time, end_time, pool_address)
+        if df is None:
+            print_error(f"[SWAP STORE] No data for {dex}-{tokenA_name}-{tokenB_name}")
+            return
+        df.to_csv(output_path, index=False)
+        self.log(f"[SWAP STORE] Exported {len(df)} swaps to {output_path}")
@@ -0,0 +1,83 @@
+"""
+Swap 解码微基准：逐条 eth_abi.decode 的旧路径 vs SwapDecoder 的列式批量解码
+以 RESULT/ 中已有的 swap 记录为样本，重新编码为原始日志后按需复制放大
+
+用法（在项目根目录下）：
+    python -m modules.ETH_fetch.benchmarks.bench_decode --size 100000
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+from eth_abi import encode
+from ..DEXLogExtractor import DEXLogExtractor
+from ..DEXAdapters import DEX_ADAPTERS
+
+RESULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "RESULT")
+
+
+def load_fixture_logs(dex):
+    """把 RESULT/{dex}-*.csv 中的记录编码回 Swap 日志."""
+    layout = DEX_ADAPTERS[dex].data_layout
+    topic_fields = DEX_ADAPTERS[dex].topic_fields
+    logs = []
+    for path in sorted(glob.glob(os.path.join(RESULT_DIR, f"{dex}-*.csv"))):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                topics = [b"\x00" * 32] * 3
+                for name, index in topic_fields:
+                    topics[index] = bytes.fromhex(row[name])
+                logs.append({
+                    "data": encode([abi_type for _, abi_type in layout], [int(row[name]) for name, _ in layout]),
+                    "topics": topics,
+                    "transactionHash": bytes.fromhex(row["transactionHash"]),
+                    "blockNumber": 21_610_000 + len(logs) // 4,
+                    "logIndex": len(logs) % 4,
+                })
+    return logs
+
+
+def scale(logs, size):
+    """复制样本直到达到目标数量."""
+    repeated = []
+    while len(repeated) < size:
+        repeated.extend(logs[:size - len(repeated)])
+    return repeated
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Swap decode micro-benchmark")
+    parser.add_argument("--size", type=int, default=100000, help="每个 DEX 的日志数量")
+    args = parser.parse_args()
+
+    for dex in DEX_ADAPTERS:
+        fixtures = load_fixture_logs(dex)
+        if not fixtures:
+            continue
+        logs = scale(fixtures, args.size)
+        block_timestamps = {log["blockNumber"]: 1736697600 + log["blockNumber"] % 86400 for log in logs}
+        extractor = DEXLogExtractor("http://127.0.0.1:8545", dex, None, None, None, False)
+
+        legacy, legacy_seconds = timed(extractor.decode_logs_legacy, logs, block_timestamps)
+        batch, batch_seconds = timed(extractor.decode_logs, logs, block_timestamps)
+
+        # 两条路径的输出必须一致
+        expected = [[str(value) for value in row.values()] for row in legacy]
+        actual = batch.astype(str).values.tolist()
+        status = "OK" if expected == actual else "MISMATCH"
+        print(
+            f"{dex:<16} logs={len(logs):>8}  legacy={legacy_seconds:8.3f}s ({len(logs) / legacy_seconds:>10.0f} logs/s)  "
+            f"batch={batch_seconds:8.3f}s ({len(logs) / batch_seconds:>10.0f} logs/s)  "
+            f"speedup={legacy_seconds / batch_seconds:6.1f}x  {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
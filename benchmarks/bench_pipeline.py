@@ -0,0 +1,340 @@
+"""
+离线端到端基准：在本地模拟 JSON-RPC 节点（见 mock_node）上依次运行
+池地址查询（逐对 eth_call 与工厂事件注册表两种方式） -> 区块搜索 -> 日志拉取 -> 时间戳补全 -> 解码 -> Calculator 聚合，
+报告每个阶段的耗时、吞吐量、客户端 RPC 调用数与服务端 HTTP 请求数，不联网、不消耗节点额度
+
+用法（在项目根目录下）：
+    # 以 RESULT/ 中的 swap 记录为模板，INPUT/ 中的工厂与交易对
+    python -m modules.ETH_fetch.benchmarks.bench_pipeline --size 1000000
+    # 合成数据：50 个交易对、每个请求 20ms 延迟、每秒 500 次调用
+    python -m modules.ETH_fetch.benchmarks.bench_pipeline --source synthetic --pairs 50 --latency 20 --rate-limit 500
+    # 额外运行完整的 ETHfetch.eth_fetch，结果写入 JSON 便于比较
+    python -m modules.ETH_fetch.benchmarks.bench_pipeline --stages all --json bench.json
+    # 3 个节点，每个每秒 200 次调用、超出返回 429，其中一个额外慢 200ms（检验多节点调度、重试与对冲）
+    python -m modules.ETH_fetch.benchmarks.bench_pipeline --endpoints 3 --rate-limit 200 --reject --slow 200
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+import pandas as pd
+from web3 import Web3
+from ..config import CONFIG
+from ..BlockIndex import BlockIndex
+from ..Calculator import Calculator
+from ..LogFetcher import LogFetcher
+from ..MetadataRegistry import MetadataRegistry
+from ..PoolDiscovery import PoolDiscovery
+from ..PoolRegistry import PoolRegistry
+from ..RPCClient import RPCClient
+from ..RPCScheduler import endpoint_configs, create_scheduler
+from ..SwapDecoder import decode_swaps
+from .mock_node import MockChain, MockNode
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["discovery", "registry", "block_search", "fetch", "timestamps", "decode", "aggregate"]
+QUOTE_TOKEN = ("0xdAC17F958D2ee523a2206206994597C13D831ec7", "USDT")
+
+
+def synthetic_pairs(count):
+    """count 个 (USDT, TKNk) 交易对，代币地址由名称确定性生成."""
+    rows = []
+    for k in range(count):
+        address = Web3.to_checksum_address("0x" + Web3.to_hex(Web3.keccak(text=f"token-{k}"))[-40:])
+        rows.append({"tokenA": QUOTE_TOKEN[0], "tokenB": address, "tokenAname": QUOTE_TOKEN[1], "tokenBname": f"TKN{k}"})
+    return pd.DataFrame(rows)
+
+
+class StageRecorder:
+    def __init__(self, rpc, nodes):
+        """
+        记录每个阶段的耗时、处理量以及该阶段内新增的客户端调用数与服务端请求数
+        :param rpc: 被测组件共用的 RPCClient
+        :param nodes: MockNode 列表，服务端请求数为所有节点之和
+        """
+        self.rpc = rpc
+        self.nodes = nodes
+        self.results = []
+
+    def run(self, name, func, *args, rpc=None):
+        """
+        执行一个阶段
+        :param func: 返回 (阶段结果, 处理量) 的函数
+        :param rpc: 该阶段使用的 RPCClient，默认为共用的客户端
+        :return: 阶段结果
+        """
+        rpc = rpc or self.rpc
+        calls_before = Counter(rpc.call_counts)
+        node_before = self.stats()
+        start = time.perf_counter()
+        result, items = func(*args)
+        seconds = time.perf_counter() - start
+        node_after = self.stats()
+        calls = Counter(rpc.call_counts)
+        calls.subtract(calls_before)
+        self.results.append({
+            "stage": name,
+            "seconds": seconds,
+            "items": items,
+            "items_per_second": items / seconds if seconds > 0 else 0.0,
+            "rpc_calls": {method: count for method, count in calls.items() if count},
+            "http_requests": node_after["http_requests"] - node_before["http_requests"],
+            "rejected": node_after["rejected"] - node_before["rejected"],
+        })
+        self.print(self.results[-1])
+        return result
+
+    def stats(self):
+        totals = Counter()
+        for node in self.nodes:
+            totals.update(node.stats())
+        return totals
+
+    @staticmethod
+    def print(entry):
+        calls = entry["rpc_calls"]
+        detail = ", ".join(f"{method}={count}" for method, count in sorted(calls.items(), key=lambda item: -item[1]))
+        print(
+            f"{entry['stage']:<13} {entry['seconds']:8.3f}s  items={entry['items']:>9} "
+            f"({entry['items_per_second']:>11.0f}/s)  rpc={sum(calls.values()):>6}  http={entry['http_requests']:>6}"
+            + (f"  rejected={entry['rejected']}" if entry["rejected"] else "")
+            + (f"  [{detail}]" if detail else "")
+        )
+
+
+def run_discovery(rpc, factory_df, pair_df):
+    discovery = PoolDiscovery(
+        rpc, factory_df, pair_df,
+        batch_size=CONFIG["discovery_batch_size"],
+        max_workers=CONFIG["discovery_max_workers"],
+        enable_logging=False
+    )
+    results_df, success_count, failure_count = discovery.resolve()
+    return results_df, success_count + failure_count
+
+
+def run_registry(rpc, factory_df, pair_df):
+    """从工厂的池创建事件建立注册表，再在本地查询所有交易对（不按交易对发起 RPC）."""
+    log_fetcher = LogFetcher(
+        rpc,
+        chunk_size=CONFIG["log_chunk_size"],
+        max_chunk_size=CONFIG["log_max_chunk_size"],
+        grow_threshold=CONFIG["log_grow_threshold"],
+        max_workers=CONFIG["log_max_workers"],
+        enable_logging=False
+    )
+    registry = PoolRegistry(
+        rpc, log_fetcher, CONFIG["pool_registry_path"],
+        start_block=CONFIG["pool_registry_start_block"],
+        confirmations=CONFIG["sync_confirmations"],
+        enable_logging=False
+    )
+    registry.update(factory_df)
+    results_df, success_count, failure_count = registry.resolve(factory_df, pair_df)
+    return results_df, success_count + failure_count
+
+
+def run_block_search(block_index, start_time, end_time):
+    blocks = (block_index.datetime_to_block(start_time), block_index.datetime_to_block(end_time))
+    return blocks, 2
+
+
+def run_fetch(rpc, pools, start_block, end_block):
+    log_fetcher = LogFetcher(
+        rpc,
+        chunk_size=CONFIG["log_chunk_size"],
+        max_chunk_size=CONFIG["log_max_chunk_size"],
+        grow_threshold=CONFIG["log_grow_threshold"],
+        max_workers=CONFIG["log_max_workers"],
+        enable_logging=False
+    )
+    routed = log_fetcher.fetch_by_address({pool["address"]: pool["topic"] for pool in pools}, start_block, end_block)
+    return routed, sum(len(logs) for logs in routed.values())
+
+
+def run_timestamps(block_index, routed):
+    block_timestamps = block_index.get_timestamps(log["blockNumber"] for logs in routed.values() for log in logs)
+    return block_timestamps, len(block_timestamps)
+
+
+def run_decode(pools, routed, block_timestamps):
+    decoded = {}
+    for pool in pools:
+        decoded[pool["address"]], _ = decode_swaps(pool["dex"], routed[pool["address"].lower()], block_timestamps)
+    return decoded, sum(len(df) for df in decoded.values())
+
+
+def run_aggregate(rpc, chain, pools, decoded, intervals):
+    metadata = MetadataRegistry(rpc, CONFIG["metadata_path"], enable_logging=False)
+    metadata.ensure(pool["address"] for pool in pools)
+    swaps = 0
+    for pool in pools:
+        df = decoded[pool["address"]]
+        if df.empty:
+            continue
+        symbol0 = chain.tokens[pool["token0"].lower()]["symbol"]
+        symbol1 = chain.tokens[pool["token1"].lower()]["symbol"]
+        calculator = Calculator(
+            None, pool["address"], pool["token0"], symbol0, pool["token1"], symbol1, pool["dex"],
+            intervals, False, rpc_client=rpc, metadata_registry=metadata
+        )
+        partials = calculator.process_data(df)
+        for interval in calculator.intervals:
+            calculator.to_candles(calculator.rollup(partials, interval), interval)
+        swaps += len(df)
+    return None, swaps
+
+
+def make_eth_fetch(work_dir, factory_df, pair_df, start_time, end_time, intervals):
+    """
+    完整流程的 ETHfetch：输入文件写入临时目录，从空的检查点、索引、元数据与 RPC 缓存开始；
+    运行报告也写入临时目录，不覆盖 RESULT/ 中正式运行的缓存与报告
+    """
+    from ..ETHFetch import ETHfetch
+    output_path = os.path.join(work_dir, "eth_fetch")
+    os.makedirs(output_path, exist_ok=True)
+    CONFIG["input_csv1"] = os.path.join(work_dir, "factory.csv")
+    CONFIG["input_csv2"] = os.path.join(work_dir, "pair.csv")
+    factory_df.to_csv(CONFIG["input_csv1"], index=False)
+    pair_df.to_csv(CONFIG["input_csv2"], index=False)
+    CONFIG.update({
+        "output_path": output_path,
+        "block_index_path": os.path.join(output_path, "block_index.json"),
+        "checkpoint_path": os.path.join(output_path, "checkpoints.json"),
+        "metadata_path": os.path.join(output_path, "metadata.json"),
+        "pool_registry_path": os.path.join(output_path, "pool_registry.json"),
+        "rpc_cache_dir": os.path.join(work_dir, "rpc_cache"),
+        "metrics_path": os.path.join(work_dir, "run_report.json") if CONFIG["metrics_path"] else None,
+        "prometheus_path": os.path.join(work_dir, "metrics.prom") if CONFIG["prometheus_path"] else None,
+        "refresh_pools": True,
+    })
+    return ETHfetch(start_time, end_time, intervals)
+
+
+def run_eth_fetch(analyzer, total_logs):
+    analyzer.eth_fetch()
+    return None, total_logs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against a local mock JSON-RPC node")
+    parser.add_argument("--source", choices=["result", "synthetic"], default="result",
+                        help="swap 模板来源：RESULT/ 中的记录或随机生成")
+    parser.add_argument("--size", type=int, default=100000, help="链上 Swap 日志总数")
+    parser.add_argument("--pairs", type=int, default=10, help="synthetic 模式下的交易对数量")
+    parser.add_argument("--logs-per-block", type=int, default=4, help="每个区块的日志数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个 HTTP 请求的延迟（毫秒）")
+    parser.add_argument("--rate-limit", type=float, default=0, help="节点每秒允许的调用数，0 表示不限制")
+    parser.add_argument("--reject", action="store_true", help="超出速率时返回 429，默认排队等待")
+    parser.add_argument("--endpoints", type=int, default=1, help="模拟节点数，请求经 RPCScheduler 分发")
+    parser.add_argument("--slow", type=float, default=0.0, help="第一个节点额外的延迟（毫秒）")
+    parser.add_argument("--max-logs", type=int, default=10000, help="单次 get_logs 的结果数上限")
+    parser.add_argument("--interval", nargs="+", default=["5min", "1h"], help="K 线粒度")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES + ["eth_fetch", "all"],
+                        help="要运行的阶段（按流水线顺序，后面的阶段依赖前面的结果）；all 额外运行完整的 eth_fetch")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic 模式的随机种子")
+    parser.add_argument("--json", help="把各阶段结果写入该 JSON 文件")
+    args = parser.parse_args()
+    stages = STAGES + ["eth_fetch"] if "all" in args.stages else args.stages
+
+    factory_df = pd.read_csv(os.path.join(PROJECT_DIR, "INPUT", "factory.csv"))
+    if args.source == "synthetic":
+        pair_df = synthetic_pairs(args.pairs)
+    else:
+        pair_df = pd.read_csv(os.path.join(PROJECT_DIR, "INPUT", "pair.csv"))
+
+    chain = MockChain()
+    chain.register_discovery(factory_df, pair_df)
+    chain.generate_logs(args.size, args.logs_per_block, args.source, args.seed)
+    pools = [pool for pool in chain.pools if pool["dex"] in chain.templates]
+    first_block, last_block = int(chain.blocks[0]), int(chain.blocks[-1])
+    # 时间窗口覆盖全部日志；naive datetime 与 BlockIndex 的 .timestamp() 一致按本地时区解释
+    start_time = datetime.fromtimestamp(chain.timestamp(first_block))
+    end_time = datetime.fromtimestamp(chain.timestamp(last_block + 1))
+    print(f"[BENCH] {len(pools)} pools, {args.size} logs in blocks {first_block}-{last_block}, head {chain.head}")
+
+    work_dir = tempfile.mkdtemp(prefix="eth_fetch_bench_")
+    nodes = [
+        MockNode(
+            chain,
+            latency=(args.latency + (args.slow if i == 0 else 0.0)) / 1000,
+            rate_limit=args.rate_limit,
+            reject_over_limit=args.reject,
+            max_logs=args.max_logs
+        )
+        for i in range(max(1, args.endpoints))
+    ]
+    saved_config = dict(CONFIG)
+    try:
+        for node in nodes:
+            node.start()
+        CONFIG.update({
+            "rpc_url": nodes[0].url,
+            "rpc_endpoints": [node.url for node in nodes],
+            "enable_logging": False,
+            "output_path": work_dir,
+            "block_index_path": os.path.join(work_dir, "block_index.json"),
+            "checkpoint_path": os.path.join(work_dir, "checkpoints.json"),
+            "metadata_path": os.path.join(work_dir, "metadata.json"),
+            "pool_registry_path": os.path.join(work_dir, "pool_registry.json"),
+        })
+        scheduler = create_scheduler(
+            endpoint_configs(CONFIG["rpc_endpoints"], CONFIG["rpc_url"]),
+            pool_size=CONFIG["rpc_pool_size"],
+            backoff=CONFIG["rpc_backoff"],
+            timeout=CONFIG["rpc_timeout"],
+            max_retries=CONFIG["rpc_max_retries"],
+            hedge_methods=CONFIG["rpc_hedge_methods"],
+            hedge_delay=CONFIG["rpc_hedge_delay"],
+            enable_logging=False
+        )
+        rpc = RPCClient(CONFIG["rpc_url"], pool_size=CONFIG["rpc_pool_size"], enable_logging=False, scheduler=scheduler)
+        recorder = StageRecorder(rpc, nodes)
+        block_index = BlockIndex(
+            rpc,
+            CONFIG["block_index_path"],
+            False,
+            batch_size=CONFIG["block_batch_size"],
+            max_workers=CONFIG["block_max_workers"],
+            cache_size=CONFIG["block_cache_size"]
+        )
+
+        if "discovery" in stages:
+            recorder.run("discovery", run_discovery, rpc, factory_df, pair_df)
+        if "registry" in stages:
+            recorder.run("registry", run_registry, rpc, factory_df, pair_df)
+        if "block_search" in stages or "fetch" in stages:
+            start_block, end_block = recorder.run("block_search", run_block_search, block_index, start_time, end_time)
+        if "fetch" in stages:
+            routed = recorder.run("fetch", run_fetch, rpc, pools, start_block, end_block)
+            if "timestamps" in stages or "decode" in stages:
+                block_timestamps = recorder.run("timestamps", run_timestamps, block_index, routed)
+            if "decode" in stages:
+                decoded = recorder.run("decode", run_decode, pools, routed, block_timestamps)
+                if "aggregate" in stages:
+                    recorder.run("aggregate", run_aggregate, rpc, chain, pools, decoded, args.interval)
+        if "eth_fetch" in stages:
+            analyzer = make_eth_fetch(work_dir, factory_df, pair_df, start_time, end_time, args.interval)
+            recorder.run("eth_fetch", run_eth_fetch, analyzer, args.size, rpc=analyzer.rpc)
+    finally:
+        CONFIG.clear()
+        CONFIG.update(saved_config)
+        for node in nodes:
+            node.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if len(nodes) > 1:
+        print(f"[BENCH] Endpoints: {scheduler.format_status()}")
+    if args.json:
+        report = {"args": vars(args), "pools": len(pools), "stages": recorder.results}
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+K 线查询基准：在临时目录中生成 --years 年、--pools 个池的合成 K 线文件，比较每次查询都 pd.read_csv 全文件再过滤
+与 CandleQuery（排序时间索引 + LRU 缓存）的首次加载、区间查询、按池区间查询与时点查询的延迟
+
+用法（在项目根目录下）：
+    python -m modules.ETH_fetch.benchmarks.bench_query --years 3 --pools 3 --queries 1000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from ..Calculator import interval_seconds
+from ..CandleQuery import CandleQuery
+from ..Fingerprint import EMPTY
+
+
+def synthetic_candles(path, years, pools, interval, seed=0):
+    """按 (starttime, pool_address) 排序写出与 Calculator 输出结构相同的 K 线文件."""
+    rng = np.random.default_rng(seed)
+    step = interval_seconds(interval)
+    start = pd.Timestamp("2022-01-01").value // 10 ** 9
+    starts = np.repeat(np.arange(start, start + int(years * 365 * 86400), step, dtype=np.int64), pools)
+    addresses = [f"0x{i + 1:040x}" for i in range(pools)]
+    df = pd.DataFrame({
+        "transactionHashHash": EMPTY,
+        "volume0": rng.random(len(starts)) * 1e6,
+        "volume1": rng.random(len(starts)) * 1e3,
+        "symbol0": "USDT",
+        "symbol1": "WETH",
+        "pool_address": np.tile(addresses, len(starts) // pools),
+        "starttime": pd.to_datetime(starts, unit="s"),
+    })
+    df["endtime"] = df["starttime"] + pd.to_timedelta(step, unit="s")
+    df.to_csv(path, index=False)
+    return starts[0], starts[-1] + step, addresses
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return f"p50={np.percentile(values, 50):8.3f}ms  p95={np.percentile(values, 95):8.3f}ms  max={values.max():8.3f}ms"
+
+
+def timed_queries(function, arguments):
+    samples = []
+    for args in arguments:
+        started = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Candle query benchmark")
+    parser.add_argument("--years", type=float, default=3, help="K 线覆盖的年数")
+    parser.add_argument("--pools", type=int, default=3, help="写入同一文件的池数量")
+    parser.add_argument("--interval", default="5min", help="分组间隔")
+    parser.add_argument("--queries", type=int, default=1000, help="每种查询的次数")
+    parser.add_argument("--span", type=float, default=24, help="区间查询的长度（小时）")
+    parser.add_argument("--baseline", type=int, default=5, help="全文件读取基线的查询次数")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench_query_")
+    try:
+        path = f"{output_dir}/USDT-WETH-{args.interval}.csv"
+        first, last, addresses = synthetic_candles(path, args.years, args.pools, args.interval)
+        rng = np.random.default_rng(1)
+        span = int(args.span * 3600)
+        starts = rng.integers(first, last - span, size=args.queries)
+        ranges = [(pd.Timestamp(t, unit="s"), pd.Timestamp(t + span, unit="s")) for t in starts]
+        print(f"rows={(last - first) // interval_seconds(args.interval) * args.pools}  file={path}")
+
+        def full_scan(start_time, end_time):
+            df = pd.read_csv(path, dtype={"transactionHashHash": str}, parse_dates=["starttime", "endtime"])
+            return df[(df["starttime"] >= start_time) & (df["starttime"] < end_time)]
+
+        print(f"read_csv + filter   {percentiles(timed_queries(full_scan, ranges[:args.baseline]))}")
+
+        query = CandleQuery(output_dir, enable_logging=False)
+        started = time.perf_counter()
+        query.candles("USDT", "WETH", args.interval, *ranges[0])
+        print(f"first query (load)  {(time.perf_counter() - started) * 1000:8.1f}ms")
+
+        candles = lambda start_time, end_time: query.candles("USDT", "WETH", args.interval, start_time, end_time)
+        print(f"range               {percentiles(timed_queries(candles, ranges))}")
+        print(f"range (cached)      {percentiles(timed_queries(candles, ranges))}")
+        pool_candles = lambda start_time, end_time, pool: query.candles(
+            "USDT", "WETH", args.interval, start_time, end_time, pool
+        )
+        pool_ranges = [(s, e, addresses[i % len(addresses)]) for i, (s, e) in enumerate(ranges)]
+        print(f"range by pool       {percentiles(timed_queries(pool_candles, pool_ranges))}")
+        candle_at = lambda moment: query.candle_at("USDT", "WETH", args.interval, moment)
+        print(f"point in time       {percentiles(timed_queries(candle_at, [(s,) for s, _ in ranges]))}")
+        print(f"cache bytes={query.cache.total_bytes}  entries={len(query.cache.entries)}  hits={query.cache.hits}  misses={query.cache.misses}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
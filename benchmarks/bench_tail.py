@@ -0,0 +1,179 @@
+"""
+实时跟踪基准：模拟节点（见 mock_node）每 --block-time 秒产出一个新区块，并以 --reorg-rate 的概率替换最近的
+1 ~ --reorg-depth 个区块；ETHfetch.tail 先同步历史，再跟随链头。报告新区块产出到计入内存 K 线的延迟、
+检测到的重组与回滚的区块数，并核对未确认区块中的 swap 与模拟链的规范链是否一致
+
+用法（在项目根目录下）：
+    python -m modules.ETH_fetch.benchmarks.bench_tail --blocks 200 --block-time 0.2 --reorg-rate 0.1
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from ..config import CONFIG
+from ..LiveTail import PollingHeadSource, parse_header
+from .bench_pipeline import PROJECT_DIR, make_eth_fetch, synthetic_pairs
+from .mock_node import MockChain, MockNode
+
+
+class ChainDriver:
+    def __init__(self, chain, block_time, logs_per_block, reorg_rate, reorg_depth, seed=0):
+        """
+        后台线程：按出块间隔推进模拟链，随机制造重组，记录每个区块（包括重组后的替换区块）产出的时间
+        """
+        self.chain = chain
+        self.block_time = block_time
+        self.logs_per_block = logs_per_block
+        self.reorg_rate = reorg_rate
+        self.reorg_depth = max(1, reorg_depth)
+        self.rng = np.random.default_rng(seed)
+        self.produced = {}  # 区块号 -> 产出时间（perf_counter）
+        self.reorgs = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def run(self):
+        while not self._stopped.wait(self.block_time):
+            self.chain.extend(1, self.logs_per_block)
+            now = time.perf_counter()
+            self.produced[self.chain.head] = now
+            if self.rng.random() < self.reorg_rate:
+                depth = int(self.rng.integers(1, self.reorg_depth + 1))
+                first = self.chain.reorg(depth, seed=int(self.rng.integers(1 << 31)))
+                self.reorgs += 1
+                for block_number in range(first, self.chain.head + 1):
+                    self.produced[block_number] = now
+
+
+def check_unconfirmed(chain, tail):
+    """未确认区块中每个池的 swap 数与模拟链的规范链一致."""
+    if tail.cursor <= tail.finalized:
+        return True
+    with chain.lock:
+        indices = chain.select_logs({
+            "fromBlock": hex(tail.finalized + 1),
+            "toBlock": hex(tail.cursor),
+            "address": list(tail.pools),
+        })
+        expected = pd.Series([chain.pools[chain.log_pools[i]]["address"].lower() for i in indices]).value_counts()
+    for address, blocks in tail.unconfirmed.items():
+        if sum(len(df) for df in blocks.values()) != expected.get(address, 0):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live-tail benchmark against a local mock JSON-RPC node with reorgs")
+    parser.add_argument("--source", choices=["result", "synthetic"], default="synthetic",
+                        help="swap 模板来源：RESULT/ 中的记录或随机生成")
+    parser.add_argument("--pairs", type=int, default=5, help="synthetic 模式下的交易对数量")
+    parser.add_argument("--size", type=int, default=10000, help="历史 Swap 日志数")
+    parser.add_argument("--logs-per-block", type=int, default=4, help="每个区块的日志数")
+    parser.add_argument("--blocks", type=int, default=100, help="跟踪的新区块数")
+    parser.add_argument("--block-time", type=float, default=0.2, help="出块间隔（秒）")
+    parser.add_argument("--poll", type=float, default=0.02, help="轮询链头的间隔（秒）")
+    parser.add_argument("--reorg-rate", type=float, default=0.1, help="每个新区块后发生重组的概率")
+    parser.add_argument("--reorg-depth", type=int, default=3, help="重组替换的最大区块数")
+    parser.add_argument("--finality", type=int, default=6, help="tail_finality_depth")
+    parser.add_argument("--interval", nargs="+", default=["5min", "1h"], help="K 线粒度")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", help="把结果写入该 JSON 文件")
+    args = parser.parse_args()
+    if args.reorg_depth >= args.finality:
+        parser.error("--reorg-depth must be smaller than --finality")
+
+    factory_df = pd.read_csv(os.path.join(PROJECT_DIR, "INPUT", "factory.csv"))
+    if args.source == "synthetic":
+        pair_df = synthetic_pairs(args.pairs)
+    else:
+        pair_df = pd.read_csv(os.path.join(PROJECT_DIR, "INPUT", "pair.csv"))
+    chain = MockChain()
+    chain.register_discovery(factory_df, pair_df)
+    chain.generate_logs(args.size, args.logs_per_block, args.source, args.seed, head_padding=args.finality)
+    start_time = datetime.fromtimestamp(chain.timestamp(int(chain.blocks[0])))
+
+    work_dir = tempfile.mkdtemp(prefix="eth_fetch_tail_")
+    node = MockNode(chain)
+    driver = ChainDriver(chain, args.block_time, args.logs_per_block, args.reorg_rate, args.reorg_depth, args.seed)
+    latencies = []
+    state = {"seen": None}
+
+    def on_update(tail, block_number):
+        now = time.perf_counter()
+        driver.start()
+        seen = state["seen"] if state["seen"] is not None else block_number
+        for number in range(min(seen, block_number) + 1, block_number + 1):
+            if number in driver.produced:
+                latencies.append(now - driver.produced[number])
+        state["seen"] = block_number
+
+    saved_config = dict(CONFIG)
+    try:
+        node.start()
+        CONFIG.update({
+            "rpc_url": node.url,
+            "rpc_endpoints": [],
+            "enable_logging": False,
+            "sync_confirmations": args.finality,
+            "tail_finality_depth": args.finality,
+            "rpc_cache_mode": "off",
+            "metrics_path": None,
+            "prometheus_path": None,
+        })
+        analyzer = make_eth_fetch(work_dir, factory_df, pair_df, start_time, None, args.interval)
+        analyzer.tail(PollingHeadSource(analyzer.rpc, args.poll), on_update=on_update, max_blocks=args.blocks)
+        driver.stop()
+        # 停止出块后追上最终的链头再核对
+        tail = analyzer.live_tail
+        tail.follow(parse_header(analyzer.rpc.request("eth_getBlockByNumber", ["latest", False])))
+        consistent = check_unconfirmed(chain, tail)
+    finally:
+        driver.stop()
+        CONFIG.clear()
+        CONFIG.update(saved_config)
+        node.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = np.array(latencies) * 1000
+    report = {
+        "args": vars(args),
+        "pools": len(tail.pools),
+        "blocks": len(latencies),
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+            "max": float(latencies.max()) if len(latencies) else None,
+        },
+        "reorgs_simulated": driver.reorgs,
+        "reorgs_detected": tail.reorgs,
+        "blocks_rolled_back": tail.rolled_back_blocks,
+        "unconfirmed_consistent": consistent,
+    }
+    latency = report["latency_ms"]
+    print(f"[BENCH] {report['pools']} pools, {report['blocks']} blocks: latency p50={latency['p50']}ms "
+          f"p95={latency['p95']}ms max={latency['max']}ms")
+    print(f"[BENCH] Reorgs: {driver.reorgs} simulated, {tail.reorgs} detected, {tail.rolled_back_blocks} blocks "
+          f"rolled back; unconfirmed swaps {'match' if consistent else 'DO NOT match'} the canonical chain")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+交易量聚合微基准：pd.to_numeric + 浮点除法的旧路径 vs FixedPoint 的 limb 精确累加
+以 RESULT/ 中已有的 swap 记录为样本（见 bench_decode），按 5 分钟分组，
+并与 Fraction 精确计算的参考值比较误差
+
+用法（在项目根目录下）：
+    python -m modules.ETH_fetch.benchmarks.bench_volume --size 1000000
+"""
+import argparse
+import hashlib
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from ..Calculator import Calculator
+from ..DEXAdapters import DEX_ADAPTERS
+from ..MetadataRegistry import MetadataRegistry
+from ..RPCClient import RPCClient
+from ..SwapDecoder import decode_swaps
+from .bench_decode import load_fixture_logs, scale, timed
+
+POOL = "0x0000000000000000000000000000000000000001"
+TOKEN0 = "0x0000000000000000000000000000000000000002"
+TOKEN1 = "0x0000000000000000000000000000000000000003"
+DECIMALS = (18, 6)
+VOLUME_FIELDS = {
+    name: tuple([field for field, _ in fields] for fields in adapter.volume_fields)
+    for name, adapter in DEX_ADAPTERS.items()
+}
+
+
+def make_calculator(dex, interval):
+    """不联网的 Calculator：元数据直接写入内存中的 MetadataRegistry."""
+    rpc = RPCClient("http://127.0.0.1:8545", enable_logging=False)
+    registry = MetadataRegistry(rpc, "", enable_logging=False)
+    registry.pools[POOL] = {"token0": TOKEN0, "token1": TOKEN1}
+    registry.tokens[TOKEN0.lower()] = {"symbol": "T0", "decimals": DECIMALS[0]}
+    registry.tokens[TOKEN1.lower()] = {"symbol": "T1", "decimals": DECIMALS[1]}
+    return Calculator(None, POOL, TOKEN0, "T0", TOKEN1, "T1", dex, interval, False, rpc, registry)
+
+
+def legacy_volumes(dex, df, interval):
+    """旧路径：转为数值后逐行取绝对值、按 decimals 浮点缩放，再 resample 求和."""
+    df = df.set_index("timestamp")
+    volumes = []
+    for fields, decimals in zip(VOLUME_FIELDS[dex], DECIMALS):
+        total = sum(pd.to_numeric(df[name], errors="coerce").abs() for name in fields)
+        volumes.append(total / 10 ** decimals)
+    grouped = pd.DataFrame({"volume0": volumes[0], "volume1": volumes[1]}).resample(interval).agg("sum")
+    grouped["transactionHash"] = df["transactionHash"].resample(interval).agg(
+        lambda x: hashlib.sha256(''.join(x).encode()).hexdigest()
+    )
+    return grouped[grouped["transactionHash"] != hashlib.sha256(b"").hexdigest()][["volume0", "volume1"]]
+
+
+def exact_volumes(calculator, df, interval):
+    """新路径：Calculator 的 limb 精确累加."""
+    candles = calculator.to_candles(calculator.process_data(df), interval)
+    return candles.set_index("starttime")[["volume0", "volume1"]]
+
+
+def reference_volumes(dex, df, interval):
+    """参考值：Python int 精确求和，Fraction 缩放后只舍入一次."""
+    buckets = df["timestamp"].dt.floor(interval)
+    reference = {}
+    for bucket, rows in df.groupby(buckets):
+        reference[bucket] = [
+            float(Fraction(sum(abs(int(value)) for name in fields for value in rows[name]), 10 ** decimals))
+            for fields, decimals in zip(VOLUME_FIELDS[dex], DECIMALS)
+        ]
+    return pd.DataFrame.from_dict(reference, orient="index", columns=["volume0", "volume1"])
+
+
+def max_ulps(actual, expected):
+    """两组 float64 之间的最大 ULP 距离."""
+    a = actual.to_numpy(dtype=float).view(np.int64)
+    b = expected.to_numpy(dtype=float).view(np.int64)
+    return int(np.abs(a - b).max()) if len(a) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Volume aggregation micro-benchmark")
+    parser.add_argument("--size", type=int, default=1000000, help="每个 DEX 的 swap 数量")
+    parser.add_argument("--interval", default="5min", help="分组间隔")
+    args = parser.parse_args()
+
+    for dex in VOLUME_FIELDS:
+        fixtures = load_fixture_logs(dex)
+        if not fixtures:
+            continue
+        logs = scale(fixtures, args.size)
+        # 约 50 笔 swap 一个区块、12 秒一个区块
+        for i, log in enumerate(logs):
+            log["blockNumber"] = 21_610_000 + i // 50
+        block_timestamps = {log["blockNumber"]: 1736697600 + (log["blockNumber"] - 21_610_000) * 12 for log in logs}
+        df, _ = decode_swaps(dex, logs, block_timestamps)
+        calculator = make_calculator(dex, args.interval)
+
+        legacy, legacy_seconds = timed(legacy_volumes, dex, df, args.interval)
+        exact, exact_seconds = timed(exact_volumes, calculator, df, args.interval)
+        reference = reference_volumes(dex, df, args.interval)
+        exact = exact.loc[reference.index]
+        legacy = legacy.loc[reference.index]
+        print(
+            f"{dex:<16} swaps={len(df):>8}  legacy={legacy_seconds:7.3f}s (max error {max_ulps(legacy, reference)} ulp)  "
+            f"exact={exact_seconds:7.3f}s (max error {max_ulps(exact, reference)} ulp)  "
+            f"speedup={legacy_seconds / exact_seconds:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+"""
+本地模拟 JSON-RPC 节点：在内存中保存一条合成链（区块时间戳、池、代币、Swap 日志），
+通过 HTTP 提供 eth_blockNumber / eth_getBlockByNumber / eth_getLogs / eth_call，支持 batch 请求
+工厂查询登记的每个池同时生成一条 PoolCreated / PairCreated 事件，供 PoolRegistry 扫描
+extend / reorg 在运行中推进链头、替换最近的区块，用于测试 LiveTail 的实时跟踪与重组回滚
+日志以 numpy 数组保存（区块号、池、模板下标），数百万条日志也只占少量内存，JSON 在请求时才生成
+可配置每个 HTTP 请求的延迟、速率上限（排队或返回 429）以及 get_logs 的结果数上限
+
+用法见 bench_pipeline
+"""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from eth_abi import encode
+from web3 import Web3
+from ..DEXAdapters import CREATION_TOPICS, DEX_ADAPTERS, FACTORY_SELECTORS
+from ..MetadataRegistry import SELECTORS
+from ..PoolDiscovery import PoolDiscovery
+from .bench_decode import load_fixture_logs
+
+GENESIS_BLOCK = 21_610_000
+GENESIS_TIMESTAMP = 1736697600
+BLOCK_TIME = 12
+CHAIN_ID = 31337  # 本地开发链常用的链 ID
+ZERO_WORD = "0x" + "00" * 32
+# 没有元数据来源时使用的 decimals，其余代币默认为 18
+KNOWN_DECIMALS = {"USDT": 6, "USDC": 6, "WBTC": 8}
+BLOCK_TAGS = ("latest", "pending", "safe", "finalized")
+
+
+def fixture_templates(dex):
+    """RESULT/ 中已有 swap 记录的 (data, topic1, topic2) 模板."""
+    templates = []
+    for log in load_fixture_logs(dex):
+        topics = ["0x" + topic.hex() for topic in log["topics"]]
+        templates.append(("0x" + log["data"].hex(), topics[1], topics[2]))
+    return templates
+
+
+def synthetic_templates(dex, count, seed=0):
+    """随机生成 count 个符合 ABI 布局的 swap 模板（金额覆盖超出 int64 的大值）."""
+    rng = np.random.default_rng(seed)
+    adapter = DEX_ADAPTERS[dex]
+    layout = adapter.data_layout
+    templates = []
+    for _ in range(count):
+        values = []
+        for name, abi_type in layout:
+            magnitude = int(rng.integers(1, 10 ** 6)) * 10 ** int(rng.integers(0, 20))
+            if abi_type == "int256":
+                values.append(magnitude if rng.random() < 0.5 else -magnitude)
+            elif abi_type == "int24":
+                values.append(int(rng.integers(-887272, 887273)))
+            elif abi_type == "uint160":
+                values.append(int(rng.integers(1, 2 ** 62)) << 96)
+            else:
+                values.append(magnitude)
+        if adapter.factory_function == "getPair":
+            # 一侧输入、另一侧输出：amount0In/amount1Out 或 amount1In/amount0Out
+            zeroed = (1, 2) if rng.random() < 0.5 else (0, 3)
+            for position in zeroed:
+                values[position] = 0
+        data = encode([abi_type for _, abi_type in layout], values)
+        topics = ["0x" + rng.bytes(20).hex().rjust(64, "0") if adapter.topic_fields else ZERO_WORD for _ in range(2)]
+        templates.append(("0x" + data.hex(), topics[0], topics[1]))
+    return templates
+
+
+class MockChain:
+    def __init__(self, genesis_block=GENESIS_BLOCK, genesis_timestamp=GENESIS_TIMESTAMP, block_time=BLOCK_TIME,
+                 chain_id=CHAIN_ID):
+        """
+        内存中的合成链：区块时间戳由区块号直接算出，池、代币与工厂查询结果登记在字典中
+        :param genesis_block: 第一个带日志的区块
+        :param genesis_timestamp: genesis_block 的时间戳
+        :param block_time: 平均出块间隔（秒），每个区块另加 0 ~ block_time-1 秒的确定性抖动
+        :param chain_id: eth_chainId 返回的链 ID；与主网不同，合成数据不会与主网的 RPC 缓存条目混用
+        """
+        self.chain_id = chain_id
+        self.genesis_block = genesis_block
+        self.genesis_timestamp = genesis_timestamp
+        self.block_time = block_time
+        self.head = genesis_block
+        self.forks = {}  # 区块号 -> 分叉编号，reorg 替换的区块哈希随之改变
+        self.fork = 0
+        self.lock = threading.Lock()  # extend / reorg 与请求处理互斥
+        self.tokens = {}  # 代币地址（小写） -> {"symbol", "decimals"}
+        self.pools = []  # {"address", "dex", "topic", "token0", "token1"}
+        self.pool_index = {}  # 池地址（小写） -> self.pools 下标
+        self.factory_calls = {}  # (工厂地址（小写）, calldata) -> 池地址
+        self.creation_logs = []  # 工厂的池创建事件（已格式化），位于 genesis_block 之前
+        self.templates = {}  # dex -> [(data, topic1, topic2)]
+        self.blocks = np.zeros(0, dtype=np.int64)  # 每条日志的区块号，升序
+        self.log_pools = np.zeros(0, dtype=np.int32)  # 每条日志所属池的下标
+        self.log_templates = np.zeros(0, dtype=np.int32)  # 每条日志使用的模板下标
+        self.log_indices = np.zeros(0, dtype=np.int32)  # 日志在区块内的序号
+
+    def timestamp(self, block_number):
+        """区块时间戳：严格递增，间隔在 1 ~ 2*block_time-1 秒之间."""
+        offset = block_number - self.genesis_block
+        return self.genesis_timestamp + offset * self.block_time + (block_number * 2654435761) % self.block_time
+
+    def add_token(self, address, symbol, decimals):
+        self.tokens[address.lower()] = {"symbol": symbol, "decimals": int(decimals)}
+
+    def add_pool(self, dex, address, tokenA, tokenB, factory_call=None):
+        """
+        登记一个池；token0/token1 与 Uniswap 一致按地址排序
+        :param factory_call: 可选的 {"to", "data"}，该工厂查询返回此池地址
+        :return: 池下标
+        """
+        token0, token1 = sorted([Web3.to_checksum_address(tokenA), Web3.to_checksum_address(tokenB)], key=str.lower)
+        self.pool_index[address.lower()] = len(self.pools)
+        self.pools.append({
+            "address": Web3.to_checksum_address(address),
+            "dex": dex,
+            "topic": DEX_ADAPTERS[dex].swap_topic if dex in DEX_ADAPTERS else None,
+            "token0": token0,
+            "token1": token1,
+        })
+        if factory_call is not None:
+            self.factory_calls[(factory_call["to"].lower(), factory_call["data"].lower())] = address
+            self.add_creation_log(factory_call, address, token0, token1)
+        return len(self.pools) - 1
+
+    def add_creation_log(self, factory_call, address, token0, token1):
+        """按工厂查询的选择器生成 PoolCreated（getPool，fee 取自 calldata）或 PairCreated（getPair）事件."""
+        calldata = bytes.fromhex(factory_call["data"][2:])
+        kind = next((name for name, selector in FACTORY_SELECTORS.items() if calldata[:4] == bytes(selector)), None)
+        if kind is None:
+            return
+        topics = [CREATION_TOPICS[kind], "0x" + encode(["address"], [token0]).hex(), "0x" + encode(["address"], [token1]).hex()]
+        if kind == "getPool":
+            topics.append("0x" + calldata[-32:].hex())
+            data = encode(["int24", "address"], [60, address])
+        else:
+            data = encode(["address", "uint256"], [address, len(self.creation_logs) + 1])
+        block_number = self.genesis_block - 1
+        self.creation_logs.append({
+            "address": Web3.to_checksum_address(factory_call["to"]),
+            "topics": topics,
+            "data": "0x" + data.hex(),
+            "blockNumber": hex(block_number),
+            "blockHash": self.block_hash(block_number),
+            "transactionHash": f"0x{(1 << 255) | len(self.creation_logs):064x}",
+            "transactionIndex": hex(len(self.creation_logs)),
+            "logIndex": hex(len(self.creation_logs)),
+            "removed": False,
+        })
+
+    def select_creation_logs(self, log_filter):
+        """按区块范围、地址和 topic0 选出池创建事件."""
+        from_block = self.resolve_block(log_filter.get("fromBlock"), self.head)
+        to_block = self.resolve_block(log_filter.get("toBlock"), self.head)
+        addresses = log_filter.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = None if addresses is None else {address.lower() for address in addresses}
+        topics = log_filter.get("topics") or []
+        topic0 = None
+        if topics and topics[0] is not None:
+            topic0 = {topic.lower() for topic in (topics[0] if isinstance(topics[0], list) else [topics[0]])}
+        return [
+            log for log in self.creation_logs
+            if from_block <= int(log["blockNumber"], 16) <= to_block
+            and (addresses is None or log["address"].lower() in addresses)
+            and (topic0 is None or log["topics"][0] in topic0)
+        ]
+
+    def register_discovery(self, factory_df, pair_df, symbols=None):
+        """
+        为 factory.csv × pair.csv 的每个查询生成一个确定性的池地址，并登记代币
+        :param symbols: 可选的 {代币地址（小写）: (symbol, decimals)}，默认取 pair_df 中的名称
+        :return: 登记的池数量
+        """
+        for _, row in pair_df.iterrows():
+            for address, name in ((row["tokenA"], row["tokenAname"]), (row["tokenB"], row["tokenBname"])):
+                symbol, decimals = (symbols or {}).get(address.lower(), (name, KNOWN_DECIMALS.get(name, 18)))
+                self.add_token(address, symbol, decimals)
+        jobs = PoolDiscovery(None, factory_df, pair_df, enable_logging=False).build_jobs()
+        for job in jobs:
+            call = job["call"]
+            address = "0x" + Web3.to_hex(Web3.keccak(hexstr=call["to"] + call["data"][2:]))[-40:]
+            self.add_pool(job["dex"], address, job["tokenA"], job["tokenB"], call)
+        return len(jobs)
+
+    def generate_logs(self, size, logs_per_block=4, source="result", seed=0, head_padding=100):
+        """
+        生成 size 条 Swap 日志，轮流分配给支持解码的池，每个区块 logs_per_block 条
+        :param source: "result" 复用 RESULT/ 中的记录（按需循环），"synthetic" 随机生成
+        :param head_padding: 最后一条日志之后、链头之前的空区块数
+        """
+        pools = [i for i, pool in enumerate(self.pools) if pool["dex"] in DEX_ADAPTERS]
+        if not pools:
+            raise ValueError("No pools with a supported DEX")
+        for dex in {self.pools[i]["dex"] for i in pools}:
+            templates = fixture_templates(dex) if source == "result" else []
+            self.templates[dex] = templates or synthetic_templates(dex, 1000, seed)
+
+        pools = np.array(pools, dtype=np.int32)
+        sequence = np.arange(size, dtype=np.int64)
+        self.log_pools = pools[sequence % len(pools)]
+        counts = np.array([len(self.templates.get(pool["dex"], ())) or 1 for pool in self.pools], dtype=np.int64)
+        self.log_templates = ((sequence // len(pools)) % counts[self.log_pools]).astype(np.int32)
+        self.blocks = self.genesis_block + sequence // max(1, int(logs_per_block))
+        self.log_indices = (sequence - np.searchsorted(self.blocks, self.blocks, side="left")).astype(np.int32)
+        self.head = int(self.blocks[-1] if size else self.genesis_block) + head_padding
+
+    def extend(self, blocks=1, logs_per_block=4):
+        """
+        链头前进 blocks 个区块，每个新区块追加 logs_per_block 条 Swap 日志（与 generate_logs 相同地轮流分配给各池）
+        需要先调用 generate_logs 准备模板
+        """
+        pools = np.array([i for i, pool in enumerate(self.pools) if pool["dex"] in self.templates], dtype=np.int32)
+        counts = np.array([len(self.templates.get(pool["dex"], ())) or 1 for pool in self.pools], dtype=np.int64)
+        with self.lock:
+            count = blocks * logs_per_block
+            sequence = np.arange(len(self.blocks), len(self.blocks) + count, dtype=np.int64)
+            log_pools = pools[sequence % len(pools)]
+            offsets = np.arange(count, dtype=np.int64)
+            self.log_pools = np.concatenate([self.log_pools, log_pools])
+            self.log_templates = np.concatenate([
+                self.log_templates, ((sequence // len(pools)) % counts[log_pools]).astype(np.int32)
+            ])
+            self.blocks = np.concatenate([self.blocks, self.head + 1 + offsets // max(1, logs_per_block)])
+            self.log_indices = np.concatenate([self.log_indices, (offsets % max(1, logs_per_block)).astype(np.int32)])
+            self.head += blocks
+
+    def reorg(self, depth, keep=0.5, seed=0):
+        """
+        用新分叉替换最后 depth 个区块：这些区块的哈希改变，其中的日志只保留约 keep 比例
+        :return: 被替换的第一个区块
+        """
+        rng = np.random.default_rng(seed)
+        with self.lock:
+            first = self.head - depth + 1
+            self.fork += 1
+            for block_number in range(first, self.head + 1):
+                self.forks[block_number] = self.fork
+            kept = (self.blocks < first) | (rng.random(len(self.blocks)) < keep)
+            self.blocks = self.blocks[kept]
+            self.log_pools = self.log_pools[kept]
+            self.log_templates = self.log_templates[kept]
+            self.log_indices = self.log_indices[kept]
+        return first
+
+    def block_hash(self, block_number):
+        return f"0x{(1 << 252) | (self.forks.get(block_number, 0) << 64) | block_number:064x}"
+
+    def get_block(self, tag):
+        if tag in BLOCK_TAGS:
+            block_number = self.head
+        elif tag == "earliest":
+            block_number = 0
+        else:
+            block_number = int(tag, 16)
+        if block_number > self.head:
+            return None
+        return {
+            "number": hex(block_number),
+            "hash": self.block_hash(block_number),
+            "parentHash": self.block_hash(max(block_number - 1, 0)),
+            "timestamp": hex(self.timestamp(block_number)),
+            "transactions": [],
+            "uncles": [],
+            "gasLimit": hex(30_000_000),
+            "gasUsed": "0x0",
+            "miner": "0x" + "00" * 20,
+            "extraData": "0x",
+            "logsBloom": "0x" + "00" * 256,
+        }
+
+    def resolve_block(self, tag, default):
+        if tag is None:
+            return default
+        if tag in BLOCK_TAGS:
+            return self.head
+        if tag == "earliest":
+            return 0
+        return int(tag, 16)
+
+    def select_logs(self, log_filter):
+        """
+        按区块范围、地址和 topic0 选出日志下标
+        :return: 升序的日志下标数组
+        """
+        from_block = self.resolve_block(log_filter.get("fromBlock"), self.head)
+        to_block = self.resolve_block(log_filter.get("toBlock"), self.head)
+        lo = np.searchsorted(self.blocks, from_block, side="left")
+        hi = np.searchsorted(self.blocks, to_block, side="right")
+        wanted = np.ones(len(self.pools), dtype=bool)
+
+        addresses = log_filter.get("address")
+        if addresses is not None:
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            wanted[:] = False
+            for address in addresses:
+                index = self.pool_index.get(address.lower())
+                if index is not None:
+                    wanted[index] = True
+
+        topics = log_filter.get("topics") or []
+        if topics and topics[0] is not None:
+            topic0 = topics[0] if isinstance(topics[0], list) else [topics[0]]
+            topic0 = {topic.lower() for topic in topic0}
+            wanted &= np.array([pool["topic"] in topic0 for pool in self.pools], dtype=bool)
+
+        return lo + np.flatnonzero(wanted[self.log_pools[lo:hi]])
+
+    def format_log(self, index):
+        index = int(index)
+        pool = self.pools[self.log_pools[index]]
+        data, topic1, topic2 = self.templates[pool["dex"]][self.log_templates[index]]
+        block_number = int(self.blocks[index])
+        log_index = hex(int(self.log_indices[index]))
+        return {
+            "address": pool["address"],
+            "topics": [pool["topic"], topic1, topic2],
+            "data": data,
+            "blockNumber": hex(block_number),
+            "blockHash": self.block_hash(block_number),
+            "transactionHash": f"0x{index + 1:064x}",
+            "transactionIndex": log_index,
+            "logIndex": log_index,
+            "removed": False,
+        }
+
+    def call(self, call):
+        """eth_call：工厂的 getPool/getPair、池的 token0/token1、代币的 symbol/decimals."""
+        to = call.get("to", "").lower()
+        data = (call.get("data") or call.get("input") or "0x").lower()
+        if (to, data) in self.factory_calls:
+            return "0x" + encode(["address"], [self.factory_calls[(to, data)]]).hex()
+        if data == SELECTORS["token0"] or data == SELECTORS["token1"]:
+            index = self.pool_index.get(to)
+            if index is None:
+                return "0x"
+            return "0x" + encode(["address"], [self.pools[index]["token0" if data == SELECTORS["token0"] else "token1"]]).hex()
+        if data == SELECTORS["symbol"] or data == SELECTORS["decimals"]:
+            token = self.tokens.get(to)
+            if token is None:
+                return "0x"
+            if data == SELECTORS["symbol"]:
+                return "0x" + encode(["string"], [token["symbol"]]).hex()
+            return "0x" + encode(["uint8"], [token["decimals"]]).hex()
+        # 未登记的工厂查询返回零地址（池不存在）
+        return ZERO_WORD
+
+
+class RPCError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class MockNode:
+    def __init__(self, chain, latency=0.0, rate_limit=0, reject_over_limit=False, max_logs=10000,
+                 max_block_range=0, host="127.0.0.1", port=0):
+        """
+        :param chain: MockChain 实例
+        :param latency: 每个 HTTP 请求的额外延迟（秒）
+        :param rate_limit: 每秒允许的 RPC 调用数（batch 中的每个调用各计一次），0 表示不限制
+        :param reject_over_limit: 超出速率时返回 HTTP 429；为 False 时排队等待
+        :param max_logs: 单次 get_logs 返回的日志数上限，超出时返回 -32005 错误
+        :param max_block_range: 单次 get_logs 的区块范围上限，0 表示不限制
+        """
+        self.chain = chain
+        self.latency = latency
+        self.rate_limit = float(rate_limit)
+        self.reject_over_limit = reject_over_limit
+        self.max_logs = max_logs
+        self.max_block_range = max_block_range
+        self.call_counts = Counter()
+        self.http_requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._next = 0.0  # 速率预算：理论上下一个调用的到达时间
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """服务端统计快照."""
+        with self._lock:
+            return {"http_requests": self.http_requests, "rejected": self.rejected, "calls": Counter(self.call_counts)}
+
+    def admit(self, count):
+        """
+        按调用数占用速率预算
+        :return: 是否放行（reject_over_limit 模式下超出预算时为 False）
+        """
+        if self.rate_limit <= 0:
+            return True
+        burst = max(self.rate_limit, 1.0)
+        with self._lock:
+            now = time.monotonic()
+            arrival = max(self._next, now) + count / self.rate_limit
+            delay = arrival - burst / self.rate_limit - now
+            if delay > 0 and self.reject_over_limit:
+                self.rejected += 1
+                return False
+            self._next = arrival
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def dispatch(self, method, params):
+        with self.chain.lock:
+            return self.dispatch_locked(method, params)
+
+    def dispatch_locked(self, method, params):
+        chain = self.chain
+        if method == "eth_blockNumber":
+            return hex(chain.head)
+        if method == "eth_getBlockByNumber":
+            return chain.get_block(params[0])
+        if method == "eth_getLogs":
+            log_filter = params[0]
+            if self.max_block_range:
+                from_block = chain.resolve_block(log_filter.get("fromBlock"), chain.head)
+                to_block = chain.resolve_block(log_filter.get("toBlock"), chain.head)
+                if to_block - from_block + 1 > self.max_block_range:
+                    raise RPCError(-32005, f"block range exceeds {self.max_block_range}")
+            creation_logs = chain.select_creation_logs(log_filter)
+            indices = chain.select_logs(log_filter)
+            if self.max_logs and len(creation_logs) + len(indices) > self.max_logs:
+                raise RPCError(-32005, f"query returned more than {self.max_logs} results")
+            return creation_logs + [chain.format_log(index) for index in indices]
+        if method == "eth_call":
+            return chain.call(params[0])
+        if method == "eth_getCode":
+            # 工厂合约在其创建事件所在的区块（genesis_block - 1）部署
+            factories = {factory for factory, _ in chain.factory_calls}
+            deployed = chain.resolve_block(params[1] if len(params) > 1 else "latest", chain.head) >= chain.genesis_block - 1
+            return "0x6080" if params[0].lower() in factories and deployed else "0x"
+        if method == "eth_chainId":
+            return hex(chain.chain_id)
+        if method == "net_version":
+            return str(chain.chain_id)
+        if method == "web3_clientVersion":
+            return "ETH_FETCH/mock-node"
+        raise RPCError(-32601, f"the method {method} does not exist/is not available")
+
+    def respond(self, request):
+        method = request.get("method")
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        with self._lock:
+            self.call_counts[method] += 1
+        try:
+            reply["result"] = self.dispatch(method, request.get("params") or [])
+        except RPCError as e:
+            reply["error"] = {"code": e.code, "message": e.message}
+        return reply
+
+    def handler_class(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body)
+                with node._lock:
+                    node.http_requests += 1
+                if node.latency:
+                    time.sleep(node.latency)
+                if not node.admit(len(payload) if isinstance(payload, list) else 1):
+                    self.send(429, {"jsonrpc": "2.0", "error": {"code": -32029, "message": "rate limited"}})
+                    return
+                if isinstance(payload, list):
+                    self.send(200, [node.respond(request) for request in payload])
+                else:
+                    self.send(200, node.respond(payload))
+
+            def send(self, status, reply):
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
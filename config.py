@@ -4,4 +4,51 @@ CONFIG = {
     "input_csv2": "modules/ETH_fetch/INPUT/pair.csv",
     "output_path": "modules/ETH_fetch/RESULT",  # 新增的配置项
     "enable_logging": False,
+    "discovery_batch_size": 100,  # 池地址查询每个 JSON-RPC batch 的 eth_call 数量
+    "discovery_max_workers": 4,  # 池地址查询同时在途的 batch 请求数上限
+    "block_index_path": "modules/ETH_fetch/RESULT/block_index.json",  # 区块号与时间戳的持久化索引
+    "block_batch_size": 100,  # 批量获取区块头时每个 JSON-RPC batch 的请求数
+    "block_max_workers": 4,  # 批量获取区块头时同时在途的 batch 数上限
+    "block_cache_size": 200000,  # 内存中 swap 所在区块时间戳的缓存条目数上限（不写入 block_index_path）
+    "log_chunk_size": 2000,  # get_logs 初始分块大小（区块数）
+    "log_max_chunk_size": 100000,  # get_logs 最大分块大小（区块数）
+    "log_grow_threshold": 2000,  # 单块返回日志数低于该值时扩大分块
+    "log_max_workers": 4,  # 同时在途的 get_logs 请求数上限
+    "log_sweep": True,  # 所有池合并为一次多地址 get_logs 扫描，再按地址分发
+    "refresh_pools": False,  # 为 False 时若池地址索引比输入文件新则直接复用
+    "pool_registry": True,  # 由工厂的池创建事件建立本地池注册表，池地址查询不再按交易对发起 eth_call
+    "pool_registry_path": "modules/ETH_fetch/RESULT/pool_registry.json",  # 本地池注册表与各工厂的扫描进度
+    "pool_registry_start_block": None,  # 新工厂从该区块开始扫描池创建事件；None 表示从工厂的部署区块开始
+    "checkpoint_path": "modules/ETH_fetch/RESULT/checkpoints.json",  # 每个池已同步到的区块
+    "sync_confirmations": 12,  # 同步到链头时保留的确认区块数，避免写入可能被重组的区块
+    "swap_store": "parquet",  # swap 存储后端："parquet"（按池按天分区，需要 pyarrow）或 "csv"
+    "swap_csv_export": False,  # parquet 模式下是否同时追加写出旧版 CSV
+    "rpc_pool_size": 20,  # 共享 RPC 客户端的 HTTP keep-alive 连接池大小
+    "metadata_path": "modules/ETH_fetch/RESULT/metadata.json",  # 池 token0/token1 与代币 symbol/decimals 的持久化缓存
+    "stream_aggregate": True,  # 解码后的分块直接进入 K 线聚合（流式），不再在同步后从磁盘重新加载
+    "stream_queue_depth": 2,  # 拉取阶段最多领先处理阶段的分块数（限制内存）
+    "candle_flush_buckets": 1000,  # 流式聚合时已结束的分组累积到该数量后写出一次
+    "pair_aggregate": True,  # 按交易对一次聚合所有池（跨 DEX），并输出合并 K 线 {symbol0}-{symbol1}-{interval}-all.csv
+    "pair_breakdown": False,  # 合并 K 线中是否输出每个 DEX 的交易量列 volume0_{dex} / volume1_{dex}
+    "query_cache_bytes": 512 * 1024 ** 2,  # CandleQuery 缓存（文件时间索引与最近查询的区间）的内存上限（字节）
+    "query_http_host": "127.0.0.1",  # CandleQuery 本地 HTTP 查询服务的监听地址
+    "query_http_port": 8600,  # CandleQuery 本地 HTTP 查询服务的端口
+    "tail_finality_depth": 12,  # 实时跟踪模式下可被重组的区块数，更早的区块才写入存储（应不大于 rpc_cache_confirmations）
+    "tail_poll_interval": 1.0,  # 实时跟踪模式轮询链头的间隔（秒）
+    "tail_ws_url": None,  # 不为空时通过该 WebSocket 订阅 newHeads（需要 websockets），否则轮询 rpc_url
+    "parallel_workers": 0,  # 跨池多进程执行的进程数，<= 1 时在当前进程中串行执行
+    "rpc_rate_limit": 0,  # 所有进程共用的 RPC 调用速率上限（次/秒），0 表示不限制
+    "rpc_endpoints": [],  # 多个 RPC 节点：URL 字符串或 {"url": ..., "rate_limit": 次/秒}，为空时只使用 rpc_url
+    "rpc_timeout": 30,  # 单个 HTTP 请求的超时时间（秒）
+    "rpc_max_retries": 5,  # 超时、429、5xx 与限流错误换节点重试的次数
+    "rpc_backoff": 0.5,  # 节点失败后的冷却时间（秒），连续失败时指数增长，上限 30 秒
+    "rpc_hedge_methods": ["eth_getBlockByNumber"],  # 多节点时对这些方法发出对冲请求，取先返回的结果
+    "rpc_hedge_delay": None,  # 主请求等待多久后发出对冲请求（秒），为 None 时取该节点平均延迟的 3 倍
+    "rpc_cache_dir": "modules/ETH_fetch/RESULT/rpc_cache",  # RPC 响应缓存目录
+    "rpc_cache_mode": "readwrite",  # "readwrite" / "record" / "replay"（严格回放，不联网）/ "off"
+    "rpc_cache_max_bytes": 2 * 1024 ** 3,  # 缓存总大小上限，超出时按最近使用时间淘汰
+    "rpc_cache_confirmations": 64,  # 距链头该区块数以内的区块、日志与 eth_call 结果不缓存
+    "metrics_path": "modules/ETH_fetch/RESULT/run_report.json",  # 每次运行的 JSON 性能报告，为空时不写出
+    "prometheus_path": "modules/ETH_fetch/RESULT/metrics.prom",  # Prometheus 文本格式的指标（可供 node_exporter textfile 采集），为空时不写出
+    "profile_dir": None,  # 不为空时以 cProfile 采集解码与聚合热点路径，写入该目录
 }
@@ -0,0 +1,66 @@
+"""
+测试以包的形式导入本目录（模块之间使用相对导入），所有测试都连接 benchmarks/mock_node 中的本地模拟节点，不联网
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 以符号链接 eth_fetch -> 本目录提供包名；sys.path 会传给 spawn 出的 worker 进程（parallel_workers）
+_import_root = tempfile.mkdtemp(prefix="eth_fetch_tests_")
+os.symlink(PACKAGE_DIR, os.path.join(_import_root, "eth_fetch"))
+sys.path.insert(0, _import_root)
+atexit.register(shutil.rmtree, _import_root, True)
+
+from eth_fetch.config import CONFIG  # noqa: E402
+from eth_fetch.benchmarks.mock_node import MockChain, MockNode  # noqa: E402
+
+
+@pytest.fixture
+def factory_df():
+    return pd.read_csv(os.path.join(PACKAGE_DIR, "INPUT", "factory.csv"))
+
+
+@pytest.fixture
+def pair_df():
+    return pd.read_csv(os.path.join(PACKAGE_DIR, "INPUT", "pair.csv"))
+
+
+@pytest.fixture
+def chain(factory_df, pair_df):
+    """登记了 INPUT 中全部 (dex, 交易对) 池、每个池 200 条 swap 的模拟链."""
+    chain = MockChain()
+    chain.register_discovery(factory_df, pair_df)
+    chain.generate_logs(2000, 4, "synthetic", 0)
+    return chain
+
+
+@pytest.fixture
+def node(chain):
+    with MockNode(chain) as node:
+        yield node
+
+
+@pytest.fixture
+def config(tmp_path, node):
+    """指向模拟节点、所有输出写入临时目录的配置，测试结束后恢复."""
+    saved = dict(CONFIG)
+    CONFIG.update({
+        "rpc_url": node.url,
+        "rpc_endpoints": [],
+        "enable_logging": False,
+        "output_path": str(tmp_path / "result"),
+        "rpc_cache_dir": str(tmp_path / "rpc_cache"),
+        "rpc_cache_mode": "off",
+        "metrics_path": None,
+        "prometheus_path": None,
+        "profile_dir": None,
+    })
+    yield CONFIG
+    CONFIG.clear()
+    CONFIG.update(saved)
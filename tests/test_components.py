@@ -0,0 +1,123 @@
+"""检查点、区块索引、RPC 缓存、元数据与 swap 存储：各组件连接模拟节点的单元测试."""
+import json
+from datetime import datetime
+import numpy as np
+import pytest
+from eth_fetch.BlockIndex import BlockIndex
+from eth_fetch.CheckpointStore import CheckpointStore
+from eth_fetch.DEXLogExtractor import DEXLogExtractor
+from eth_fetch.LogFetcher import LogFetcher
+from eth_fetch.MetadataRegistry import MetadataRegistry
+from eth_fetch.RPCCache import RPCCache
+from eth_fetch.RPCClient import RPCClient
+from eth_fetch.SwapDecoder import decode_swaps
+from eth_fetch.SwapStore import SwapStore
+from eth_fetch.benchmarks.mock_node import MockChain, MockNode
+
+
+@pytest.fixture
+def rpc(node):
+    return RPCClient(node.url, enable_logging=False)
+
+
+def pool_logs(chain, pool):
+    logs = [chain.format_log(i) for i in np.flatnonzero(chain.log_pools == chain.pool_index[pool["address"].lower()])]
+    stamps = {int(log["blockNumber"], 16): chain.timestamp(int(log["blockNumber"], 16)) for log in logs}
+    return logs, stamps
+
+
+def test_checkpoint_ranges(tmp_path):
+    path = tmp_path / "checkpoints.json"
+    store = CheckpointStore(str(path), enable_logging=False)
+    store.add("pool", 100, 199)
+    store.add("pool", 300, 399)
+    store.add("pool", 200, 249)
+    assert store.ranges("pool") == [(100, 249), (300, 399)]
+    assert store.get("pool") == 399
+    assert store.missing("pool", 50, 450) == [(50, 99), (250, 299), (400, 450)]
+    assert store.missing("pool", 120, 240) == []
+    assert CheckpointStore(str(path), enable_logging=False).ranges("pool") == [(100, 249), (300, 399)]
+
+
+def test_legacy_checkpoint_is_contiguous_from_genesis(tmp_path):
+    path = tmp_path / "checkpoints.json"
+    path.write_text(json.dumps({"pool": 500}))
+    store = CheckpointStore(str(path), enable_logging=False)
+    assert store.get("pool") == 500
+    assert store.missing("pool", 400, 600) == [(501, 600)]
+
+
+def test_block_index_persists_only_search_anchors(tmp_path, chain, rpc):
+    path = tmp_path / "block_index.json"
+    index = BlockIndex(rpc, str(path), enable_logging=False, cache_size=50)
+    blocks = range(chain.genesis_block, chain.genesis_block + 200)
+    assert index.get_timestamps(blocks) == {block: chain.timestamp(block) for block in blocks}
+    assert len(index.cache) == 50
+    target = chain.genesis_block + 120
+    assert index.datetime_to_block(datetime.fromtimestamp(chain.timestamp(target))) == target
+    index.save()
+    assert len(json.loads(path.read_text())) < 20
+
+
+def test_block_index_refreshes_a_stale_head(chain, rpc):
+    index = BlockIndex(rpc, None, enable_logging=False, head_ttl=3600)
+    future = chain.head + 10
+    target = datetime.fromtimestamp(chain.timestamp(future))
+    assert index.datetime_to_block(target) == chain.head + 1
+    chain.head += 20
+    # 链头仍在有效期内：不重新获取，也没有缓存上次"晚于链头"的结果
+    assert index.datetime_to_block(target) == future - 9
+    index.head_time -= 3600
+    assert index.datetime_to_block(target) == future
+
+
+def test_rpc_cache_is_keyed_by_chain_id(tmp_path):
+    cache_dir = str(tmp_path / "rpc_cache")
+    answers = []
+    for chain_id in (1, 31337):
+        chain = MockChain(chain_id=chain_id)
+        chain.head += 200
+        with MockNode(chain) as node:
+            cache = RPCCache(cache_dir, mode="readwrite", confirmations=12, enable_logging=False)
+            rpc = RPCClient(node.url, cache=cache, enable_logging=False)
+            rpc.request("eth_getBlockByNumber", [hex(chain.genesis_block), False])
+            answers.append(sum(rpc.cache_hits.values()))
+            rpc.request("eth_getBlockByNumber", [hex(chain.genesis_block), False])
+            answers.append(sum(rpc.cache_hits.values()))
+    # 第二条链的相同请求不会命中第一条链的缓存
+    assert answers == [0, 1, 0, 1]
+
+
+def test_metadata_ensure_accepts_a_generator(tmp_path, chain, rpc):
+    registry = MetadataRegistry(rpc, str(tmp_path / "metadata.json"), enable_logging=False)
+    registry.ensure(pool["address"] for pool in chain.pools)
+    calls = sum(rpc.call_counts.values())
+    for pool in chain.pools:
+        assert registry.is_complete(pool["address"])
+        registry.pool_metadata(pool["address"])
+    assert sum(rpc.call_counts.values()) == calls
+
+
+def test_unknown_dex_is_rejected(rpc):
+    extractor = DEXLogExtractor(
+        rpc.rpc_url, "unknown_dex", "0x" + "11" * 20, None, None, enable_logging=False, rpc_client=rpc
+    )
+    with pytest.raises(ValueError):
+        extractor.topic
+    with pytest.raises(ValueError):
+        next(LogFetcher(rpc, enable_logging=False).iter_by_address({"0x" + "11" * 20: None}, 0, 10))
+
+
+def test_swap_store_dedups_on_transaction_and_log_index(tmp_path, chain):
+    pool = chain.pools[0]
+    logs, stamps = pool_logs(chain, pool)
+    decoded, errors = decode_swaps(pool["dex"], logs, stamps)
+    assert errors == 0
+    # 同一交易中的两个 swap（不同 logIndex）都保留
+    decoded.loc[1, "transactionHash"] = decoded.loc[0, "transactionHash"]
+    store = SwapStore(str(tmp_path / "swaps"), enable_logging=False)
+    store.write(pool["dex"], "A", "B", pool["address"], decoded)
+    store.write(pool["dex"], "A", "B", pool["address"], decoded.iloc[:10])
+    other = chain.pools[1]
+    store.write(other["dex"], "A", "B", other["address"], decode_swaps(other["dex"], *pool_logs(chain, other))[0])
+    assert len(store.read(pool["dex"], "A", "B", pool_address=pool["address"])) == len(decoded)
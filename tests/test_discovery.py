@@ -0,0 +1,32 @@
+"""池地址查询：PoolDiscovery 的 batch eth_call 与工厂事件注册表都找到模拟链登记的全部池."""
+from eth_fetch.PoolDiscovery import PoolDiscovery
+from eth_fetch.PoolRegistry import PoolRegistry
+from eth_fetch.LogFetcher import LogFetcher
+from eth_fetch.RPCClient import RPCClient
+
+
+def chain_pools(chain):
+    return {(pool["dex"], pool["address"].lower()) for pool in chain.pools}
+
+
+def test_discovery_batches_all_factory_calls(node, chain, factory_df, pair_df):
+    rpc = RPCClient(node.url, enable_logging=False)
+    results, success_count, failure_count = PoolDiscovery(
+        rpc, factory_df, pair_df, batch_size=4, max_workers=2, enable_logging=False
+    ).resolve()
+    assert (success_count, failure_count) == (len(chain.pools), 0)
+    assert set(zip(results["dex"], results["pool_address"].str.lower())) == chain_pools(chain)
+    # 每个 batch 一次 HTTP 请求
+    assert rpc.call_counts["eth_call"] == len(factory_df) * len(pair_df)
+    assert node.http_requests <= -(-len(chain.pools) // 4) + 2
+
+
+def test_registry_matches_discovery(tmp_path, node, chain, factory_df, pair_df):
+    rpc = RPCClient(node.url, enable_logging=False)
+    registry = PoolRegistry(
+        rpc, LogFetcher(rpc, enable_logging=False), str(tmp_path / "pool_registry.json"), enable_logging=False
+    )
+    registry.update(factory_df)
+    results, success_count, failure_count = registry.resolve(factory_df, pair_df)
+    assert (success_count, failure_count) == (len(chain.pools), 0)
+    assert set(zip(results["dex"], results["pool_address"].str.lower())) == chain_pools(chain)
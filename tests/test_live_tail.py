@@ -0,0 +1,46 @@
+"""实时跟踪：模拟节点持续出块并制造重组，未确认的 swap 与规范链一致，已确认的写入存储."""
+from datetime import datetime
+import numpy as np
+from eth_fetch.LiveTail import PollingHeadSource, parse_header
+from eth_fetch.benchmarks.bench_pipeline import make_eth_fetch
+from eth_fetch.benchmarks.bench_tail import ChainDriver, check_unconfirmed
+from eth_fetch.benchmarks.mock_node import MockChain, MockNode
+
+FINALITY = 6
+
+
+def test_tail_follows_reorgs(tmp_path, config, factory_df, pair_df):
+    chain = MockChain()
+    chain.register_discovery(factory_df, pair_df)
+    chain.generate_logs(1000, 4, "synthetic", 0, head_padding=FINALITY)
+    config.update({"sync_confirmations": FINALITY, "tail_finality_depth": FINALITY})
+    driver = ChainDriver(chain, 0.05, 4, reorg_rate=0.5, reorg_depth=3, seed=1)
+    with MockNode(chain) as node:
+        config["rpc_url"] = node.url
+        start_time = datetime.fromtimestamp(chain.timestamp(int(chain.blocks[0])))
+        analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, None, ["5min"])
+        try:
+            analyzer.tail(PollingHeadSource(analyzer.rpc, 0.01), on_update=lambda tail, block: driver.start(), max_blocks=40)
+        finally:
+            driver.stop()
+        tail = analyzer.live_tail
+        latest = lambda: parse_header(analyzer.rpc.request("eth_getBlockByNumber", ["latest", False]))
+        tail.follow(latest())
+        # 已跟随到的区块被替换：下一次跟随时检测到重组并回滚
+        chain.extend(3, 4)
+        tail.follow(latest())
+        reorgs = tail.reorgs
+        chain.reorg(2, seed=7)
+        chain.extend(1, 4)
+        tail.follow(latest())
+
+    assert driver.reorgs > 0
+    assert tail.reorgs > reorgs
+    assert check_unconfirmed(chain, tail)
+    # 已确认的区块写入存储，与规范链逐池一致
+    index = analyzer.load_pool_index(f"{config['output_path']}/search_pooladdr_bypair.csv")
+    for _, row in index.iterrows():
+        assert analyzer.checkpoints.get(f"{row['dex']}:{row['pool_address'].lower()}") == tail.finalized
+        pool = chain.pool_index[row["pool_address"].lower()]
+        expected = np.count_nonzero((chain.log_pools == pool) & (chain.blocks <= tail.finalized))
+        assert len(analyzer.pool_sync.make_calculator(row).load_data()) == expected
@@ -0,0 +1,130 @@
+"""完整流程：模拟节点上的 eth_fetch 与链上真实数据逐池核对."""
+import glob
+import json
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from eth_fetch.benchmarks.bench_pipeline import make_eth_fetch
+from eth_fetch.SwapDecoder import decode_swaps
+
+INTERVALS = ["5min", "1h"]
+
+
+def window(chain):
+    first, last = int(chain.blocks[0]), int(chain.blocks[-1])
+    return datetime.fromtimestamp(chain.timestamp(first)), datetime.fromtimestamp(chain.timestamp(last + 1))
+
+
+def chain_swaps(chain, row, last_block):
+    """从模拟链的日志直接解码某个池在 last_block 及之前的 swap."""
+    index = chain.pool_index[row["pool_address"].lower()]
+    logs = [
+        chain.format_log(i)
+        for i in np.flatnonzero((chain.log_pools == index) & (chain.blocks <= last_block))
+    ]
+    stamps = {int(log["blockNumber"], 16): chain.timestamp(int(log["blockNumber"], 16)) for log in logs}
+    return decode_swaps(row["dex"], logs, stamps)[0]
+
+
+def pool_index(config):
+    return pd.read_csv(f"{config['output_path']}/search_pooladdr_bypair.csv")
+
+
+def assert_matches_chain(analyzer, chain, config, last_block):
+    """每个池存储的 swap 数与 1h K 线交易量都与链上一致."""
+    index = pool_index(config)
+    assert len(index) == len(chain.pools)
+    for _, row in index.iterrows():
+        calculator = analyzer.pool_sync.make_calculator(row)
+        truth = chain_swaps(chain, row, last_block)
+        assert len(calculator.load_data()) == len(truth)
+        candles = pd.read_csv(calculator.candle_path("1h"))
+        got = candles[candles["pool_address"].str.lower() == row["pool_address"].lower()]["volume0"].sum()
+        want = calculator.to_candles(calculator.rollup(calculator.process_data(truth), "1h"), "1h")["volume0"].sum()
+        assert np.isclose(got, want)
+
+
+def assert_pair_totals(config):
+    """每个交易对合并 K 线的交易量等于其各池 K 线交易量之和."""
+    combined_files = sorted(glob.glob(f"{config['output_path']}/*-1h-all.csv"))
+    assert combined_files
+    for path in combined_files:
+        pools = pd.read_csv(path.replace("-1h-all.csv", "-1h.csv"))
+        assert np.isclose(pd.read_csv(path)["volume0"].sum(), pools["volume0"].sum())
+
+
+def checkpoints(config):
+    with open(config["checkpoint_path"]) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"stream_aggregate": False, "swap_store": "csv"},
+    {"log_sweep": False, "pair_aggregate": False},
+])
+def test_eth_fetch_matches_chain(tmp_path, config, chain, factory_df, pair_df, overrides):
+    config.update(overrides)
+    start_time, end_time = window(chain)
+    analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, end_time, INTERVALS)
+    analyzer.eth_fetch()
+    assert_matches_chain(analyzer, chain, config, int(chain.blocks[-1]))
+
+
+def test_pair_totals_count_each_pool_once(tmp_path, config, chain, factory_df, pair_df):
+    # 同一交易对的两个方向各占一行，池只同步、计入一次
+    reversed_pairs = pair_df.rename(columns={
+        "tokenA": "tokenB", "tokenB": "tokenA", "tokenAname": "tokenBname", "tokenBname": "tokenAname"
+    })[pair_df.columns]
+    start_time, end_time = window(chain)
+    analyzer = make_eth_fetch(
+        str(tmp_path), factory_df, pd.concat([pair_df, reversed_pairs], ignore_index=True), start_time, end_time, INTERVALS
+    )
+    analyzer.eth_fetch()
+    index = analyzer.load_pool_index(f"{config['output_path']}/search_pooladdr_bypair.csv")
+    assert index["pool_address"].str.lower().is_unique
+    assert_pair_totals(config)
+
+
+@pytest.mark.parametrize("overrides", [{}, {"stream_aggregate": False}, {"parallel_workers": 2}])
+def test_pool_added_on_a_later_run_is_combined(tmp_path, config, chain, factory_df, pair_df, overrides):
+    # 第二次运行加入新的工厂：新池的全部历史都要计入交易对的合并 K 线
+    config.update(overrides)
+    start_time, end_time = window(chain)
+    subset = factory_df[factory_df["dex"] == "uniswap_v2"]
+    make_eth_fetch(str(tmp_path), subset, pair_df, start_time, end_time, INTERVALS).eth_fetch()
+    analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, end_time, INTERVALS)
+    analyzer.eth_fetch()
+    assert_pair_totals(config)
+    assert_matches_chain(analyzer, chain, config, int(chain.blocks[-1]))
+
+
+def test_end_time_after_head_is_clamped(tmp_path, config, chain, factory_df, pair_df):
+    start_time, end_time = window(chain)
+    analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, end_time + timedelta(days=1), INTERVALS)
+    analyzer.eth_fetch()
+    safe = chain.head - config["sync_confirmations"]
+    assert {ranges[-1][1] for ranges in checkpoints(config).values()} == {safe}
+    assert_matches_chain(analyzer, chain, config, safe)
+
+
+def test_earlier_window_is_backfilled(tmp_path, config, chain, factory_df, pair_df):
+    start_time, end_time = window(chain)
+    middle = datetime.fromtimestamp(chain.timestamp((int(chain.blocks[0]) + int(chain.blocks[-1])) // 2))
+    make_eth_fetch(str(tmp_path), factory_df, pair_df, middle, end_time, INTERVALS).eth_fetch()
+    first = checkpoints(config)
+    analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, end_time, INTERVALS)
+    analyzer.eth_fetch()
+    for key, ranges in checkpoints(config).items():
+        assert len(ranges) == 1
+        assert ranges[0][0] < first[key][0][0]
+    assert_matches_chain(analyzer, chain, config, int(chain.blocks[-1]))
+
+
+def test_parallel_workers(tmp_path, config, chain, factory_df, pair_df):
+    config["parallel_workers"] = 2
+    start_time, end_time = window(chain)
+    analyzer = make_eth_fetch(str(tmp_path), factory_df, pair_df, start_time, end_time, INTERVALS)
+    analyzer.eth_fetch()
+    assert_matches_chain(analyzer, chain, config, int(chain.blocks[-1]))
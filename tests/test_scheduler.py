@@ -0,0 +1,36 @@
+"""多节点调度：不可用或限流的节点上的请求换节点重试，结果与单节点一致."""
+import pytest
+from eth_fetch.RPCClient import RPCClient
+from eth_fetch.RPCScheduler import RPCUnavailable, create_scheduler, endpoint_configs
+from eth_fetch.benchmarks.mock_node import MockNode
+
+DEAD_URL = "http://127.0.0.1:1"
+
+
+def client(urls, max_retries=5):
+    scheduler = create_scheduler(
+        endpoint_configs(urls, urls[0]), backoff=0.01, timeout=2, max_retries=max_retries, enable_logging=False
+    )
+    return RPCClient(urls[0], enable_logging=False, scheduler=scheduler)
+
+
+def test_unreachable_endpoint_fails_over(node, chain):
+    rpc = client([DEAD_URL, node.url])
+    for _ in range(5):
+        assert int(rpc.request("eth_blockNumber", []), 16) == chain.head
+
+
+def test_rate_limited_endpoint_fails_over(node, chain):
+    with MockNode(chain, rate_limit=1, reject_over_limit=True) as limited:
+        rpc = client([limited.url, node.url])
+        headers = rpc.batch_request([("eth_getBlockByNumber", [hex(chain.genesis_block + i), False]) for i in range(20)])
+        for _ in range(10):
+            rpc.request("eth_blockNumber", [])
+        assert [int(header["number"], 16) for header in headers] == list(range(chain.genesis_block, chain.genesis_block + 20))
+        assert limited.rejected > 0
+
+
+def test_retries_are_bounded():
+    rpc = client([DEAD_URL], max_retries=2)
+    with pytest.raises(RPCUnavailable):
+        rpc.request("eth_blockNumber", [])